@@ -0,0 +1,32 @@
+"""Serial vs concurrent `extractor()` against SQLite stand-ins.
+
+Usage: python benchmarks/bench_extractor.py [reservations] [latency_seconds]
+"""
+import os
+import sys
+import tempfile
+import time
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'etl')))
+sys.path.append(os.path.abspath(os.path.dirname(__file__)))
+
+import extract_transform_load as etl
+import state
+from datasets import create_oltp_databases, sqlite_engine_factory
+
+def run(reservations=100000, latency=0.05):
+    with tempfile.TemporaryDirectory() as directory:
+        create_oltp_databases(directory, reservations=reservations)
+        etl.STAGING_AREA_PATH = directory
+        state.STATE_DIR = os.path.join(directory, 'state')
+        engine_factory = sqlite_engine_factory(directory, latency=latency)
+
+        for label, workers, per_db in [('serial', 1, 1), ('per-database', 4, 1), ('concurrent', 8, 4)]:
+            start = time.perf_counter()
+            file_paths = etl.extractor(max_workers=workers, max_workers_per_db=per_db, engine_factory=engine_factory)
+            elapsed = time.perf_counter() - start
+            print(f"{label:<14} workers={workers} per_db={per_db} tables={len(file_paths)} {elapsed:.3f}s")
+
+if __name__ == '__main__':
+    args = sys.argv[1:]
+    run(int(args[0]) if args else 100000, float(args[1]) if len(args) > 1 else 0.05)
@@ -0,0 +1,41 @@
+"""Bytes written and write/parse time per staging format.
+
+Usage: python benchmarks/bench_staging.py [reservations]
+"""
+import os
+import sys
+import tempfile
+import time
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'etl')))
+sys.path.append(os.path.abspath(os.path.dirname(__file__)))
+
+from staging import STAGING_FORMATS, get_staging_format
+from datasets import build_tables
+
+def run(reservations=200000):
+    tables = build_tables(reservations)
+    frames = {
+        'reservations': tables['reservation_db']['Reservations'],
+        'reservation_items': tables['reservation_db']['ReservationItems'],
+        'payments': tables['payment_db']['Payments'],
+        'stays': tables['stay_db']['Stays'],
+    }
+    with tempfile.TemporaryDirectory() as directory:
+        print(f"{'format':<8} {'bytes':>12} {'write_s':>8} {'read_s':>8}")
+        for name in STAGING_FORMATS:
+            staging_format = get_staging_format(name)
+            size = write_time = read_time = 0.0
+            for table_name, df in frames.items():
+                path = os.path.join(directory, f"{table_name}_loaded.{staging_format.extension}")
+                start = time.perf_counter()
+                staging_format.write(df, path)
+                write_time += time.perf_counter() - start
+                size += os.path.getsize(path)
+                start = time.perf_counter()
+                staging_format.read(path)
+                read_time += time.perf_counter() - start
+            print(f"{name:<8} {int(size):>12} {write_time:>8.3f} {read_time:>8.3f}")
+
+if __name__ == '__main__':
+    run(int(sys.argv[1]) if len(sys.argv) > 1 else 200000)
@@ -0,0 +1,278 @@
+"""Synthetic SQLite stand-ins for the four OLTP databases.
+
+The tables follow the schemas in tests/test_db_operations.py and the
+test_transformations.py fixtures. Reservations fan out into items, stays and
+payments, and room types and phone numbers come in the messy variants the
+transformations have to clean up.
+
+Usage: python benchmarks/datasets.py OUTPUT_DIR [reservations] [seed]
+"""
+import os
+import sys
+import sqlite3
+
+import numpy as np
+import pandas as pd
+from sqlalchemy import create_engine
+
+OLTP_DATABASE_NAMES = ['promotion_db', 'payment_db', 'reservation_db', 'stay_db']
+
+# Reservations generated and written per batch, which bounds generator memory at large scales
+GENERATE_BATCH_SIZE = 200000
+
+ROOM_TYPES = ['Single', 'Double', 'Suite', 'Single Earth', 'Deluxe Twin']
+RESERVATION_STATUSES = ['Booked', 'Pending', 'Cancelled', 'Completed']
+
+# Fan-out per reservation: (counts, probabilities)
+ITEMS_PER_RESERVATION = ([1, 2, 3], [0.7, 0.2, 0.1])
+PAYMENTS_PER_RESERVATION = ([0, 1, 2], [0.05, 0.85, 0.10])
+
+def get_database_path(directory, db_name):
+    return os.path.join(directory, f"{db_name}.sqlite")
+
+def sqlite_engine_factory(directory, latency=0.0):
+    """Engine factory for `extractor()` backed by the SQLite stand-ins in `directory`.
+
+    `latency` adds a per-statement sleep (seconds) to approximate the network round
+    trip to a remote OLTP server, which is what concurrent extraction overlaps.
+    """
+    def factory(db_name):
+        engine = create_engine(f"sqlite:///{get_database_path(directory, db_name)}")
+        if latency:
+            from sqlalchemy import event
+            import time
+
+            @event.listens_for(engine, 'before_cursor_execute')
+            def _simulate_latency(conn, cursor, statement, parameters, context, executemany):
+                time.sleep(latency)
+        return engine
+    return factory
+
+def messy_room_types(rng, size):
+    """Room types with the casing, separator and spacing variants seen in the sources."""
+    room_types = pd.Series(rng.choice(ROOM_TYPES, size))
+    variant = rng.integers(0, 5, size)
+    room_types = room_types.where(variant != 1, room_types.str.upper())
+    room_types = room_types.where(variant != 2, room_types.str.lower().str.replace(' ', '_'))
+    room_types = room_types.where(variant != 3, room_types.str.replace(' ', '-'))
+    room_types = room_types.where(variant != 4, '  ' + room_types + ' ')
+    return room_types.to_numpy()
+
+def messy_phone_numbers(rng, size):
+    subscriber = pd.Series(rng.integers(10**9, 10**10, size)).astype(str)
+    prefix = rng.choice(['0', '62', '+62-'], size)
+    return (prefix + subscriber).to_numpy()
+
+def build_dimension_tables(reservations, rng):
+    n_users = max(10, reservations // 5)
+    n_hotels = max(2, reservations // 100)
+    n_rooms = n_hotels * 10
+
+    users = pd.DataFrame({
+        'id': np.arange(1, n_users + 1),
+        'name': [f"User {i}" for i in range(1, n_users + 1)],
+        'birth_date': pd.Timestamp('1960-01-01') + pd.to_timedelta(rng.integers(0, 16000, n_users), unit='D'),
+        'gender': rng.choice(['Male', 'Female'], n_users),
+        'email': [f"user{i}@example.com" for i in range(1, n_users + 1)],
+        'phoneNumber': messy_phone_numbers(rng, n_users),
+    })
+    hotels = pd.DataFrame({
+        'id': np.arange(1, n_hotels + 1),
+        'name': [f"Hotel {i}" for i in range(1, n_hotels + 1)],
+        'type': rng.choice(['Hotel', 'Resort', 'Pod', 'Cabin'], n_hotels),
+    })
+    rooms = pd.DataFrame({
+        'id': np.arange(1, n_rooms + 1),
+        'name': [f"Room {i}" for i in range(1, n_rooms + 1)],
+        'room_type': messy_room_types(rng, n_rooms),
+        'floor': rng.integers(1, 10, n_rooms),
+        'hotel_id': np.repeat(hotels['id'].to_numpy(), 10),
+    })
+    campaigns = pd.DataFrame({
+        'id': [1, 2],
+        'name': ['Summer Sale', 'Winter Wonderland'],
+        'description': ['Discounts on summer stays', 'Special offers for winter stays'],
+        'cover_pic_url': ['http://example.com/summer_sale.jpg', 'http://example.com/winter_wonderland.jpg'],
+    })
+    vouchers = pd.DataFrame({
+        'id': [1, 2, 3, 4],
+        'campaign_id': [1, 1, 2, 2],
+        'code': ['SUMMER20', 'SUMMER30', 'WINTER15', 'WINTER20'],
+        'discount_type': [0.20, 0.30, 0.15, 0.20],
+        'discount_value': [20.00, 30.00, 15.00, 20.00],
+        'visible_from': [pd.Timestamp('2024-06-01 00:00:00')] * 4,
+        'visible_to': [pd.Timestamp('2024-08-31 23:59:59')] * 2 + [pd.Timestamp('2024-12-31 23:59:59')] * 2,
+        'valid_from': [pd.Timestamp('2024-06-01 00:00:00')] * 4,
+        'valid_to': [pd.Timestamp('2024-08-31 23:59:59')] * 2 + [pd.Timestamp('2024-12-31 23:59:59')] * 2,
+        'hotel_types': ['["Resort"]', '["Resort"]', '["Hotel"]', '["Hotel"]'],
+        'hotel_ids': ['["1", "2"]', '["1"]', '["3"]', '["3"]'],
+        'room_types': ['["Single", "Double"]', '["Suite"]', '["Suite"]', '["Single", "Double"]'],
+    })
+    payment_methods = pd.DataFrame({
+        'id': [1, 2, 3],
+        'name': ['Credit Card', 'Bank Transfer', 'E-Wallet'],
+        'third_party_id': [1, 2, 2],
+    })
+    payment_third_parties = pd.DataFrame({'id': [1, 2], 'name': ['PayPal', 'Stripe']})
+
+    return {
+        'users': users,
+        'hotels': hotels,
+        'rooms': rooms,
+        'campaigns': campaigns,
+        'vouchers': vouchers,
+        'payment_methods': payment_methods,
+        'payment_third_parties': payment_third_parties,
+    }
+
+def build_reservation_batch(first_id, count, dims, rng, next_ids):
+    """Reservations `first_id`..`first_id + count - 1` with their items, stays and payments.
+
+    `next_ids` holds the next item/stay/payment id and is advanced in place.
+    """
+    reservation_ids = np.arange(first_id, first_id + count)
+    reservation_datetime = pd.Timestamp('2023-01-01') + pd.to_timedelta(
+        np.sort(rng.integers(0, 2 * 365 * 24 * 60, count)), unit='min'
+    )
+    check_in = reservation_datetime.normalize() + pd.to_timedelta(rng.integers(1, 90, count), unit='D')
+    check_out = check_in + pd.to_timedelta(rng.integers(1, 8, count), unit='D')
+    status = rng.choice(RESERVATION_STATUSES, count, p=[0.5, 0.15, 0.1, 0.25])
+    has_voucher = rng.random(count) < 0.3
+    voucher_code = np.where(has_voucher, rng.choice(dims['vouchers']['code'].to_numpy(), count), None)
+
+    # Items: 1-3 per reservation, each a room type priced per night
+    items_per_reservation = rng.choice(ITEMS_PER_RESERVATION[0], count, p=ITEMS_PER_RESERVATION[1])
+    item_reservation = np.repeat(np.arange(count), items_per_reservation)
+    n_items = len(item_reservation)
+    nights = (check_out - check_in).days.to_numpy()
+    item_price = rng.integers(50, 500, n_items).astype(float) * nights[item_reservation]
+    item_discount = np.round(item_price * np.where(has_voucher[item_reservation], 0.2, 0.0), 2)
+    items = pd.DataFrame({
+        'id': np.arange(next_ids['item'], next_ids['item'] + n_items),
+        'reservation_id': reservation_ids[item_reservation],
+        'reservation_datetime': reservation_datetime[item_reservation],
+        'check_in_date': check_in[item_reservation],
+        'check_out_date': check_out[item_reservation],
+        'room_type': messy_room_types(rng, n_items),
+        'total_room_price': item_price,
+        'total_discount': item_discount,
+    })
+    next_ids['item'] += n_items
+
+    total_price = np.bincount(item_reservation, weights=item_price, minlength=count)
+    total_discount = np.round(np.bincount(item_reservation, weights=item_discount, minlength=count), 2)
+    reservations = pd.DataFrame({
+        'id': reservation_ids,
+        'reservation_datetime': reservation_datetime,
+        'check_in_date': check_in,
+        'check_out_date': check_out,
+        'status': status,
+        'hotel_id': rng.integers(1, len(dims['hotels']) + 1, count),
+        'booker_id': rng.integers(1, len(dims['users']) + 1, count),
+        'total_room_price': total_price,
+        'voucher_code': voucher_code,
+        'total_discount': total_discount,
+    })
+
+    # Stays: one per item, except for cancelled reservations
+    stay_items = np.flatnonzero(status[item_reservation] != 'Cancelled')
+    n_stays = len(stay_items)
+    stays = pd.DataFrame({
+        'id': np.arange(next_ids['stay'], next_ids['stay'] + n_stays),
+        'date': check_in[item_reservation[stay_items]],
+        'reference_reservation_id': reservation_ids[item_reservation[stay_items]],
+        'room_id': rng.integers(1, len(dims['rooms']) + 1, n_stays),
+        'guest_id': rng.integers(1, len(dims['users']) + 1, n_stays),
+    })
+    next_ids['stay'] += n_stays
+
+    # Payments: usually one, sometimes a failed attempt before it, sometimes none yet
+    payments_per_reservation = rng.choice(PAYMENTS_PER_RESERVATION[0], count, p=PAYMENTS_PER_RESERVATION[1])
+    payment_reservation = np.repeat(np.arange(count), payments_per_reservation)
+    n_payments = len(payment_reservation)
+    created = reservation_datetime[payment_reservation] + pd.to_timedelta(rng.integers(1, 60, n_payments), unit='min')
+    paid = rng.random(n_payments) < 0.85
+    payments = pd.DataFrame({
+        'id': np.arange(next_ids['payment'], next_ids['payment'] + n_payments),
+        'reservation_id': reservation_ids[payment_reservation],
+        'payment_method_id': rng.integers(1, len(dims['payment_methods']) + 1, n_payments),
+        'amount': (total_price - total_discount)[payment_reservation],
+        'status': np.where(paid, 'Paid', 'Pending'),
+        'created_datetime': created,
+        'payment_datetime': pd.Series(created + pd.Timedelta(minutes=30)).where(paid),
+    })
+    next_ids['payment'] += n_payments
+
+    return {'reservations': reservations, 'reservation_items': items, 'stays': stays, 'payments': payments}
+
+def _database_tables(dims, batch):
+    # Which source table lands in which OLTP database, and under which name
+    return {
+        'promotion_db': {'Campaign': dims.get('campaigns'), 'Voucher': dims.get('vouchers')},
+        'payment_db': {
+            'PaymentThirdParties': dims.get('payment_third_parties'),
+            'PaymentMethods': dims.get('payment_methods'),
+            'Payments': batch['payments'],
+        },
+        'reservation_db': {
+            'Users': dims.get('users'),
+            'Hotels': dims.get('hotels'),
+            'Reservations': batch['reservations'],
+            'ReservationItems': batch['reservation_items'],
+        },
+        'stay_db': {
+            'Users': dims['users'][['id']].assign(stay_id=dims['users']['id']) if 'users' in dims else None,
+            'Hotels': dims.get('hotels'),
+            'Rooms': dims.get('rooms'),
+            'Stays': batch['stays'],
+        },
+    }
+
+def build_tables(reservations=1000, seed=0):
+    """All tables in memory, keyed by database and source table name."""
+    rng = np.random.default_rng(seed)
+    dims = build_dimension_tables(reservations, rng)
+    batch = build_reservation_batch(1, reservations, dims, rng, {'item': 1, 'stay': 1, 'payment': 1})
+    return _database_tables(dims, batch)
+
+def create_oltp_databases(directory, reservations=1000, seed=0, batch_size=None):
+    """Write SQLite stand-ins for the four OLTP databases into `directory`.
+
+    Reservations and their items, stays and payments are generated and appended
+    `batch_size` reservations at a time, so 10M reservations fit in memory.
+    """
+    batch_size = batch_size or GENERATE_BATCH_SIZE
+    os.makedirs(directory, exist_ok=True)
+    rng = np.random.default_rng(seed)
+    dims = build_dimension_tables(reservations, rng)
+    next_ids = {'item': 1, 'stay': 1, 'payment': 1}
+
+    connections = {}
+    for db_name in OLTP_DATABASE_NAMES:
+        path = get_database_path(directory, db_name)
+        if os.path.exists(path):
+            os.remove(path)
+        connections[db_name] = sqlite3.connect(path)
+    try:
+        for first_id in range(1, max(reservations, 1) + 1, batch_size):
+            count = min(batch_size, reservations - first_id + 1)
+            batch = build_reservation_batch(first_id, count, dims, rng, next_ids)
+            # Dimension tables are written with the first batch only
+            tables = _database_tables(dims if first_id == 1 else {}, batch)
+            for db_name, db_tables in tables.items():
+                for table_name, df in db_tables.items():
+                    if df is not None:
+                        df.to_sql(table_name, connections[db_name], index=False, if_exists='append')
+                connections[db_name].commit()
+    finally:
+        for conn in connections.values():
+            conn.close()
+    return {db_name: get_database_path(directory, db_name) for db_name in OLTP_DATABASE_NAMES}
+
+if __name__ == '__main__':
+    args = sys.argv[1:]
+    if not args:
+        sys.exit(__doc__)
+    paths = create_oltp_databases(args[0], int(args[1]) if len(args) > 1 else 100000, int(args[2]) if len(args) > 2 else 0)
+    for db_name, path in paths.items():
+        print(f"{db_name}: {path}")
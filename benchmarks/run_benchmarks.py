@@ -0,0 +1,149 @@
+"""End-to-end ETL benchmark: extractor, transform_fact_table, transform_dim_tables,
+transformer and loader timed separately against generated SQLite stand-ins.
+
+Usage: python benchmarks/run_benchmarks.py [reservations] [--save-baseline] [--tolerance 0.25]
+
+Each stage reports wall time, rows/s and peak traced memory (tracemalloc, which
+covers pandas/numpy buffers), measured in separate runs of the stage. Results are compared with the entry for the same
+scale in benchmarks/baseline.json; a stage slower than the baseline by more than
+the tolerance is reported as a regression and the script exits non-zero.
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import tempfile
+import tracemalloc
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'etl')))
+sys.path.append(os.path.abspath(os.path.dirname(__file__)))
+
+from sqlalchemy import create_engine
+import extract_transform_load as etl
+import state
+from staging import read_staged, get_table_name
+from transformations import transform_fact_table, transform_dim_tables
+from datasets import create_oltp_databases, sqlite_engine_factory
+
+BASELINE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'baseline.json')
+
+def measure(func, prepare=None):
+    """Call `func` and return (result, seconds, peak traced MB).
+
+    tracemalloc slows allocation-heavy code several-fold, so the wall time comes
+    from an untraced call and the peak memory from a second, traced one. `prepare`
+    restores what the first call consumed (e.g. staging files) and returns the
+    function to trace; without it `func` is traced again.
+    """
+    start = time.perf_counter()
+    result = func()
+    elapsed = time.perf_counter() - start
+    traced = prepare() if prepare else func
+    tracemalloc.start()
+    try:
+        traced()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return result, elapsed, peak / 2**20
+
+def run(reservations=100000, seed=0):
+    results = {}
+
+    def record(stage, rows, elapsed, peak_mb):
+        results[stage] = {
+            'seconds': round(elapsed, 4),
+            'rows': rows,
+            'rows_per_sec': round(rows / elapsed) if elapsed else None,
+            'peak_mb': round(peak_mb, 1),
+        }
+        print(f"{stage:<22} rows={rows:<10} {elapsed:8.3f}s {rows / elapsed if elapsed else 0:12,.0f} rows/s {peak_mb:8.1f} MB")
+
+    with tempfile.TemporaryDirectory() as directory:
+        start = time.perf_counter()
+        create_oltp_databases(directory, reservations=reservations, seed=seed)
+        print(f"Generated {reservations} reservations in {time.perf_counter() - start:.1f}s")
+
+        etl.STAGING_AREA_PATH = os.path.join(directory, 'staging-area', '')
+        os.makedirs(etl.STAGING_AREA_PATH)
+        state.STATE_DIR = os.path.join(directory, 'state')
+        warehouse_engine = create_engine(f"sqlite:///{os.path.join(directory, 'warehouse.sqlite')}")
+        engine_factory = sqlite_engine_factory(directory)
+
+        def extract():
+            return etl.extractor(engine_factory=engine_factory)
+
+        file_paths, elapsed, peak = measure(extract)
+        data = {get_table_name(path, '_loaded'): read_staged(path) for path in file_paths}
+        record('extractor', sum(len(df) for df in data.values()), elapsed, peak)
+
+        fact_rows = len(data['reservations'])
+        _, elapsed, peak = measure(lambda: transform_fact_table(data, chunk_size=etl.FACT_JOIN_CHUNK_SIZE))
+        record('transform_fact_table', fact_rows, elapsed, peak)
+
+        dim_rows = sum(len(df) for name, df in data.items() if name not in ('reservations', 'reservation_items', 'stays', 'payments'))
+        _, elapsed, peak = measure(lambda: transform_dim_tables(data))
+        record('transform_dim_tables', dim_rows, elapsed, peak)
+        del data
+
+        # The transformer removes the extracted files and the loader the transformed ones, so both are redone untimed
+        def retransform():
+            extracted = extract()
+            return lambda: etl.transformer(extracted, force_refresh=True)
+
+        transformed_paths, elapsed, peak = measure(lambda: etl.transformer(file_paths), retransform)
+        # Every transformed table is loaded: the fact table, the dimensions and the marts
+        loaded_rows = sum(len(read_staged(path)) for path in transformed_paths)
+        record('transformer', loaded_rows, elapsed, peak)
+
+        def reload():
+            transformed = etl.transformer(extract(), force_refresh=True)
+            return lambda: etl.loader(transformed, engine=warehouse_engine, force_refresh=True)
+
+        _, elapsed, peak = measure(lambda: etl.loader(transformed_paths, engine=warehouse_engine), reload)
+        record('loader', loaded_rows, elapsed, peak)
+        warehouse_engine.dispose()
+
+    return results
+
+def compare(results, baseline, tolerance):
+    """Return the stages whose wall time exceeds the baseline by more than `tolerance`."""
+    regressions = []
+    for stage, result in results.items():
+        if stage not in baseline:
+            continue
+        ratio = result['seconds'] / baseline[stage]['seconds']
+        status = 'REGRESSION' if ratio > 1 + tolerance else 'ok'
+        print(f"{stage:<22} {baseline[stage]['seconds']:8.3f}s -> {result['seconds']:8.3f}s ({ratio:5.2f}x) {status}")
+        if status != 'ok':
+            regressions.append(stage)
+    return regressions
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmark the ETL stages against a stored baseline.')
+    parser.add_argument('reservations', nargs='?', type=int, default=100000)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--baseline', default=BASELINE_PATH)
+    parser.add_argument('--save-baseline', action='store_true', help='Store these results as the baseline for this scale.')
+    parser.add_argument('--tolerance', type=float, default=0.25, help='Allowed slowdown before a stage counts as a regression.')
+    args = parser.parse_args()
+
+    results = run(args.reservations, args.seed)
+
+    baselines = {}
+    if os.path.exists(args.baseline):
+        with open(args.baseline) as f:
+            baselines = json.load(f)
+    scale = str(args.reservations)
+
+    if args.save_baseline:
+        baselines[scale] = results
+        with open(args.baseline, 'w') as f:
+            json.dump(baselines, f, indent=2, sort_keys=True)
+        print(f"Saved baseline for {scale} reservations to {args.baseline}")
+    elif scale in baselines:
+        if compare(results, baselines[scale], args.tolerance):
+            sys.exit(1)
+    else:
+        print(f"No baseline for {scale} reservations in {args.baseline}; run with --save-baseline to store one.")
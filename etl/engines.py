@@ -0,0 +1,59 @@
+import os
+import logging
+import threading
+from sqlalchemy import create_engine
+
+logger = logging.getLogger(__name__)
+
+_engines = {}
+_lock = threading.Lock()
+
+def get_pool_options():
+    # Read when the engine is built so that settings from .env are picked up
+    return {
+        'pool_size': int(os.getenv('DB_POOL_SIZE', 5)),
+        'max_overflow': int(os.getenv('DB_POOL_MAX_OVERFLOW', 10)),
+        # Recycle connections before MySQL's wait_timeout closes them between scheduled runs
+        'pool_recycle': int(os.getenv('DB_POOL_RECYCLE', 3600)),
+        'pool_pre_ping': True
+    }
+
+def create_oltp_engine(db_name):
+    return create_engine(
+        f"mysql://{os.getenv('OLTP_USER')}:{os.getenv('OLTP_PASSWORD')}@{os.getenv('OLTP_HOST')}:3306/{db_name}",
+        **get_pool_options()
+    )
+
+def create_warehouse_engine():
+    return create_engine(
+        f"mysql://{os.getenv('DATA_WAREHOUSE_USER')}:{os.getenv('DATA_WAREHOUSE_PASSWORD')}@{os.getenv('DATA_WAREHOUSE_HOST')}:3306/{os.getenv('DATA_WAREHOUSE_DB')}",
+        connect_args={'local_infile': 1},
+        **get_pool_options()
+    )
+
+def get_engine(key, factory):
+    """Return the registered engine for `key`, creating it with `factory()` on first use."""
+    with _lock:
+        if key not in _engines:
+            logger.info(f"Creating pooled engine for {key}")
+            _engines[key] = factory()
+        return _engines[key]
+
+def get_oltp_engine(db_name):
+    return get_engine(db_name, lambda: create_oltp_engine(db_name))
+
+def get_warehouse_engine():
+    return get_engine('data_warehouse', create_warehouse_engine)
+
+def release_engine(engine):
+    """Dispose `engine` unless it belongs to the registry, which keeps its pool open."""
+    with _lock:
+        if engine in _engines.values():
+            return
+    engine.dispose()
+
+def dispose_engines():
+    with _lock:
+        for engine in _engines.values():
+            engine.dispose()
+        _engines.clear()
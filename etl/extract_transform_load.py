@@ -1,10 +1,34 @@
 import os
+import argparse
+import time
 import logging
-from datetime import datetime
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
 from dotenv import load_dotenv
 import pandas as pd
-from sqlalchemy import create_engine
-from transformations import transform_fact_table, transform_dim_tables  # Import the functions
+from sqlalchemy import text
+from transformations import (  # Import the functions
+    transform_fact_table, transform_dim_table, DIM_TABLE_SOURCES, FACT_GRAIN_COLUMNS, RESERVATION_COLUMNS,
+    FACT_TABLE_SOURCES, PUSHDOWN_FACT_TABLE, PUSHDOWN_FACT_TABLE_SOURCES, MART_TABLE_SOURCES, transform_mart,
+    get_mart_sources
+)
+from staging import get_staging_format, read_staged, get_table_name
+from state import load_state, save_state
+from engines import get_oltp_engine, get_warehouse_engine, release_engine, dispose_engines
+from instrumentation import measure, get_frame_bytes, start_report, get_report, finish_report
+from partitioning import transform_fact_table_partitioned
+from schemas import compact_dtypes, TABLE_SCHEMAS, WAREHOUSE_TABLES, get_column_types, get_required_columns
+from manifest import (
+    load_manifest, start_manifest, record_stage, forget_tables, get_completed_path, verify_completed_path,
+    clear_manifest
+)
+from fingerprints import FINGERPRINT_STATE, fingerprint, is_unchanged, commit_fingerprints
+from warehouse import (
+    write_table, write_table_parallel, get_shadow_name, drop_shadow_tables, publish_shadow_tables, add_merge_keys,
+    has_table, has_column, create_table_indexes, sample_lookups, time_lookups, get_write_concurrency
+)
 
 # Load environment variables from .env
 load_dotenv()
@@ -24,143 +48,836 @@ logger = logging.getLogger(__name__)
 
 # Data Configuration
 STAGING_AREA_PATH = './staging-area/'
+# Staging file format: 'parquet' (default), 'arrow' (Arrow IPC) or 'csv'
+STAGING_FORMAT = os.getenv('STAGING_FORMAT', 'parquet')
+STAGING_MEMORY_MAP = os.getenv('STAGING_MEMORY_MAP', 'true').lower() == 'true'
+
+def get_format():
+    if STAGING_FORMAT == 'csv':
+        return get_staging_format(STAGING_FORMAT)
+    return get_staging_format(STAGING_FORMAT, memory_map=STAGING_MEMORY_MAP)
 
 def get_data_loaded_path(filename):
-    return os.path.join(STAGING_AREA_PATH, f"{filename}_loaded.csv")
+    return os.path.join(STAGING_AREA_PATH, f"{filename}_loaded.{get_format().extension}")
 
 def get_data_transformed_path(filename):
-    return os.path.join(STAGING_AREA_PATH, f"{filename}_transformed.csv")
+    return os.path.join(STAGING_AREA_PATH, f"{filename}_transformed.{get_format().extension}")
+
+# Source Configuration: (table_name, query, chunksize). Tables with a chunksize are
+# streamed through a server-side cursor so peak memory is bounded by the chunk size.
+OLTP_DATABASES = {
+    'promotion_db': [
+        ('campaigns', "SELECT * FROM Campaign", None),
+        ('vouchers', "SELECT * FROM Voucher", None)
+    ],
+    'payment_db': [
+        ('payment_third_parties', "SELECT * FROM PaymentThirdParties", None),
+        ('payment_methods', "SELECT * FROM PaymentMethods", None),
+        ('payments', "SELECT * FROM Payments", 50000)
+    ],
+    'reservation_db': [
+        ('users', "SELECT * FROM Users", None),
+        ('hotels', "SELECT * FROM Hotels", None),
+        ('reservations', "SELECT * FROM Reservations", 50000),
+        ('reservation_items', "SELECT * FROM ReservationItems", 50000)
+    ],
+    'stay_db': [
+        ('stay_users', "SELECT * FROM Users", None),
+        ('stay_hotels', "SELECT * FROM Hotels", None),
+        ('rooms', "SELECT * FROM Rooms", None),
+        ('stays', "SELECT * FROM Stays", 50000)
+    ]
+}
+
+# Optional join pushdown: reservation_db joins Reservations to ReservationItems and
+# returns only the fact columns, which are extracted as one table instead of the two
+EXTRACT_PUSHDOWN = os.getenv('EXTRACT_PUSHDOWN', 'false').lower() == 'true'
+PUSHDOWN_QUERY = (
+    f"SELECT {', '.join(f'r.{column}' for column in RESERVATION_COLUMNS)}, ri.room_type, ri.id AS item_id "
+    "FROM Reservations r LEFT JOIN ReservationItems ri ON ri.reservation_id = r.id"
+)
+PUSHDOWN_REPLACES = ['reservations', 'reservation_items']
+
+def get_oltp_databases():
+    """OLTP_DATABASES, with the pushdown query in place of Reservations and ReservationItems if enabled."""
+    if not EXTRACT_PUSHDOWN:
+        return OLTP_DATABASES
+    databases = dict(OLTP_DATABASES)
+    tables = [table for table in OLTP_DATABASES['reservation_db'] if table[0] not in PUSHDOWN_REPLACES]
+    databases['reservation_db'] = tables + [(PUSHDOWN_FACT_TABLE, PUSHDOWN_QUERY, 50000)]
+    return databases
+
+def get_transform_sources():
+    """Map each transformed table to the extracted tables it is built from."""
+    sources = {'fact_table': PUSHDOWN_FACT_TABLE_SOURCES if EXTRACT_PUSHDOWN else FACT_TABLE_SOURCES}
+    sources.update({f"dim_{name}": tables for name, tables in DIM_TABLE_SOURCES.items()})
+    sources.update({f"mart_{name}": get_mart_sources(name, EXTRACT_PUSHDOWN) for name in MART_TABLE_SOURCES})
+    return sources
+
+# Incremental extraction: fact source tables and the column holding their reservation id.
+# Each run's delta is made of whole reservations together with their items, stays and
+# payments: those past the reservations watermark, and those restated because a child
+# row was added to them since the last run.
+INCREMENTAL_KEYS = {
+    'reservations': 'id',
+    'reservation_items': 'reservation_id',
+    'stays': 'reference_reservation_id',
+    'payments': 'reservation_id'
+}
+# Child tables of a reservation: (database, source table). Their watermark is kept on
+# their own id, so that rows added to an already loaded reservation are detected.
+RESERVATION_CHILD_TABLES = {
+    'reservation_items': ('reservation_db', 'ReservationItems'),
+    'stays': ('stay_db', 'Stays'),
+    'payments': ('payment_db', 'Payments')
+}
+WATERMARK_STATE = 'watermarks'
+# The pushdown table is filtered on the reservation id and carries the reservations watermark
+PUSHDOWN_INCREMENTAL_KEY = 'r.id'
+# Reservations made within this many days are restated by every incremental run, so that
+# status changes (cancellations, refunds) reach the warehouse; 0 turns the lookback off
+INCREMENTAL_LOOKBACK_DAYS = int(os.getenv('INCREMENTAL_LOOKBACK_DAYS', 7))
+# Restated reservations are listed in the extraction queries up to this many ids;
+# beyond that every reservation from the lowest of them on is extracted again
+INCREMENTAL_MAX_RESTATED_IDS = int(os.getenv('INCREMENTAL_MAX_RESTATED_IDS', 1000))
+
+# Extraction concurrency: total worker threads and concurrent queries per database
+EXTRACT_MAX_WORKERS = int(os.getenv('EXTRACT_MAX_WORKERS', 1))
+EXTRACT_MAX_WORKERS_PER_DB = int(os.getenv('EXTRACT_MAX_WORKERS_PER_DB', 1))
+
+# Convert extracted tables to the dtypes in schemas.TABLE_SCHEMAS when they are ingested
+COMPACT_DTYPES = os.getenv('COMPACT_DTYPES', 'true').lower() == 'true'
+
+def ingest_table(table_name, df):
+    """Compact an extracted table's dtypes, recording its memory footprint before and after."""
+    if not COMPACT_DTYPES:
+        return df
+    with measure('compact', table_name) as metrics:
+        before = get_frame_bytes(df)
+        df = compact_dtypes(table_name, df)
+        after = get_frame_bytes(df)
+        metrics.update(rows=len(df), memory_before=before, memory_after=after)
+    logger.info(f"Compacted {table_name}: {before / 2**20:.2f} MB -> {after / 2**20:.2f} MB in memory")
+    return df
+
+def detect_restated_reservations(engine_factory, watermarks):
+    """Decide which reservations an incremental run extracts.
+
+    Returns the run's scope: reservations past `watermark` and those in `ids`,
+    the already loaded reservations that got an item, stay or payment past that
+    table's own watermark. `watermark` is lowered to restate the reservations
+    made within INCREMENTAL_LOOKBACK_DAYS as well, whose status may have
+    changed. `watermarks` holds the max id of each child table at
+    detection time, to be committed once the run has loaded. A child table that
+    cannot be read keeps its committed watermark, so its new rows are detected
+    by the next run.
+    """
+    ids = set()
+    scope = {'watermark': watermarks['reservations'], 'ids': [], 'watermarks': {}}
+    for table_name, (db_name, source_table) in RESERVATION_CHILD_TABLES.items():
+        key = INCREMENTAL_KEYS[table_name]
+        try:
+            engine = engine_factory(db_name)
+            try:
+                with engine.connect() as conn:
+                    latest = conn.execute(text(f"SELECT MAX(id) FROM {source_table}")).scalar()
+                    if latest is not None and watermarks.get(table_name) is not None:
+                        params = {'watermark': watermarks[table_name], 'latest': latest, 'reservations': scope['watermark']}
+                        ids.update(conn.execute(text(
+                            f"SELECT DISTINCT {key} FROM {source_table} "
+                            f"WHERE id > :watermark AND id <= :latest AND {key} <= :reservations"
+                        ), params).scalars())
+            finally:
+                release_engine(engine)
+        except Exception as e:
+            logger.error(f"Error detecting new rows of {table_name} in {db_name}: {e}")
+            continue
+        if latest is not None:
+            scope['watermarks'][table_name] = latest
+    if INCREMENTAL_LOOKBACK_DAYS:
+        since = (datetime.now() - timedelta(days=INCREMENTAL_LOOKBACK_DAYS)).strftime('%Y-%m-%d %H:%M:%S')
+        first = None
+        try:
+            engine = engine_factory('reservation_db')
+            try:
+                with engine.connect() as conn:
+                    first = conn.execute(
+                        text("SELECT MIN(id) FROM Reservations WHERE reservation_datetime >= :since AND id <= :watermark"),
+                        {'since': since, 'watermark': scope['watermark']}
+                    ).scalar()
+            finally:
+                release_engine(engine)
+        except Exception as e:
+            logger.error(f"Error finding the reservations made since {since}: {e}")
+        if first is not None:
+            logger.info(f"Restating the reservations made since {since}, from id {first}")
+            scope['watermark'] = min(scope['watermark'], first - 1)
+    ids = {reservation_id for reservation_id in ids if reservation_id is not None and reservation_id <= scope['watermark']}
+    if len(ids) > INCREMENTAL_MAX_RESTATED_IDS:
+        scope['watermark'] = min(scope['watermark'], min(ids) - 1)
+        ids = set()
+    scope['ids'] = sorted(int(reservation_id) for reservation_id in ids)
+    logger.info(f"Restating {len(scope['ids'])} loaded reservations with new items, stays or payments")
+    return scope
+
+def get_restated_filter(column, scope):
+    """SQL condition on a reservation id `column` selecting the reservations of `scope`."""
+    condition = f"{column} > :watermark"
+    if scope['ids']:
+        # The ids are integers read back from the sources, so they are inlined rather than bound one by one
+        ids = ', '.join(str(reservation_id) for reservation_id in scope['ids'])
+        condition = f"({condition} OR {column} IN ({ids}))"
+    return condition, {'watermark': scope['watermark']}
+
+def get_incremental_query(table_name, query, scope):
+    """Restrict `query` to the reservations of an incremental run's `scope`, if it has one."""
+    column = INCREMENTAL_KEYS.get(table_name)
+    if table_name == PUSHDOWN_FACT_TABLE:
+        column = PUSHDOWN_INCREMENTAL_KEY
+    if column is None or scope is None:
+        return query, None
+    condition, params = get_restated_filter(column, scope)
+    return f"{query} WHERE {condition}", params
+
+def compute_watermarks(data, scope=None):
+    """Watermarks reached by the extracted `data`: the max id of each fact source table.
 
-def extractor():
+    In an incremental run the child tables' watermarks are the max ids its `scope` detected.
+    """
+    if PUSHDOWN_FACT_TABLE in data:
+        data = {
+            **data, 'reservations': data[PUSHDOWN_FACT_TABLE],
+            'reservation_items': data[PUSHDOWN_FACT_TABLE][['item_id']].rename(columns={'item_id': 'id'})
+        }
+    watermarks = {}
+    for table_name in ['reservations', *RESERVATION_CHILD_TABLES]:
+        if table_name in data and data[table_name]['id'].notna().any():
+            value = data[table_name]['id'].max()
+            watermarks[table_name] = str(value) if isinstance(value, pd.Timestamp) else getattr(value, 'item', lambda: value)()
+    # Incremental child tables only hold the rows of the extracted reservations; a row
+    # added since detection to another loaded reservation may be below their max id
+    if scope is not None:
+        for table_name in RESERVATION_CHILD_TABLES:
+            watermarks.pop(table_name, None)
+        watermarks.update(scope['watermarks'])
+    return watermarks
+
+def read_sql_chunks(engine, query, chunksize, params=None):
+    # stream_results asks the driver for a server-side cursor, so rows are fetched
+    # from the server one chunk at a time instead of being buffered client-side
+    with engine.connect() as conn:
+        conn = conn.execution_options(stream_results=True, max_row_buffer=chunksize)
+        yield from pd.read_sql(text(query), conn, chunksize=chunksize, params=params)
+
+def read_table(engine, query, chunksize=None, params=None):
+    """Read a whole table into memory, through the server-side cursor when chunked."""
+    if chunksize:
+        return pd.concat(read_sql_chunks(engine, query, chunksize, params), ignore_index=True)
+    return pd.read_sql(text(query), engine, params=params)
+
+def extract_table(engine, db_name, table_name, query, chunksize=None, params=None):
+    try:
+        logger.info(f"Querying table: {table_name} in {db_name}")
+        staging_format = get_format()
+        file_path = get_data_loaded_path(table_name)
+        with measure('extract', table_name) as metrics:
+            if chunksize:
+                rows = bytes_read = 0
+                writer = staging_format.open_writer(file_path, TABLE_SCHEMAS.get(table_name))
+                try:
+                    for chunk in read_sql_chunks(engine, query, chunksize, params):
+                        writer.write(chunk)
+                        rows += len(chunk)
+                        bytes_read += get_frame_bytes(chunk)
+                finally:
+                    writer.close()
+                logger.info(f"Streamed {rows} rows of {table_name} in chunks of {chunksize}")
+            else:
+                df = pd.read_sql(text(query), engine, params=params)
+                staging_format.write(df, file_path)
+                rows, bytes_read = len(df), get_frame_bytes(df)
+            metrics.update(rows=rows, bytes_read=bytes_read, bytes_written=os.path.getsize(file_path))
+        logger.info(f"Successfully extracted and saved {table_name} to {file_path}")
+        return file_path
+    except Exception as e:
+        logger.error(f"Error querying {table_name} in {db_name}: {e}")
+        return None
+
+def _drain_table_queue(engine, db_name, pending, manifest):
+    # Several workers may share one database's queue; deque.popleft is thread-safe
+    results = []
+    while True:
+        try:
+            position, table_name, query, params, chunksize = pending.popleft()
+        except IndexError:
+            return results
+        file_path = extract_table(engine, db_name, table_name, query, chunksize, params)
+        if file_path is not None:
+            record_stage(manifest, table_name, 'extracted', file_path)
+        results.append((position, file_path))
+
+def extractor(max_workers=None, max_workers_per_db=None, oltp_databases=None, engine_factory=get_oltp_engine,
+              incremental=False, resume=False):
+    """Extract every configured table to the staging area and return the file paths in config order.
+
+    An incremental run extracts the reservations past the committed watermark and
+    restates those that got a new item, stay or payment, with all their rows.
+    Each extracted file is recorded in the run manifest. With `resume`, tables
+    whose file from the previous, failed run is intact, or whose transformed
+    tables are, are not extracted again, and the run keeps the failed run's
+    incremental or full mode. Resuming an incremental run as a full refresh
+    raises a ValueError.
+    """
     logger.info("Starting data extraction process.")
-    
-    oltp_databases = {
-        'promotion_db': [
-            ('campaigns', "SELECT * FROM Campaign"),
-            ('vouchers', "SELECT * FROM Voucher")
-        ],
-        'payment_db': [
-            ('payment_third_parties', "SELECT * FROM PaymentThirdParties"),
-            ('payment_methods', "SELECT * FROM PaymentMethods"),
-            ('payments', "SELECT * FROM Payments")
-        ],
-        'reservation_db': [
-            ('users', "SELECT * FROM Users"),
-            ('hotels', "SELECT * FROM Hotels"),
-            ('reservations', "SELECT * FROM Reservations"),
-            ('reservation_items', "SELECT * FROM ReservationItems")
-        ],
-        'stay_db': [
-            ('stay_users', "SELECT * FROM Users"),
-            ('stay_hotels', "SELECT * FROM Hotels"),
-            ('rooms', "SELECT * FROM Rooms"),
-            ('stays', "SELECT * FROM Stays")
-        ]
-    }
 
-    file_paths = []
+    max_workers = max_workers or EXTRACT_MAX_WORKERS
+    max_workers_per_db = max_workers_per_db or EXTRACT_MAX_WORKERS_PER_DB
+    oltp_databases = oltp_databases or get_oltp_databases()
+
+    manifest = load_manifest() if resume else None
+    if resume and not manifest['tables']:
+        logger.info("No failed run to resume; extracting every table.")
+        resume = False
+    if resume and 'incremental' in manifest:
+        # The reused files were extracted in the failed run's mode, so the rest of the run has to match it
+        if manifest['incremental'] and not incremental:
+            raise ValueError(
+                "The failed run was incremental and cannot be resumed as a full refresh; "
+                "resume it without --full-refresh or start a new run without --resume."
+            )
+        if incremental != manifest['incremental']:
+            logger.info("The failed run read every table in full; resuming it in full.")
+        incremental = manifest['incremental']
+
+    # Without committed watermarks (first run or full refresh) every table is read in full
+    state = load_state(WATERMARK_STATE)
+    watermarks = state.get('committed', {}) if incremental else {}
+    state['pending_incremental'] = 'reservations' in watermarks
+    if watermarks:
+        logger.info(f"Incremental extraction from watermarks: {watermarks}")
+    # A resumed run keeps the scope its reused files were extracted with
+    scope = state.get('scope') if resume and state['pending_incremental'] else None
+    if state['pending_incremental'] and scope is None:
+        scope = detect_restated_reservations(engine_factory, watermarks)
+    state['scope'] = scope
+    save_state(WATERMARK_STATE, state)
+    if not resume:
+        manifest = start_manifest(state['pending_incremental'])
+    transform_sources = get_transform_sources()
+    transformed = {
+        table_name for table_name in transform_sources if resume and get_completed_path(manifest, table_name, 'transformed')
+    }
 
+    engines = {}
+    queues = {}
+    extracted = []
+    position = 0
     for db_name, tables in oltp_databases.items():
+        pending = deque()
+        for offset, (table_name, query, chunksize) in enumerate(tables):
+            if resume:
+                file_path = get_completed_path(manifest, table_name, 'extracted')
+                if file_path:
+                    logger.info(f"Resuming with the extracted {table_name} from {file_path}")
+                    extracted.append((position + offset, file_path))
+                    continue
+                # Tables that no transformed table reads (e.g. stay_hotels) are not redone either
+                users = [target for target, sources in transform_sources.items() if table_name in sources]
+                if all(target in transformed for target in users):
+                    logger.info(f"Resuming: {table_name} is not needed by any table left to transform")
+                    continue
+            pending.append(
+                (position + offset, table_name, *get_incremental_query(table_name, query, scope), chunksize)
+            )
+        position += len(tables)
+        if not pending:
+            continue
         try:
             logger.info(f"Connecting to database: {db_name}")
-            engine = create_engine(
-                f"mysql://{os.getenv('OLTP_USER')}:{os.getenv('OLTP_PASSWORD')}@{os.getenv('OLTP_HOST')}:3306/{db_name}"
-            )
-            for table_name, query in tables:
-                try:
-                    logger.info(f"Querying table: {table_name} in {db_name}")
-                    df = pd.read_sql(query, engine)
-                    file_path = get_data_loaded_path(table_name)
-                    df.to_csv(file_path, index=False)
-                    file_paths.append(file_path)
-                    logger.info(f"Successfully extracted and saved {table_name} to {file_path}")
-                except Exception as e:
-                    logger.error(f"Error querying {table_name} in {db_name}: {e}")
-            engine.dispose()
+            engines[db_name] = engine_factory(db_name)
+            queues[db_name] = pending
         except Exception as e:
             logger.error(f"Error connecting to database {db_name}: {e}")
 
+    # Submit worker slots round-robin across databases so that a small pool does
+    # not drain one database before starting on the next
+    slots = []
+    for slot in range(max_workers_per_db):
+        for db_name, pending in queues.items():
+            if slot < len(pending):
+                slots.append(db_name)
+
+    with ThreadPoolExecutor(max_workers=max(1, max_workers)) as executor:
+        futures = [
+            executor.submit(_drain_table_queue, engines[db_name], db_name, queues[db_name], manifest)
+            for db_name in slots
+        ]
+        for future in futures:
+            extracted.extend(future.result())
+
+    for db_name, engine in engines.items():
+        release_engine(engine)
+
+    # Keep the configured table order regardless of completion order
+    file_paths = [file_path for _, file_path in sorted(extracted) if file_path is not None]
     return file_paths
 
-def transformer(file_paths):
+# Reservations joined per batch in transform_fact_table (unset joins them all at once)
+FACT_JOIN_CHUNK_SIZE = int(os.getenv('FACT_JOIN_CHUNK_SIZE', 0)) or None
+# Partitioned fact transform in a process pool: 'month' or 'hotel' (unset runs it in this process)
+FACT_PARTITION_BY = os.getenv('FACT_PARTITION_BY', '')
+FACT_PARTITIONS = int(os.getenv('FACT_PARTITIONS', 0)) or os.cpu_count()
+FACT_PARTITION_WORKERS = int(os.getenv('FACT_PARTITION_WORKERS', 0)) or None
+
+def build_fact_table(data):
+    # The item/stay/payment ids identify the rows to merge, and let the marts of
+    # restated reservations be recomputed from their stored rows
+    if FACT_PARTITION_BY:
+        return transform_fact_table_partitioned(
+            data, by=FACT_PARTITION_BY, partitions=FACT_PARTITIONS, workers=FACT_PARTITION_WORKERS,
+            chunk_size=FACT_JOIN_CHUNK_SIZE, grain_keys=True, directory=STAGING_AREA_PATH
+        )
+    return transform_fact_table(data, chunk_size=FACT_JOIN_CHUNK_SIZE, grain_keys=True)
+
+def transformer(file_paths, force_refresh=False, resume=False):
     logger.info("Starting data transformation process.")
     
     data = {}
     for file_path in file_paths:
-        table_name = os.path.basename(file_path).replace('_loaded.csv', '')
+        table_name = get_table_name(file_path, '_loaded')
         try:
-            df = pd.read_csv(file_path)
-            data[table_name] = df
+            df = read_staged(file_path, memory_map=STAGING_MEMORY_MAP)
+            data[table_name] = ingest_table(table_name, df)
             logger.info(f"Loaded data for table: {table_name}")
         except Exception as e:
             logger.error(f"Error reading {file_path}: {e}")
 
-    fact_table = transform_fact_table(data)
-    dim_tables = transform_dim_tables(data)
+    # With `resume`, tables transformed by the failed run are reused if their files are intact
+    manifest = load_manifest()
+    transformed_files = []
+
+    def reuse_transformed(table_name):
+        file_path = get_completed_path(manifest, table_name, 'transformed') if resume else None
+        if file_path:
+            logger.info(f"Resuming with the transformed {table_name} from {file_path}")
+            transformed_files.append(file_path)
+        return file_path is not None
+
+    staging_format = get_format()
+    if not reuse_transformed('fact_table'):
+        # Watermarks become committed only once the loader has stored this delta
+        state = load_state(WATERMARK_STATE)
+        state['pending'] = compute_watermarks(data, state.get('scope'))
+        save_state(WATERMARK_STATE, state)
+
+        file_path = get_data_transformed_path('fact_table')
+        with measure('transform', 'fact_table') as metrics:
+            fact_table = build_fact_table(data)
+            staging_format.write(fact_table, file_path)
+            metrics.update(rows=len(fact_table), bytes_written=os.path.getsize(file_path))
+        record_stage(manifest, 'fact_table', 'transformed', file_path)
+        transformed_files.append(file_path)
+        logger.info(f"Fact table saved to {file_path}")
+        del fact_table
+
+    # Aggregate marts over the same reservations; for an incremental run these are
+    # the aggregates of the delta, which the loader adds onto the stored ones
+    for table_name in MART_TABLE_SOURCES:
+        if reuse_transformed(f'mart_{table_name}'):
+            continue
+        file_path = get_data_transformed_path(f'mart_{table_name}')
+        with measure('transform', f'mart_{table_name}') as metrics:
+            df = transform_mart(table_name, data)
+            staging_format.write(df, file_path)
+            metrics.update(rows=len(df), bytes_written=os.path.getsize(file_path))
+        record_stage(manifest, f'mart_{table_name}', 'transformed', file_path)
+        transformed_files.append(file_path)
+        logger.info(f"Mart {table_name} saved to {file_path}")
+
+    # A dimension whose source tables hash the same as at the last successful load
+    # is skipped here and in the loader, unless `force_refresh` is set
+    logger.info("Transforming dimension tables.")
+    fingerprints = load_state(FINGERPRINT_STATE)
+    if not resume:
+        fingerprints['pending'] = {}
+    fingerprints.setdefault('pending', {})
+    for table_name, sources in DIM_TABLE_SOURCES.items():
+        if reuse_transformed(f'dim_{table_name}'):
+            continue
+        file_path = get_data_transformed_path(f'dim_{table_name}')
+        with measure('transform', f'dim_{table_name}') as metrics:
+            source_fingerprint = fingerprint([data[source] for source in sources if source in data])
+            if is_unchanged(fingerprints, f'dim_{table_name}', 'sources', source_fingerprint, force_refresh):
+                metrics['cache'] = 'hit'
+                logger.info(f"Dimension table {table_name} is unchanged since the last load; skipping it.")
+                continue
+            df = transform_dim_table(table_name, data)
+            staging_format.write(df, file_path)
+            fingerprints['pending'][f'dim_{table_name}'] = {'sources': source_fingerprint, 'output': fingerprint([df])}
+            metrics.update(rows=len(df), bytes_written=os.path.getsize(file_path), cache='miss')
+        record_stage(manifest, f'dim_{table_name}', 'transformed', file_path)
+        transformed_files.append(file_path)
+        logger.info(f"Dimension table {table_name} saved to {file_path}")
+    save_state(FINGERPRINT_STATE, fingerprints)
 
-    fact_table.to_csv(get_data_transformed_path('fact_table'), index=False)
-    logger.info(f"Fact table saved to {get_data_transformed_path('fact_table')}")
-    
-    for table_name, df in dim_tables.items():
-        df.to_csv(get_data_transformed_path(f'dim_{table_name}'), index=False)
-        logger.info(f"Dimension table {table_name} saved to {get_data_transformed_path(f'dim_{table_name}')}")
-    
     for file_path in file_paths:
         os.remove(file_path)
         logger.info(f"Removed raw data file: {file_path}")
+    forget_tables(manifest, [get_table_name(file_path, '_loaded') for file_path in file_paths])
 
-    transformed_files = [get_data_transformed_path('fact_table')] + [
-        get_data_transformed_path(f'dim_{table_name}') for table_name in dim_tables
-    ]
+    # Fact table first, then the dimensions and marts in config order, as without resume
+    order = ['fact_table'] + [f'dim_{table_name}' for table_name in DIM_TABLE_SOURCES]
+    order += [f'mart_{table_name}' for table_name in MART_TABLE_SOURCES]
+    transformed_files.sort(key=lambda file_path: order.index(get_table_name(file_path, '_transformed')))
 
     logger.info("Data transformation process complete.")
     return transformed_files
 
-def loader(file_paths_transformed):
-    logger.info("Starting data loading process.")
+def commit_watermarks(state, incremental):
+    pending = state.pop('pending', {})
+    state.pop('scope', None)
+    if incremental:
+        # A delta of restated reservations only may end below the committed watermark
+        committed = state.get('committed', {})
+        state['committed'] = {
+            **committed,
+            **{table_name: max(value, committed.get(table_name, value)) for table_name, value in pending.items()}
+        }
+    else:
+        state['committed'] = pending
+    state['pending_incremental'] = False
+    save_state(WATERMARK_STATE, state)
+    logger.info(f"Committed watermarks: {state['committed']}")
+
+# Warehouse write strategy: 'auto' (LOAD DATA on MySQL, executemany elsewhere),
+# 'load_data', 'executemany' or 'to_sql'
+LOAD_STRATEGY = os.getenv('LOAD_STRATEGY', 'auto')
+# Fact load mode: 'replace' (incremental deltas replace the rows of their reservations)
+# or 'merge', which upserts mst_reservation on the reservation id plus the item/stay/payment grain
+LOAD_MODE = os.getenv('LOAD_MODE', 'replace')
+FACT_MERGE_KEYS = ['id'] + FACT_GRAIN_COLUMNS
+# Marts of an incremental run are added onto the rows of these partition columns
+MART_KEYS = {f'mart_{name}': WAREHOUSE_TABLES[f'mart_{name}']['primary_key'] for name in MART_TABLE_SOURCES}
+# Keys whose stored rows a published delta replaces (appended tables) or adds onto (marts)
+PUBLISH_KEYS = {'mst_reservation': ['id'], **MART_KEYS}
 
-    engine = create_engine(
-                f"mysql://{os.getenv('DATA_WAREHOUSE_USER')}:{os.getenv('DATA_WAREHOUSE_PASSWORD')}@{os.getenv('DATA_WAREHOUSE_HOST')}:3306/{os.getenv('DATA_WAREHOUSE_DB')}"
+def get_target_table(table_name):
+    if table_name == 'fact_table':
+        return 'mst_reservation'
+    return table_name.replace('dim_', '', 1)
+
+# Time an equality lookup on each declared index's leading column before and after
+# the indexes are built, and record the speedup in the run report
+MEASURE_INDEX_LOOKUPS = os.getenv('MEASURE_INDEX_LOOKUPS', 'false').lower() == 'true'
+
+def build_indexes(conn, table_name, target_table, df):
+    """Create the keys and indexes WAREHOUSE_TABLES declares for `target_table` on the filled `table_name`."""
+    definition = WAREHOUSE_TABLES.get(target_table)
+    if not definition:
+        return
+    lookups = sample_lookups(df, definition) if MEASURE_INDEX_LOOKUPS else {}
+    before = time_lookups(conn, table_name, lookups)
+    with measure('index', target_table) as metrics:
+        create_table_indexes(conn, table_name, definition, target_table)
+        conn.commit()
+        metrics['rows'] = len(df)
+    if lookups:
+        after = time_lookups(conn, table_name, lookups)
+        for column in lookups:
+            logger.info(
+                f"Lookup on {target_table}.{column}: {before[column] * 1000:.2f}ms without index, "
+                f"{after[column] * 1000:.2f}ms with it"
+            )
+        report = get_report()
+        if report is not None:
+            report.record(
+                'lookup', target_table, sum(after.values()), rows=len(lookups),
+                speedup=round(sum(before.values()) / max(sum(after.values()), 1e-9), 2)
             )
 
-    with engine.connect() as conn:
+def get_restated_facts(conn, scope):
+    """Stored fact rows, one per reservation and item, of the reservations an incremental `scope` restates."""
+    columns = RESERVATION_COLUMNS + ['room_type', 'item_id']
+    if scope is None or not has_table(conn, 'mst_reservation'):
+        return pd.DataFrame(columns=columns)
+    condition, params = get_restated_filter('id', scope)
+    facts = pd.read_sql(text(f"SELECT {', '.join(columns)} FROM mst_reservation WHERE {condition}"), conn, params=params)
+    return facts.drop_duplicates(['id', 'item_id'])
+
+def subtract_restated_facts(conn, table_name, df, scope):
+    """Turn the mart of an incremental delta into the change to add onto the stored mart.
+
+    Restated reservations were already counted from their stored fact rows, so
+    the mart of those rows is subtracted. Rows that change nothing are dropped.
+    """
+    facts = get_restated_facts(conn, scope)
+    if not len(facts):
+        return df
+    name = table_name.replace('mart_', '', 1)
+    data = {PUSHDOWN_FACT_TABLE: facts}
+    if 'vouchers' in MART_TABLE_SOURCES[name]:
+        data['vouchers'] = pd.read_sql(text("SELECT code, campaign_id FROM voucher"), conn)
+    stored = transform_mart(name, data)
+    keys = MART_KEYS[table_name]
+    measures = [column for column in df.columns if column not in keys]
+    if len(df):
+        # CSV staging files hold the dates as text
+        dates = [column for column in keys if pd.api.types.is_datetime64_any_dtype(stored[column])]
+        df = df.assign(**{column: pd.to_datetime(df[column]) for column in dates})
+        stored = stored.astype({column: df[column].dtype for column in keys})
+    change = df.set_index(keys)[measures].sub(stored.set_index(keys)[measures], fill_value=0)
+    change = change[(change.abs() > 1e-9).any(axis=1)].reset_index()
+    for column in measures:
+        if pd.api.types.is_integer_dtype(df[column]):
+            change[column] = change[column].round().astype(df[column].dtype)
+    logger.info(f"Subtracted {len(facts)} restated reservation items from {table_name}")
+    return change[list(df.columns)]
+
+def load_to_shadow(conn, table_name, df, incremental, parts=1, slots=None, scope=None):
+    """Write one transformed table to its shadow table and return how it is published.
+
+    With `parts` > 1 the rows are split into id ranges written over that many
+    pooled connections, limited by the `slots` semaphore. A shadow table that
+    replaces its live table gets its declared keys and indexes once it is
+    filled; shadows that are appended or merged only ensure the live table has them.
+    The marts of an incremental run are reduced by what the reservations its
+    `scope` restates contributed before.
+    """
+    target_table = get_target_table(table_name)
+    shadow_table = get_shadow_name(target_table)
+    mode = 'replace'
+    if table_name == 'fact_table' and LOAD_MODE == 'merge':
+        df = add_merge_keys(df, FACT_MERGE_KEYS)
+        # The first merge run (re)builds the table with its merge columns
+        if has_table(conn, target_table) and has_column(conn, target_table, 'merge_key'):
+            mode = 'merge'
+    elif table_name == 'fact_table' and incremental:
+        mode = 'append'
+    elif table_name.startswith('mart_') and incremental:
+        mode = 'accumulate'
+        df = subtract_restated_facts(conn, target_table, df, scope)
+    column_types = get_column_types(target_table, df)
+    if parts > 1:
+        # End this connection's transaction first; SQLite blocks writers while a reader has one open
+        conn.commit()
+        write_table_parallel(
+            df, shadow_table, conn.engine, parts=parts, slots=slots, strategy=LOAD_STRATEGY, dtype=column_types
+        )
+    else:
+        write_table(df, shadow_table, conn, if_exists='replace', strategy=LOAD_STRATEGY, dtype=column_types)
+        conn.commit()
+    if mode == 'replace':
+        build_indexes(conn, shadow_table, target_table, df)
+    elif has_table(conn, target_table):
+        build_indexes(conn, target_table, target_table, df)
+    return mode
+
+# Parallel loading: tables (and fact table id ranges) written at the same time, each
+# on its own pooled connection. 1 loads one table after the other on one connection.
+LOAD_CONCURRENCY = int(os.getenv('LOAD_CONCURRENCY', 1))
+# Id ranges the fact table is split into when loading in parallel (default: LOAD_CONCURRENCY)
+FACT_LOAD_PARTS = int(os.getenv('FACT_LOAD_PARTS', 0)) or None
+
+def validate_staged_frame(file_path, target_table, df):
+    """Raise a ValueError if `df` lacks the key columns of `target_table`, so a damaged file is never published."""
+    missing = [column for column in get_required_columns(target_table) if column not in df.columns]
+    if missing:
+        raise ValueError(f"{file_path} lacks columns {missing} of {target_table}")
+
+def _load_file(engine, file_path, table_name, incremental, scope, slots, fact_parts, pending_fingerprints, manifest):
+    target_table = get_target_table(table_name)
+    with measure('load', target_table) as metrics:
+        verify_completed_path(manifest, table_name, file_path)
+        df = read_staged(file_path, memory_map=STAGING_MEMORY_MAP)
+        validate_staged_frame(file_path, target_table, df)
+        if table_name == 'fact_table' and fact_parts > 1:
+            # The ranges take their own slots, so this connection only decides the mode
+            with engine.connect() as conn:
+                mode = load_to_shadow(conn, table_name, df, incremental, parts=fact_parts, slots=slots)
+        else:
+            with slots, engine.connect() as conn:
+                mode = load_to_shadow(conn, table_name, df, incremental, scope=scope)
+        metrics.update(rows=len(df), bytes_read=os.path.getsize(file_path))
+        if table_name in pending_fingerprints:
+            metrics['cache'] = 'miss'
+    return mode
+
+def loader(file_paths_transformed, engine=None, force_refresh=False, concurrency=None, fact_parts=None):
+    """Load the transformed files into their shadow tables, then publish them together.
+
+    Up to `concurrency` tables are loaded at once, each over its own pooled
+    connection, and the fact table is split into `fact_parts` id ranges loaded
+    in parallel; a warehouse that takes one writer at a time (SQLite) is loaded
+    over one connection. Every table that fails is logged and named in the RuntimeError.
+    """
+    logger.info("Starting data loading process.")
+
+    engine = engine or get_warehouse_engine()
+    concurrency = get_write_concurrency(engine, max(1, concurrency or LOAD_CONCURRENCY))
+    fact_parts = get_write_concurrency(engine, fact_parts or FACT_LOAD_PARTS or concurrency)
+
+    # A delta extracted past the committed watermarks replaces its reservations' rows in mst_reservation
+    state = load_state(WATERMARK_STATE)
+    incremental = state.get('pending_incremental', False)
+    scope = state.get('scope')
+
+    # Dimensions whose transformed output matches the last successful load are not reloaded
+    fingerprints = load_state(FINGERPRINT_STATE)
+    pending_fingerprints = fingerprints.get('pending', {})
+    unchanged = []
+
+    # Transformed files are checked against the checksums the transformer recorded
+    manifest = load_manifest()
+
+    # Every table is first written to its shadow table; the live tables are only
+    # touched once all of them loaded, so a failed run leaves the previous data intact
+    loaded = {}
+    failed = []
+    slots = threading.BoundedSemaphore(concurrency)
+    futures = {}
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
         for file_path in file_paths_transformed:
-            table_name = os.path.basename(file_path).replace('_transformed.csv', '')
+            table_name = get_table_name(file_path, '_transformed')
+            target_table = get_target_table(table_name)
 
-            try:
-                df = pd.read_csv(file_path)
+            output_fingerprint = pending_fingerprints.get(table_name, {}).get('output')
+            if is_unchanged(fingerprints, table_name, 'output', output_fingerprint, force_refresh):
+                with measure('load', target_table) as metrics:
+                    metrics['cache'] = 'hit'
+                unchanged.append(table_name)
+                logger.info(f"Table {target_table} is unchanged since the last load; skipping it.")
+                continue
 
-                if table_name == 'fact_table':
-                    df.to_sql(
-                        'mst_reservation', conn, if_exists='replace', index=False, 
-                        method='multi', chunksize=1000
-                    )
-                    logger.info(f"Loaded fact table into mst_reservation from {file_path}")
-
-                elif table_name.startswith('dim_'):
-                    dimension_table = table_name.replace('dim_', '')
-                    df.to_sql(
-                        dimension_table, conn, if_exists='replace', index=False,
-                        method='multi', chunksize=1000
-                    )
-                    logger.info(f"Loaded dimension table {dimension_table} from {file_path}")
+            futures[file_path] = executor.submit(
+                _load_file, engine, file_path, table_name, incremental, scope, slots, fact_parts, pending_fingerprints,
+                manifest
+            )
 
+        for file_path, future in futures.items():
+            table_name = get_table_name(file_path, '_transformed')
+            target_table = get_target_table(table_name)
+            try:
+                loaded[target_table] = future.result()
+                if table_name == 'fact_table':
+                    logger.info(f"Loaded fact table into mst_reservation shadow table from {file_path}")
+                elif table_name.startswith('mart_'):
+                    logger.info(f"Loaded mart {target_table} shadow table from {file_path}")
+                else:
+                    logger.info(f"Loaded dimension table {target_table} shadow table from {file_path}")
             except Exception as e:
                 logger.error(f"Error loading data into table {table_name}: {e}")
+                failed.append(table_name)
+
+    with engine.connect() as conn:
+        if failed:
+            drop_shadow_tables(conn, [get_target_table(get_table_name(file_path, '_transformed')) for file_path in futures])
+            raise RuntimeError(f"Loading failed for tables {failed}; warehouse tables were left unchanged.")
+
+        with measure('publish', ','.join(loaded)):
+            publish_shadow_tables(conn, loaded, keys=PUBLISH_KEYS)
+
+    if 'mst_reservation' in loaded:
+        commit_watermarks(state, incremental)
+    commit_fingerprints(
+        fingerprints, unchanged + [get_table_name(file_path, '_transformed') for file_path in file_paths_transformed]
+    )
 
     for file_path in file_paths_transformed:
         os.remove(file_path)
         logger.info(f"Removed transformed data file: {file_path}")
+    # The run is complete; nothing is left to resume
+    clear_manifest()
 
     logger.info("Data loading process complete.")
     return 'Loading successful.'
 
-if __name__ == "__main__":
+def run_etl(full_refresh=False, pipelined=False, checkpoint=False, force_refresh=False, resume=False):
     logger.info("ETL process started.")
+    # Per-table timings, rows, bytes and peak RSS go to ETL_<run>_report.json/.csv in LOG_DIR
+    start_report(LOG_DIR)
+    # A full refresh also reloads the dimension tables whose sources are unchanged
+    force_refresh = force_refresh or full_refresh
     try:
-        filepath = extractor()
-        transformed_files = transformer(filepath)
-        loader(transformed_files)
+        if pipelined:
+            from pipeline import run_pipeline
+            if resume:
+                logger.warning("Pipelined runs pass tables in memory and cannot resume; running in full.")
+            run_pipeline(incremental=not full_refresh, checkpoint=checkpoint, force_refresh=force_refresh)
+        else:
+            filepath = extractor(incremental=not full_refresh, resume=resume)
+            transformed_files = transformer(filepath, force_refresh=force_refresh, resume=resume)
+            loader(transformed_files, force_refresh=force_refresh)
         logger.info("ETL process completed successfully.")
+        return True
     except Exception as e:
         logger.error(f"ETL process failed: {e}")
+        return False
+    finally:
+        finish_report()
+
+def run_daemon(interval, full_refresh=False, max_runs=None, force_refresh=False, **kwargs):
+    """Run the ETL every `interval` seconds in this process.
+
+    Imports, settings and the pooled engines in the registry stay warm between
+    runs. A failed run is logged and the schedule carries on. `full_refresh`
+    and `force_refresh` only apply to the first run.
+    """
+    logger.info(f"ETL daemon started with an interval of {interval} seconds.")
+    runs = 0
+    try:
+        while max_runs is None or runs < max_runs:
+            started = time.monotonic()
+            run_etl(full_refresh=full_refresh and runs == 0, force_refresh=force_refresh and runs == 0, **kwargs)
+            runs += 1
+            if max_runs is not None and runs >= max_runs:
+                break
+            # Keep a fixed cadence: the next run starts `interval` after this one started
+            time.sleep(max(0.0, interval - (time.monotonic() - started)))
+    except KeyboardInterrupt:
+        logger.info("ETL daemon interrupted.")
+    finally:
+        dispose_engines()
+        logger.info("ETL daemon stopped.")
+    return runs
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run the hotel reservation ETL.")
+    parser.add_argument(
+        '--full-refresh', action='store_true',
+        help="Ignore the stored watermarks and re-extract and replace the fact table in full."
+    )
+    parser.add_argument(
+        '--force-refresh', action='store_true',
+        help="Transform and reload every dimension table, even those whose sources are unchanged."
+    )
+    parser.add_argument(
+        '--resume', action='store_true',
+        help="Continue the last failed run: reuse its intact extracted and transformed files and redo only the rest."
+    )
+    parser.add_argument(
+        '--pipelined', action='store_true',
+        help="Overlap extraction, transformation and loading, passing tables in memory."
+    )
+    parser.add_argument(
+        '--checkpoint', action='store_true',
+        help="With --pipelined, also write extracted and transformed tables to the staging area."
+    )
+    parser.add_argument(
+        '--daemon', action='store_true',
+        help="Keep running and start a new ETL run every --interval seconds."
+    )
+    parser.add_argument(
+        '--interval', type=int, default=int(os.getenv('ETL_INTERVAL_SECONDS', 3600)),
+        help="Seconds between the starts of two runs in --daemon mode (default: 3600)."
+    )
+    args = parser.parse_args()
+
+    options = {
+        'full_refresh': args.full_refresh, 'pipelined': args.pipelined, 'checkpoint': args.checkpoint,
+        'force_refresh': args.force_refresh, 'resume': args.resume
+    }
+    if args.daemon:
+        run_daemon(args.interval, **options)
+    else:
+        run_etl(**options)
+        dispose_engines()
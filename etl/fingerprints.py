@@ -0,0 +1,41 @@
+import hashlib
+import logging
+import numpy as np
+import pandas as pd
+from state import save_state
+
+logger = logging.getLogger(__name__)
+
+# Content hashes of each dimension's source tables and transformed output, as of the
+# last successful load. Unchanged dimensions are neither transformed nor reloaded.
+FINGERPRINT_STATE = 'fingerprints'
+
+def fingerprint(frames):
+    """Content hash of one or more DataFrames.
+
+    Covers column names, dtypes and row contents, but not row order: the sources
+    are read without an ORDER BY, so the same rows may come back in another order.
+    """
+    digest = hashlib.sha256()
+    for df in frames:
+        digest.update(repr([(str(column), str(dtype)) for column, dtype in df.dtypes.items()]).encode())
+        row_hashes = pd.util.hash_pandas_object(df, index=False).to_numpy()
+        digest.update(np.sort(row_hashes).tobytes())
+    return digest.hexdigest()
+
+def get_committed_fingerprint(state, table_name, kind):
+    return state.get('committed', {}).get(table_name, {}).get(kind)
+
+def is_unchanged(state, table_name, kind, value, force_refresh=False):
+    """Whether `value` matches the `kind` ('sources' or 'output') hash of the last successful load."""
+    return not force_refresh and value is not None and get_committed_fingerprint(state, table_name, kind) == value
+
+def commit_fingerprints(state, table_names):
+    """Mark the pending fingerprints of `table_names` as loaded."""
+    pending = state.pop('pending', {})
+    committed = state.setdefault('committed', {})
+    for table_name in table_names:
+        if table_name in pending:
+            committed[table_name] = pending[table_name]
+    save_state(FINGERPRINT_STATE, state)
+    logger.info(f"Committed fingerprints for {sorted(table_name for table_name in table_names if table_name in pending)}")
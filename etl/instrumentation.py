@@ -0,0 +1,165 @@
+import os
+import sys
+import csv
+import json
+import time
+import logging
+import cProfile
+import threading
+from contextlib import contextmanager
+from datetime import datetime
+
+try:
+    import resource
+except ImportError:  # Not available on Windows
+    resource = None
+
+logger = logging.getLogger(__name__)
+
+# Stages to profile with cProfile: comma-separated 'stage' or 'stage:table' entries,
+# e.g. 'transform:fact_table,load'. Each match is dumped to a .prof file next to the report;
+# stages run without a started report are not profiled.
+ETL_PROFILE = os.getenv('ETL_PROFILE', '')
+
+REPORT_FIELDS = [
+    'stage', 'table', 'status', 'cache', 'seconds', 'rows', 'rows_per_sec', 'bytes_read', 'bytes_written',
+    'memory_before', 'memory_after', 'speedup', 'peak_rss_mb'
+]
+
+_current = None
+
+def get_peak_rss_mb():
+    """Peak resident set size of this process so far, in MB (None where unsupported)."""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in kilobytes on Linux and in bytes on macOS
+    return round(peak / (2**20 if sys.platform == 'darwin' else 2**10), 1)
+
+def get_frame_bytes(df):
+    return int(df.memory_usage(deep=True).sum())
+
+class RunReport:
+    """Measurements of one ETL run, written as JSON and CSV into `directory`."""
+
+    def __init__(self, directory, run_id=None):
+        self.directory = directory
+        self.run_id = run_id or datetime.now().strftime("%Y%m%d_%H%M%S")
+        self.started = datetime.now()
+        self.records = []
+        self._lock = threading.Lock()
+
+    def get_path(self, suffix):
+        return os.path.join(self.directory, f"ETL_{self.run_id}_{suffix}")
+
+    def record(self, stage, table, seconds, status='ok', cache=None, rows=None, bytes_read=None, bytes_written=None,
+               memory_before=None, memory_after=None, speedup=None):
+        record = {
+            'stage': stage,
+            'table': table,
+            'status': status,
+            'cache': cache,
+            'seconds': round(seconds, 4),
+            'rows': rows,
+            'rows_per_sec': round(rows / seconds) if rows is not None and seconds > 0 else None,
+            'bytes_read': bytes_read,
+            'bytes_written': bytes_written,
+            'memory_before': memory_before,
+            'memory_after': memory_after,
+            'speedup': speedup,
+            'peak_rss_mb': get_peak_rss_mb()
+        }
+        with self._lock:
+            self.records.append(record)
+        return record
+
+    def write(self):
+        if not os.path.exists(self.directory):
+            os.makedirs(self.directory)
+        finished = datetime.now()
+        json_path = self.get_path('report.json')
+        with open(json_path, 'w') as f:
+            json.dump({
+                'run_id': self.run_id,
+                'started': self.started.isoformat(),
+                'finished': finished.isoformat(),
+                'seconds': round((finished - self.started).total_seconds(), 4),
+                'peak_rss_mb': get_peak_rss_mb(),
+                'records': self.records
+            }, f, indent=2)
+        csv_path = self.get_path('report.csv')
+        with open(csv_path, 'w', newline='') as f:
+            writer = csv.DictWriter(f, fieldnames=REPORT_FIELDS)
+            writer.writeheader()
+            writer.writerows(self.records)
+        return json_path, csv_path
+
+def start_report(directory, run_id=None):
+    """Start collecting measurements for a run; measure() records into it until finish_report()."""
+    global _current
+    _current = RunReport(directory, run_id)
+    return _current
+
+def get_report():
+    return _current
+
+def finish_report():
+    """Write the current report and stop collecting. Returns the (json, csv) paths or None."""
+    global _current
+    report, _current = _current, None
+    if report is None:
+        return None
+    try:
+        paths = report.write()
+        logger.info(f"Run report written to {paths[0]} and {paths[1]}")
+        return paths
+    except Exception as e:
+        logger.error(f"Error writing run report: {e}")
+        return None
+
+def should_profile(stage, table):
+    targets = [target.strip() for target in ETL_PROFILE.split(',') if target.strip()]
+    return stage in targets or f"{stage}:{table}" in targets
+
+@contextmanager
+def measure(stage, table):
+    """Time a block and record it in the current run report.
+
+    The block fills in the yielded dict with any of `rows`, `bytes_read`,
+    `bytes_written`, `memory_before`/`memory_after` (in-memory bytes of a table
+    before and after a conversion) and `cache` ('hit' or 'miss' for
+    fingerprinted tables). A block that raises is recorded with status 'failed'.
+    """
+    metrics = {}
+    status = 'ok'
+    profiler = None
+    # Profiles are written next to the report, so they need a started report
+    report = _current
+    if report is not None and should_profile(stage, table):
+        try:
+            profiler = cProfile.Profile()
+            profiler.enable()
+        except ValueError as e:
+            # Only one profiler can be active at a time on newer Pythons
+            logger.warning(f"Could not profile {stage} {table}: {e}")
+            profiler = None
+    start = time.perf_counter()
+    try:
+        yield metrics
+    except BaseException:
+        status = 'failed'
+        raise
+    finally:
+        elapsed = time.perf_counter() - start
+        if profiler is not None:
+            profiler.disable()
+            profile_path = report.get_path(f"{stage}_{table}.prof")
+            os.makedirs(os.path.dirname(profile_path) or '.', exist_ok=True)
+            profiler.dump_stats(profile_path)
+            logger.info(f"Profile of {stage} {table} written to {profile_path}")
+        rows = metrics.get('rows')
+        logger.info(
+            f"Measured {stage} {table}: {elapsed:.3f}s" + (f", {rows} rows ({rows / elapsed:,.0f} rows/s)" if rows and elapsed > 0 else "")
+        )
+        if _current is not None:
+            _current.record(stage, table, elapsed, status=status, **metrics)
@@ -0,0 +1,64 @@
+import os
+import hashlib
+import logging
+import threading
+from datetime import datetime
+from state import load_state, save_state
+
+logger = logging.getLogger(__name__)
+
+# Files each table of the current run has completed, so that a failed run can be
+# resumed without redoing them, and whether the run was incremental, so that a resumed
+# run keeps the mode its staged files were extracted in. Cleared once a run has loaded successfully.
+MANIFEST_STATE = 'manifest'
+
+_lock = threading.Lock()
+
+def file_checksum(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+def start_manifest(incremental=False):
+    manifest = {'started': datetime.now().isoformat(), 'incremental': incremental, 'tables': {}}
+    save_state(MANIFEST_STATE, manifest)
+    return manifest
+
+def load_manifest():
+    manifest = load_state(MANIFEST_STATE)
+    manifest.setdefault('tables', {})
+    return manifest
+
+def record_stage(manifest, table_name, stage, path):
+    """Record that `table_name` completed `stage` ('extracted' or 'transformed') into `path`."""
+    entry = {'stage': stage, 'path': path, 'checksum': file_checksum(path), 'completed': datetime.now().isoformat()}
+    with _lock:
+        manifest['tables'][table_name] = entry
+        save_state(MANIFEST_STATE, manifest)
+
+def forget_tables(manifest, table_names):
+    with _lock:
+        for table_name in table_names:
+            manifest['tables'].pop(table_name, None)
+        save_state(MANIFEST_STATE, manifest)
+
+def get_completed_path(manifest, table_name, stage):
+    """Path of the file `table_name` wrote in `stage`, if it is still there and unchanged."""
+    entry = manifest['tables'].get(table_name)
+    if not entry or entry['stage'] != stage or not os.path.exists(entry['path']):
+        return None
+    if file_checksum(entry['path']) != entry['checksum']:
+        logger.warning(f"Checksum mismatch for {entry['path']}; redoing {table_name}")
+        return None
+    return entry['path']
+
+def verify_completed_path(manifest, table_name, path):
+    """Raise a ValueError if `path` changed since `table_name` recorded it in the manifest."""
+    entry = manifest['tables'].get(table_name)
+    if entry and entry['path'] == path and file_checksum(path) != entry['checksum']:
+        raise ValueError(f"Checksum mismatch for {path}; it changed since {table_name} was staged")
+
+def clear_manifest():
+    save_state(MANIFEST_STATE, {})
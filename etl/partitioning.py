@@ -0,0 +1,126 @@
+import os
+import logging
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import pandas as pd
+from transformations import join_fact_tables, transform_fact_table
+
+try:
+    import pyarrow.feather as feather
+except ImportError:  # Partitioned transforms hand data to workers through Arrow IPC files
+    feather = None
+
+logger = logging.getLogger(__name__)
+
+# Child tables and the column holding their reservation id
+PARTITION_CHILD_KEYS = {
+    'reservation_items': 'reservation_id',
+    'stays': 'reference_reservation_id',
+    'payments': 'reservation_id'
+}
+
+def assign_partitions(reservations, by='month', partitions=8):
+    """Partition number of each reservation, from 0 to `partitions` - 1.
+
+    'month' groups consecutive reservation months into `partitions` ranges;
+    'hotel' hashes hotel_id.
+    """
+    if by == 'month':
+        months = pd.to_datetime(reservations['reservation_datetime'], errors='coerce').dt.to_period('M')
+        codes, uniques = pd.factorize(months, sort=True, use_na_sentinel=False)
+        return (codes * partitions // max(len(uniques), 1)).astype(np.int64)
+    if by == 'hotel':
+        return (pd.util.hash_pandas_object(reservations['hotel_id'], index=False).to_numpy() % partitions).astype(np.int64)
+    raise ValueError(f"Unknown fact partitioning: {by}")
+
+def _split(df, codes):
+    # One stable sort instead of a boolean mask per partition; rows keep their order within a partition
+    if not len(df):
+        return {}
+    order = np.argsort(codes, kind='stable')
+    sorted_codes = codes[order]
+    bounds = np.flatnonzero(np.diff(sorted_codes)) + 1
+    return {int(rows_codes[0]): df.iloc[rows] for rows, rows_codes in zip(np.split(order, bounds), np.split(sorted_codes, bounds))}
+
+def write_partitions(data, codes, directory):
+    """Write each partition's reservations and their items, stays and payments as Arrow IPC files.
+
+    Children are routed to the partition of their reservation; children without
+    a reservation are dropped, as the left join from reservations would drop them.
+    Returns {partition: {table_name: path}}.
+    """
+    tables = {'reservations': _split(data['reservations'], codes)}
+    reservation_index = pd.Index(data['reservations']['id'])
+    for table_name, key in PARTITION_CHILD_KEYS.items():
+        child = data[table_name]
+        positions = reservation_index.get_indexer(child[key])
+        matched = positions >= 0
+        tables[table_name] = _split(child[matched], codes[positions[matched]])
+
+    paths = {}
+    for partition, reservations in tables['reservations'].items():
+        paths[partition] = {}
+        for table_name, parts in tables.items():
+            # An empty slice keeps the columns and dtypes of a partition without children
+            df = parts.get(partition, data[table_name].iloc[:0])
+            path = os.path.join(directory, f"partition_{partition}_{table_name}.arrow")
+            # Uncompressed so that workers can memory-map the buffers instead of decoding them
+            feather.write_feather(df.reset_index(drop=True), path, compression='uncompressed')
+            paths[partition][table_name] = path
+    return paths
+
+def _read_mapped(path):
+    return feather.read_table(path, memory_map=True).to_pandas()
+
+def transform_partition(paths, output_path, chunk_size=None, grain_keys=False):
+    """Worker: join one partition read from memory-mapped files and write the result next to them."""
+    data = {table_name: _read_mapped(path) for table_name, path in paths.items()}
+    fact_table = join_fact_tables(
+        data['reservations'], data['reservation_items'], data['stays'], data['payments'],
+        chunk_size=chunk_size, grain_keys=grain_keys
+    )
+    feather.write_feather(fact_table, output_path, compression='uncompressed')
+    return output_path
+
+def transform_fact_table_partitioned(data, by='month', partitions=8, workers=None, chunk_size=None,
+                                     grain_keys=False, directory=None):
+    """transform_fact_table() with the reservations partitioned across a process pool.
+
+    Reservations are split by `by` ('month' or 'hotel'). Each partition's tables
+    are handed to the workers as uncompressed Arrow IPC files that the workers
+    memory-map, and the workers return their results the same way, so no
+    DataFrame is pickled between processes. The partial results are put back in
+    reservation order, giving the same table as the serial path.
+    """
+    reservations = data.get('reservations')
+    if feather is None or reservations is None or not len(reservations) or not reservations['id'].is_unique:
+        logger.warning(
+            "Partitioned fact transform needs pyarrow and separately extracted reservations with unique ids; "
+            "running it serially."
+        )
+        return transform_fact_table(data, chunk_size=chunk_size, grain_keys=grain_keys)
+
+    logger.info(f"Transforming fact table in partitions by {by}.")
+    codes = assign_partitions(reservations, by, partitions)
+    with tempfile.TemporaryDirectory(dir=directory) as tmp_dir:
+        partition_paths = write_partitions(data, codes, tmp_dir)
+        logger.info(f"Split {len(reservations)} reservations into {len(partition_paths)} partitions")
+        with ProcessPoolExecutor(max_workers=workers or os.cpu_count()) as executor:
+            futures = [
+                executor.submit(
+                    transform_partition, paths, os.path.join(tmp_dir, f"partition_{partition}_fact.arrow"),
+                    chunk_size, grain_keys
+                )
+                for partition, paths in sorted(partition_paths.items())
+            ]
+            fact_table = pd.concat([_read_mapped(future.result()) for future in futures], ignore_index=True)
+
+    # Rows of one reservation come from one partition in their serial order, so a
+    # stable sort on the reservation's position restores the serial row order
+    order = pd.Index(reservations['id']).get_indexer(fact_table['id'])
+    fact_table = fact_table.iloc[np.argsort(order, kind='stable')].reset_index(drop=True)
+    fact_table.attrs['expansion_factor'] = len(fact_table) / len(reservations)
+
+    logger.info("Fact table transformation complete.")
+    return fact_table
@@ -0,0 +1,204 @@
+import os
+import queue
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+import extract_transform_load as etl
+from transformations import transform_dim_table, transform_mart
+from state import load_state
+from manifest import clear_manifest
+from fingerprints import FINGERPRINT_STATE, fingerprint, is_unchanged, commit_fingerprints
+from warehouse import drop_shadow_tables, publish_shadow_tables
+from engines import get_oltp_engine, get_warehouse_engine, release_engine
+from instrumentation import measure, get_frame_bytes
+
+logger = logging.getLogger(__name__)
+
+# Extracted tables buffered between extraction and the transform/load workers
+PIPELINE_QUEUE_SIZE = int(os.getenv('PIPELINE_QUEUE_SIZE', 4))
+# Transform/load workers running behind extraction
+PIPELINE_WORKERS = int(os.getenv('PIPELINE_WORKERS', 2))
+
+def build_dependency_graph():
+    """Map each transformed table to the extracted tables it is built from."""
+    return etl.get_transform_sources()
+
+def _extract_to_queue(engine, db_name, table_name, query, chunksize, params, db_slots, results, checkpoint):
+    df = None
+    with db_slots:
+        try:
+            logger.info(f"Querying table: {table_name} in {db_name}")
+            with measure('extract', table_name) as metrics:
+                df = etl.read_table(engine, query, chunksize, params)
+                metrics.update(rows=len(df), bytes_read=get_frame_bytes(df))
+                if checkpoint:
+                    etl.get_format().write(df, etl.get_data_loaded_path(table_name))
+                    metrics['bytes_written'] = os.path.getsize(etl.get_data_loaded_path(table_name))
+            df = etl.ingest_table(table_name, df)
+            logger.info(f"Successfully extracted {len(df)} rows of {table_name}")
+        except Exception as e:
+            logger.error(f"Error querying {table_name} in {db_name}: {e}")
+    # Blocks while the queue is full, so extraction cannot run arbitrarily far ahead
+    results.put((table_name, df))
+
+def _transform_and_load(table_name, data, engine, incremental, checkpoint, fingerprints=None, force_refresh=False,
+                        scope=None):
+    """Transform one table and load it into its shadow table.
+
+    Returns (mode, watermarks, fingerprints). Dimensions whose sources or output
+    match the last successful load are skipped and return a mode of None.
+    """
+    watermarks = None
+    table_fingerprints = None
+    fingerprints = fingerprints or {}
+    with measure('transform', table_name) as metrics:
+        if table_name == 'fact_table':
+            watermarks = etl.compute_watermarks(data, scope)
+            df = etl.build_fact_table(data)
+        elif table_name.startswith('mart_'):
+            df = transform_mart(table_name.replace('mart_', '', 1), data)
+        else:
+            source_fingerprint = fingerprint(data.values())
+            if is_unchanged(fingerprints, table_name, 'sources', source_fingerprint, force_refresh):
+                metrics['cache'] = 'hit'
+                logger.info(f"Dimension table {table_name} is unchanged since the last load; skipping it.")
+                return None, None, None
+            df = transform_dim_table(table_name.replace('dim_', '', 1), data)
+            table_fingerprints = {'sources': source_fingerprint, 'output': fingerprint([df])}
+            metrics['cache'] = 'miss'
+        metrics['rows'] = len(df)
+        if checkpoint:
+            etl.get_format().write(df, etl.get_data_transformed_path(table_name))
+            metrics['bytes_written'] = os.path.getsize(etl.get_data_transformed_path(table_name))
+    if table_fingerprints and is_unchanged(fingerprints, table_name, 'output', table_fingerprints['output'], force_refresh):
+        with measure('load', etl.get_target_table(table_name)) as metrics:
+            metrics['cache'] = 'hit'
+        logger.info(f"Table {etl.get_target_table(table_name)} is unchanged since the last load; skipping it.")
+        return None, None, table_fingerprints
+    with measure('load', etl.get_target_table(table_name)) as metrics, engine.connect() as conn:
+        mode = etl.load_to_shadow(conn, table_name, df, incremental, scope=scope)
+        metrics.update(rows=len(df), bytes_read=get_frame_bytes(df))
+    logger.info(f"Loaded {table_name} into {etl.get_target_table(table_name)} shadow table")
+    return mode, watermarks, table_fingerprints
+
+def run_pipeline(engine_factory=get_oltp_engine, warehouse_engine=None, incremental=False,
+                 max_workers=None, max_workers_per_db=None, workers=None, queue_size=None, checkpoint=False,
+                 force_refresh=False):
+    """Extract, transform and load with the stages overlapping.
+
+    Each transformed table is built and loaded into its shadow table as soon as
+    the tables it reads have been extracted, while extraction carries on. The
+    extracted DataFrames are handed over in memory through a bounded queue.
+    With `checkpoint` they (and the transformed tables) are also written to the
+    staging area. The shadow tables are published together at the end, as in
+    loader(). Dimensions whose content is unchanged since the last successful
+    load are skipped unless `force_refresh` is set.
+    """
+    logger.info("Starting pipelined ETL run.")
+    max_workers = max_workers or etl.EXTRACT_MAX_WORKERS
+    max_workers_per_db = max_workers_per_db or etl.EXTRACT_MAX_WORKERS_PER_DB
+    warehouse_engine = warehouse_engine or get_warehouse_engine()
+
+    graph = build_dependency_graph()
+    needed = {source for sources in graph.values() for source in sources}
+
+    state = load_state(etl.WATERMARK_STATE)
+    watermarks = state.get('committed', {}) if incremental else {}
+    incremental = 'reservations' in watermarks
+    scope = etl.detect_restated_reservations(engine_factory, watermarks) if incremental else None
+    fingerprints = load_state(FINGERPRINT_STATE)
+    fingerprints['pending'] = {}
+
+    results = queue.Queue(maxsize=queue_size or PIPELINE_QUEUE_SIZE)
+    engines = {}
+    failed = []
+    remaining = set()
+    futures = {}
+    downstream = ThreadPoolExecutor(max_workers=workers or PIPELINE_WORKERS)
+    extractors = ThreadPoolExecutor(max_workers=max(1, max_workers))
+    try:
+        for db_name, tables in etl.get_oltp_databases().items():
+            tables = [table for table in tables if table[0] in needed]
+            if not tables:
+                continue
+            try:
+                logger.info(f"Connecting to database: {db_name}")
+                engines[db_name] = engine_factory(db_name)
+            except Exception as e:
+                logger.error(f"Error connecting to database {db_name}: {e}")
+                failed.extend(table_name for table_name, _, _ in tables)
+                continue
+            db_slots = threading.Semaphore(max_workers_per_db)
+            for table_name, query, chunksize in tables:
+                query, params = etl.get_incremental_query(table_name, query, scope)
+                remaining.add(table_name)
+                extractors.submit(
+                    _extract_to_queue, engines[db_name], db_name, table_name, query, chunksize, params,
+                    db_slots, results, checkpoint
+                )
+        failed.extend(sorted(needed - remaining - set(failed)))
+
+        # Hand each transformed table to the workers once all its sources are in,
+        # and drop source frames as soon as no pending table needs them
+        pending = dict(graph)
+        data = {}
+        while pending:
+            if any(source in failed for sources in pending.values() for source in sources):
+                for table_name in [t for t, sources in pending.items() if any(s in failed for s in sources)]:
+                    logger.error(f"Skipping {table_name}: a source table failed to extract")
+                    failed.append(table_name)
+                    del pending[table_name]
+                continue
+            ready = [t for t, sources in pending.items() if all(s in data for s in sources)]
+            for table_name in ready:
+                futures[table_name] = downstream.submit(
+                    _transform_and_load, table_name, {s: data[s] for s in pending.pop(table_name)},
+                    warehouse_engine, incremental, checkpoint, fingerprints, force_refresh, scope
+                )
+            for source in [s for s in data if not any(s in sources for sources in pending.values())]:
+                del data[source]
+            if pending and not ready:
+                table_name, df = results.get()
+                remaining.discard(table_name)
+                if df is None:
+                    failed.append(table_name)
+                else:
+                    data[table_name] = df
+
+        loaded = {}
+        for table_name, future in futures.items():
+            try:
+                mode, table_watermarks, table_fingerprints = future.result()
+                if mode is not None:
+                    loaded[etl.get_target_table(table_name)] = mode
+                if table_watermarks is not None:
+                    state['pending'] = table_watermarks
+                if table_fingerprints is not None:
+                    fingerprints['pending'][table_name] = table_fingerprints
+            except Exception as e:
+                logger.error(f"Error loading data into table {table_name}: {e}")
+                failed.append(table_name)
+    finally:
+        # Drain extraction results nobody is waiting for so blocked workers can exit
+        while remaining:
+            remaining.discard(results.get()[0])
+        extractors.shutdown()
+        downstream.shutdown()
+        for engine in engines.values():
+            release_engine(engine)
+
+    with warehouse_engine.connect() as conn:
+        if failed:
+            drop_shadow_tables(conn, [etl.get_target_table(table_name) for table_name in futures])
+            raise RuntimeError(f"Pipelined run failed for tables {failed}; warehouse tables were left unchanged.")
+        with measure('publish', ','.join(loaded)):
+            publish_shadow_tables(conn, loaded, keys=etl.PUBLISH_KEYS)
+
+    if 'mst_reservation' in loaded:
+        etl.commit_watermarks(state, incremental)
+    commit_fingerprints(fingerprints, list(futures))
+    # A staged run that failed before this one has nothing left to resume
+    clear_manifest()
+
+    logger.info("Pipelined ETL run complete.")
+    return loaded
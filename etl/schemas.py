@@ -0,0 +1,179 @@
+import logging
+import numpy as np
+import pandas as pd
+from sqlalchemy import BigInteger, Date, DateTime, Float, Integer, String, Text
+
+logger = logging.getLogger(__name__)
+
+# Dtypes of the extracted tables, applied once when a table is ingested by the
+# transformer. Integer ids match the INT columns of the OLTP schemas; columns with
+# missing values get the nullable variant. Low-cardinality strings become
+# categoricals, and datetimes are parsed here instead of in every transform.
+# Money columns stay float64. Columns that are not listed keep their dtype.
+TABLE_SCHEMAS = {
+    'reservations': {
+        'id': 'int32', 'reservation_datetime': 'datetime', 'check_in_date': 'datetime', 'check_out_date': 'datetime',
+        'status': 'category', 'hotel_id': 'int32', 'booker_id': 'int32', 'total_room_price': 'float64',
+        'voucher_code': 'category', 'total_discount': 'float64'
+    },
+    'reservation_facts': {
+        'id': 'int32', 'reservation_datetime': 'datetime', 'check_in_date': 'datetime', 'check_out_date': 'datetime',
+        'status': 'category', 'hotel_id': 'int32', 'booker_id': 'int32', 'total_room_price': 'float64',
+        'voucher_code': 'category', 'total_discount': 'float64', 'room_type': 'category', 'item_id': 'int32'
+    },
+    'reservation_items': {
+        'id': 'int32', 'reservation_id': 'int32', 'reservation_datetime': 'datetime', 'check_in_date': 'datetime',
+        'check_out_date': 'datetime', 'room_type': 'category', 'total_room_price': 'float64',
+        'total_discount': 'float64'
+    },
+    'stays': {
+        'id': 'int32', 'date': 'datetime', 'reference_reservation_id': 'int32', 'room_id': 'int32', 'guest_id': 'int32'
+    },
+    'payments': {
+        'id': 'int32', 'reservation_id': 'int32', 'payment_method_id': 'int32', 'amount': 'float64',
+        'status': 'category', 'created_datetime': 'datetime', 'payment_datetime': 'datetime'
+    },
+    'users': {'id': 'int32', 'birth_date': 'datetime', 'gender': 'category'},
+    'stay_users': {'id': 'int32', 'stay_id': 'int32'},
+    'hotels': {'id': 'int32', 'type': 'category'},
+    'stay_hotels': {'id': 'int32', 'type': 'category'},
+    'rooms': {'id': 'int32', 'room_type': 'category', 'floor': 'int32', 'hotel_id': 'int32'},
+    'payment_methods': {'id': 'int32', 'third_party_id': 'int32'},
+    'payment_third_parties': {'id': 'int32'},
+    'campaigns': {'id': 'int32'},
+    'vouchers': {
+        'id': 'int32', 'campaign_id': 'int32', 'discount_type': 'float64', 'discount_value': 'float64',
+        'visible_from': 'datetime', 'visible_to': 'datetime', 'valid_from': 'datetime', 'valid_to': 'datetime'
+    }
+}
+
+def _to_integer(series, dtype):
+    values = pd.to_numeric(series)
+    info = np.iinfo(dtype)
+    if values.notna().any() and (values.min() < info.min or values.max() > info.max):
+        # Out of range for the declared width: keep the values rather than wrap them
+        dtype = 'int64'
+    if values.isna().any():
+        return values.astype(dtype.capitalize())
+    return values.astype(dtype)
+
+def _convert(series, kind):
+    if kind == 'datetime':
+        if pd.api.types.is_datetime64_any_dtype(series):
+            return series
+        return pd.to_datetime(series, errors='coerce')
+    if kind == 'category':
+        return series if isinstance(series.dtype, pd.CategoricalDtype) else series.astype('category')
+    if kind.startswith('int'):
+        return _to_integer(series, kind)
+    return pd.to_numeric(series).astype(kind)
+
+def compact_dtypes(table_name, df):
+    """Convert `df` to the dtypes declared for `table_name` in TABLE_SCHEMAS.
+
+    A column that cannot be converted keeps its dtype and is logged, so a schema
+    drift in a source never fails the run.
+    """
+    schema = TABLE_SCHEMAS.get(table_name, {})
+    columns = {}
+    for column, kind in schema.items():
+        if column not in df.columns:
+            continue
+        try:
+            columns[column] = _convert(df[column], kind)
+        except (ValueError, TypeError) as e:
+            logger.warning(f"Could not convert {table_name}.{column} to {kind}: {e}")
+    return df.assign(**columns) if columns else df
+
+# Definitions of the warehouse tables: column types (instead of the TEXT/BIGINT
+# pandas would infer), the primary key and the secondary indexes. Keys and
+# indexes are created on the shadow table once it is filled, since maintaining
+# them during the bulk insert slows it down. Columns missing from a loaded table
+# (e.g. the merge columns outside merge mode) are skipped.
+WAREHOUSE_TABLES = {
+    'mst_reservation': {
+        'columns': {
+            'id': Integer(), 'reservation_datetime': DateTime(), 'check_in_date': DateTime(),
+            'check_out_date': DateTime(), 'status': String(32), 'hotel_id': Integer(), 'booker_id': Integer(),
+            'total_room_price': Float(53), 'voucher_code': String(64), 'total_discount': Float(53),
+            'room_type': String(64), 'room_id': Integer(), 'guest_id': Integer(), 'payment_method_id': Integer(),
+            'amount': Float(53), 'status_payments': String(32), 'payment_datetime': DateTime(),
+            'item_id': Integer(), 'stay_id': Integer(), 'payment_id': Integer(),
+            'merge_key': BigInteger(), 'row_hash': BigInteger()
+        },
+        # One reservation spans several rows, so the fact table has no primary key
+        'indexes': [['id'], ['hotel_id', 'check_in_date'], ['booker_id'], ['check_in_date'], ['merge_key']]
+    },
+    'hotels': {
+        'columns': {'id': Integer(), 'name': String(255), 'type': String(64)},
+        'primary_key': ['id']
+    },
+    'rooms': {
+        'columns': {'id': Integer(), 'name': String(255), 'room_type': String(64), 'floor': Integer(), 'hotel_id': Integer()},
+        'primary_key': ['id'],
+        'indexes': [['hotel_id']]
+    },
+    'users': {
+        'columns': {
+            'id': Integer(), 'name': String(255), 'birth_date': DateTime(), 'gender': String(16),
+            'email': String(255), 'phoneNumber': String(32)
+        },
+        'primary_key': ['id'],
+        'indexes': [['email']]
+    },
+    'payment_methods': {
+        'columns': {'id': Integer(), 'name': String(255), 'third_party_id': Integer()},
+        'primary_key': ['id']
+    },
+    'payment_third_parties': {
+        'columns': {'id': Integer(), 'name': String(255)},
+        'primary_key': ['id']
+    },
+    'campaign': {
+        'columns': {'id': Integer(), 'name': String(255), 'description': Text(), 'cover_pic_url': Text()},
+        'primary_key': ['id']
+    },
+    'voucher': {
+        'columns': {
+            'id': Integer(), 'campaign_id': Integer(), 'code': String(64), 'discount_type': Float(53),
+            'discount_value': Float(53), 'visible_from': DateTime(), 'visible_to': DateTime(),
+            'valid_from': DateTime(), 'valid_to': DateTime(), 'hotel_types': Text(), 'hotel_ids': Text(),
+            'room_types': Text()
+        },
+        'primary_key': ['id'],
+        'indexes': [['campaign_id'], ['code']]
+    },
+    # Aggregate marts: the primary key is the partition an incremental run adds its delta to
+    'mart_hotel_daily_revenue': {
+        'columns': {
+            'hotel_id': Integer(), 'reservation_date': Date(), 'reservations': Integer(), 'room_revenue': Float(53),
+            'discount': Float(53), 'net_revenue': Float(53)
+        },
+        'primary_key': ['hotel_id', 'reservation_date'],
+        'indexes': [['reservation_date']]
+    },
+    'mart_room_type_occupancy': {
+        'columns': {
+            'hotel_id': Integer(), 'check_in_date': Date(), 'room_type': String(64), 'rooms': Integer(),
+            'room_nights': Integer()
+        },
+        'primary_key': ['hotel_id', 'check_in_date', 'room_type'],
+        'indexes': [['room_type', 'check_in_date']]
+    },
+    'mart_campaign_discounts': {
+        'columns': {
+            'campaign_id': Integer(), 'reservation_date': Date(), 'reservations': Integer(), 'total_discount': Float(53)
+        },
+        'primary_key': ['campaign_id', 'reservation_date']
+    }
+}
+
+def get_required_columns(table_name):
+    """Columns a frame must have to be loaded into warehouse table `table_name`: its key."""
+    definition = WAREHOUSE_TABLES.get(table_name, {})
+    return definition.get('primary_key') or definition.get('indexes', [[]])[0]
+
+def get_column_types(table_name, df):
+    """SQLAlchemy types declared for the columns of `df` that are loaded into warehouse table `table_name`."""
+    columns = WAREHOUSE_TABLES.get(table_name, {}).get('columns', {})
+    return {column: columns[column] for column in df.columns if column in columns}
@@ -0,0 +1,153 @@
+import os
+import logging
+import pandas as pd
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    import pyarrow.feather as feather
+except ImportError:  # pyarrow is optional; CSV staging keeps working without it
+    pa = None
+
+logger = logging.getLogger(__name__)
+
+# Datetimes are always written with their time; to_csv would otherwise drop it from
+# columns that are all midnight, so such columns would load into the warehouse as dates
+CSV_DATE_FORMAT = '%Y-%m-%d %H:%M:%S'
+
+class CsvFormat:
+    """Plain-text staging. Portable, but loses dtypes and is slow to format and parse."""
+    name = 'csv'
+    extension = 'csv'
+
+    def write(self, df, path):
+        df.to_csv(path, index=False, date_format=CSV_DATE_FORMAT)
+
+    def read(self, path):
+        return pd.read_csv(path)
+
+    def open_writer(self, path, kinds=None):
+        return CsvChunkWriter(path)
+
+class CsvChunkWriter:
+    def __init__(self, path):
+        self.path = path
+        self.chunks = 0
+
+    def write(self, df):
+        df.to_csv(
+            self.path, index=False, mode='w' if self.chunks == 0 else 'a', header=self.chunks == 0,
+            date_format=CSV_DATE_FORMAT
+        )
+        self.chunks += 1
+
+    def close(self):
+        pass
+
+class ParquetFormat:
+    """Compressed columnar staging that keeps datetimes, nullable ints and decimals."""
+    name = 'parquet'
+    extension = 'parquet'
+
+    def __init__(self, compression='zstd', memory_map=True):
+        self.compression = compression
+        self.memory_map = memory_map
+
+    def write(self, df, path):
+        df.to_parquet(path, index=False, compression=self.compression)
+
+    def read(self, path):
+        return pq.read_table(path, memory_map=self.memory_map).to_pandas()
+
+    def open_writer(self, path, kinds=None):
+        return ArrowChunkWriter(
+            path, lambda schema: pq.ParquetWriter(path, schema, compression=self.compression), kinds
+        )
+
+class ArrowIpcFormat:
+    """Arrow IPC (Feather v2) staging; memory-mapped reads avoid copying the file into memory."""
+    name = 'arrow'
+    extension = 'arrow'
+
+    def __init__(self, compression='lz4', memory_map=True):
+        self.compression = compression
+        self.memory_map = memory_map
+
+    def write(self, df, path):
+        feather.write_feather(df, path, compression=self.compression)
+
+    def read(self, path):
+        return feather.read_table(path, memory_map=self.memory_map).to_pandas()
+
+    def open_writer(self, path, kinds=None):
+        options = pa.ipc.IpcWriteOptions(compression=self.compression)
+        return ArrowChunkWriter(path, lambda schema: pa.ipc.new_file(path, schema, options=options), kinds)
+
+def _null_column_type(kind):
+    # Type of a column that is all null in the first chunk, from its TABLE_SCHEMAS kind.
+    # Integers are widened and datetimes kept as text, so that any later values cast
+    # to it; compact_dtypes narrows and parses them when the table is ingested
+    if kind and kind.startswith('int'):
+        return pa.int64()
+    if kind == 'float64':
+        return pa.float64()
+    return pa.string()
+
+class ArrowChunkWriter:
+    # The file schema is fixed when the first chunk is written, and every chunk is
+    # cast to it, so the file is written once, chunk by chunk. Columns take the
+    # first chunk's types; one that is all null there (Arrow type null) takes the
+    # type of its kind in `kinds`, the table's TABLE_SCHEMAS entry, or text.
+    def __init__(self, path, open_file, kinds=None):
+        self.path = path
+        self.open_file = open_file
+        self.kinds = kinds or {}
+        self.writer = None
+        self.schema = None
+
+    def write(self, df):
+        table = pa.Table.from_pandas(df, preserve_index=False)
+        if self.writer is None:
+            fields = [
+                field.with_type(_null_column_type(self.kinds.get(field.name)))
+                if pa.types.is_null(field.type) else field
+                for field in table.schema
+            ]
+            self.schema = pa.schema(fields, metadata=table.schema.metadata)
+            self.writer = self.open_file(self.schema)
+        self.writer.write_table(table.select(self.schema.names).cast(self.schema))
+
+    def close(self):
+        if self.writer is not None:
+            self.writer.close()
+
+STAGING_FORMATS = {
+    'csv': CsvFormat,
+    'parquet': ParquetFormat,
+    'arrow': ArrowIpcFormat,
+}
+
+def get_staging_format(name, **options):
+    if name not in STAGING_FORMATS:
+        raise ValueError(f"Unknown staging format: {name}")
+    if name != 'csv' and pa is None:
+        logger.warning(f"pyarrow is not installed; falling back to csv staging instead of {name}")
+        name = 'csv'
+        options = {}
+    return STAGING_FORMATS[name](**options)
+
+def get_format_for_path(path, memory_map=True):
+    extension = os.path.splitext(path)[1].lstrip('.')
+    for name, staging_format in STAGING_FORMATS.items():
+        if staging_format.extension == extension:
+            return get_staging_format(name) if name == 'csv' else get_staging_format(name, memory_map=memory_map)
+    raise ValueError(f"Unknown staging file extension: {path}")
+
+def read_staged(path, memory_map=True):
+    """Read a staging file in the format of its extension; `memory_map` applies to Parquet/Arrow files."""
+    return get_format_for_path(path, memory_map).read(path)
+
+def get_table_name(path, suffix):
+    """`./staging-area/users_loaded.parquet` -> `users` for suffix `_loaded`."""
+    stem = os.path.splitext(os.path.basename(path))[0]
+    return stem[:-len(suffix)] if stem.endswith(suffix) else stem
@@ -0,0 +1,29 @@
+import os
+import json
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Local state that has to survive between runs (watermarks, caches, manifests)
+STATE_DIR = './state/'
+
+def get_state_path(name):
+    return os.path.join(STATE_DIR, f"{name}.json")
+
+def load_state(name):
+    path = get_state_path(name)
+    if not os.path.exists(path):
+        return {}
+    with open(path) as f:
+        return json.load(f)
+
+def save_state(name, state):
+    if not os.path.exists(STATE_DIR):
+        os.makedirs(STATE_DIR)
+    path = get_state_path(name)
+    # Write then rename so an interrupted run never leaves a half-written state file
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w') as f:
+        json.dump(state, f, indent=2, sort_keys=True, default=str)
+    os.replace(tmp_path, path)
+    logger.info(f"Saved state {name} to {path}")
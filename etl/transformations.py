@@ -23,58 +23,257 @@ def format_phone_number(phone_number):
         phone_number = '+62-' + phone_number[1:]
     return phone_number
 
-def transform_fact_table(data):
+def _normalize_room_type_strings(room_types):
+    # Same steps as standardize_room_type: lowercase, '_'/'-' to spaces, collapse whitespace
+    return room_types.str.lower().str.replace(r'[_-]', ' ', regex=True).str.split().str.join(' ')
+
+def standardize_room_types(room_types, memoize=True):
+    """Column version of standardize_room_type.
+
+    Room types have few distinct values, so by default each distinct string is
+    normalized once and mapped back onto the column.
+    """
+    if not room_types.notna().any():
+        # Nothing to normalize, and mapping an empty or all-null column would give float64 NaN
+        return room_types.astype(object)
+    if not memoize:
+        return _normalize_room_type_strings(room_types).infer_objects()
+    uniques = pd.Series(room_types.dropna().unique(), dtype=object)
+    mapping = dict(zip(uniques, _normalize_room_type_strings(uniques)))
+    return room_types.map(mapping, na_action='ignore')
+
+def format_phone_numbers(phone_numbers):
+    """Column version of format_phone_number."""
+    formatted = phone_numbers.astype(object)
+    notna = phone_numbers.notna()
+    formatted[notna] = phone_numbers[notna].astype(str).str.replace(r'^(?:62|0)', '+62-', regex=True)
+    return formatted.infer_objects()
+
+RESERVATION_COLUMNS = [
+    'id','reservation_datetime','check_in_date','check_out_date','status','hotel_id','booker_id','total_room_price',
+    'voucher_code','total_discount'
+]
+
+FACT_COLUMNS = RESERVATION_COLUMNS + [
+    'room_type','room_id','guest_id','payment_method_id','amount','status_payments','payment_datetime'
+]
+
+# Source row ids identifying the item/stay/payment a fact row came from
+FACT_GRAIN_COLUMNS = ['item_id','stay_id','payment_id']
+
+def _index_by(df, key, columns):
+    # Rows without a key can never match a reservation; dropping them keeps the
+    # sorted index monotonic so it can be sliced by reservation id range
+    df = df[df[key].notna()]
+    return df.set_index(key)[columns].sort_index(kind='stable')
+
+def _join_fact_chunk(reservations, items, stays, payments):
+    if len(reservations):
+        lo, hi = reservations['id'].min(), reservations['id'].max()
+        stays, payments = stays.loc[lo:hi], payments.loc[lo:hi]
+        if items is not None:
+            items = items.loc[lo:hi]
+    # Without items the reservations were already joined to them in the source database
+    res_items = reservations if items is None else reservations.join(items, on='id', how='left')
+    res_items_stays = res_items.join(stays, on='id', how='left')
+    fact_chunk = res_items_stays.join(payments, on='id', how='left')
+    return fact_chunk, len(res_items), len(res_items_stays)
+
+def join_fact_tables(reservations, reservation_items, stays, payments, chunk_size=None, grain_keys=False):
+    """Left-join reservations to their items, stays and payments.
+
+    Only the columns of the fact table are projected before joining, and each
+    child table is indexed and sorted on its reservation key. With `chunk_size`
+    the reservations are joined that many at a time, so the per-join
+    intermediates stay bounded. The row expansion over the reservations is logged
+    and kept in `attrs['expansion_factor']`. With `grain_keys` the item, stay
+    and payment ids are kept as FACT_GRAIN_COLUMNS after the fact columns.
+
+    `reservation_items` may be None when `reservations` already holds one row
+    per reservation and item, with `room_type` and `item_id`, as extracted by the
+    pushdown query. Those rows are put in reservation and item id order.
+    """
+    grain = {'item_id': [], 'stay_id': [], 'payment_id': []}
+    if grain_keys:
+        grain = {column: [column] for column in FACT_GRAIN_COLUMNS}
+    if reservation_items is None:
+        n_reservations = reservations['id'].nunique()
+        reservations = reservations.sort_values(['id', 'item_id'], kind='stable')
+        reservations = reservations[RESERVATION_COLUMNS + ['room_type'] + grain['item_id']].reset_index(drop=True)
+        reservations['room_type'] = standardize_room_types(reservations['room_type'])
+        items = None
+    else:
+        n_reservations = len(reservations)
+        reservations = reservations[RESERVATION_COLUMNS]
+        items = _index_by(
+            reservation_items.rename(columns={'id': 'item_id'}), 'reservation_id', ['room_type'] + grain['item_id']
+        )
+        items['room_type'] = standardize_room_types(items['room_type'])
+    stays = _index_by(
+        stays.rename(columns={'id': 'stay_id'}), 'reference_reservation_id', ['room_id', 'guest_id'] + grain['stay_id']
+    )
+    payments = _index_by(
+        payments.rename(columns={'id': 'payment_id', 'status': 'status_payments'}), 'reservation_id',
+        ['payment_method_id', 'amount', 'status_payments', 'payment_datetime'] + grain['payment_id']
+    )
+
+    chunk_size = chunk_size or max(len(reservations), 1)
+    chunks = []
+    res_items_rows = res_items_stays_rows = 0
+    for start in range(0, max(len(reservations), 1), chunk_size):
+        fact_chunk, items_rows, stays_rows = _join_fact_chunk(
+            reservations.iloc[start:start + chunk_size], items, stays, payments
+        )
+        chunks.append(fact_chunk)
+        res_items_rows += items_rows
+        res_items_stays_rows += stays_rows
+
+    fact_table = pd.concat(chunks) if len(chunks) > 1 else chunks[0]
+    fact_table = fact_table[FACT_COLUMNS + (FACT_GRAIN_COLUMNS if grain_keys else [])].reset_index(drop=True)
+
+    base = max(n_reservations, 1)
+    fact_table.attrs['expansion_factor'] = len(fact_table) / base
+    logger.info(
+        f"Fact join expansion over {n_reservations} reservations: items x{res_items_rows / base:.2f}, "
+        f"stays x{res_items_stays_rows / base:.2f}, payments x{len(fact_table) / base:.2f}"
+    )
+    return fact_table
+
+def transform_fact_table(data, chunk_size=None, grain_keys=False):
     logger.info("Transforming fact table.")
-    
-    reservations = data['reservations']
-    reservation_items = data['reservation_items']
-    stays = data['stays']
-    payments = data['payments']
-    
-    res_items = pd.merge(reservations, reservation_items, left_on='id', right_on='reservation_id', how='left', suffixes=('','_items'))
-    
-    # Handle cases where reference_reservation_id is missing in reservations
-    res_items_stays = pd.merge(res_items, stays, left_on='id', right_on='reference_reservation_id', how='left', suffixes=('','_stays'))
-    
-    # Standardize the room_type column
-    res_items_stays['room_type'] = res_items_stays['room_type'].apply(standardize_room_type)
-    
-    fact_table = pd.merge(res_items_stays, payments, left_on='id', right_on='reservation_id', how='left', suffixes=('','_payments'))
-
-    fact_table = fact_table[[
-        'id','reservation_datetime','check_in_date','check_out_date','status','hotel_id','booker_id','total_room_price',
-        'voucher_code','total_discount','room_type','room_id','guest_id','payment_method_id','amount','status_payments',
-        'payment_datetime'
-    ]]
+
+    if PUSHDOWN_FACT_TABLE in data:
+        reservations, reservation_items = data[PUSHDOWN_FACT_TABLE], None
+    else:
+        reservations, reservation_items = data['reservations'], data['reservation_items']
+    fact_table = join_fact_tables(
+        reservations, reservation_items, data['stays'], data['payments'], chunk_size=chunk_size, grain_keys=grain_keys
+    )
 
     logger.info("Fact table transformation complete.")
     return fact_table
 
-def transform_dim_tables(data):
-    logger.info("Transforming dimension tables.")
-    
-    hotels = data['hotels'].drop_duplicates().reset_index(drop=True)
-    rooms = data['rooms'].drop_duplicates().reset_index(drop=True)
+# Source tables each transformed table reads; the pipelined runner builds its
+# dependency graph from these
+FACT_TABLE_SOURCES = ['reservations', 'reservation_items', 'stays', 'payments']
+
+# With pushdown, reservations and their items are extracted pre-joined as one table
+PUSHDOWN_FACT_TABLE = 'reservation_facts'
+PUSHDOWN_FACT_TABLE_SOURCES = [PUSHDOWN_FACT_TABLE, 'stays', 'payments']
+
+DIM_TABLE_SOURCES = {
+    'hotels': ['hotels'],
+    'rooms': ['rooms'],
+    'users': ['users', 'stay_users'],
+    'payment_methods': ['payment_methods'],
+    'payment_third_parties': ['payment_third_parties'],
+    'campaign': ['campaigns'],
+    'voucher': ['vouchers']
+}
+
+def transform_users(data):
     users = data['users'].drop_duplicates().reset_index(drop=True)
     stay_users = data['stay_users'].drop_duplicates().reset_index(drop=True)
-    payment_methods = data['payment_methods'].drop_duplicates().reset_index(drop=True)
-    payment_third_parties = data['payment_third_parties'].drop_duplicates().reset_index(drop=True)
-    campaign = data['campaigns'].drop_duplicates().reset_index(drop=True)
-    voucher = data['vouchers'].drop_duplicates().reset_index(drop=True)
 
     # Merge users with stay_users and format the phone number
     users = pd.merge(users, stay_users, on='id', how='left', suffixes=('','_stay')).drop_duplicates().reset_index(drop=True)
-    users['phoneNumber'] = users['phoneNumber'].apply(format_phone_number)
-    
-    users = users[['id','name','birth_date','gender','email','phoneNumber']]
+    users['phoneNumber'] = format_phone_numbers(users['phoneNumber'])
+
+    return users[['id','name','birth_date','gender','email','phoneNumber']]
+
+def transform_dim_table(name, data):
+    if name == 'users':
+        return transform_users(data)
+    source, = DIM_TABLE_SOURCES[name]
+    return data[source].drop_duplicates().reset_index(drop=True)
+
+def transform_dim_tables(data):
+    logger.info("Transforming dimension tables.")
+
+    dim_tables = {name: transform_dim_table(name, data) for name in DIM_TABLE_SOURCES}
 
     logger.info("Dimension table transformations complete.")
-    return {
-        'hotels': hotels,
-        'rooms': rooms,
-        'users': users,
-        'payment_methods': payment_methods,
-        'payment_third_parties': payment_third_parties,
-        'campaign': campaign,
-        'voucher': voucher
-    }
+    return dim_tables
+
+# Aggregate marts summarising the reservations for BI queries, and the extracted
+# tables each is built from. They are computed from the reservation and item rows
+# of the fact table before its stays/payments fan-out, which would multiply the sums.
+# Every measure is a count or a sum, so the aggregates of a delta of reservations
+# can be added onto the stored ones.
+MART_TABLE_SOURCES = {
+    'hotel_daily_revenue': ['reservations'],
+    'room_type_occupancy': ['reservations', 'reservation_items'],
+    'campaign_discounts': ['reservations', 'vouchers']
+}
+
+def get_mart_sources(name, pushdown=False):
+    """Sources of a mart; with pushdown the reservation tables are replaced by the pre-joined one."""
+    sources = MART_TABLE_SOURCES[name]
+    if not pushdown:
+        return sources
+    return [PUSHDOWN_FACT_TABLE] + [source for source in sources if source not in ('reservations', 'reservation_items')]
+
+def _to_date(values):
+    # Compacted tables already hold parsed datetimes; to_datetime would iterate over them
+    if not pd.api.types.is_datetime64_any_dtype(values):
+        values = pd.to_datetime(values, errors='coerce')
+    return values.dt.normalize()
+
+def _booked_reservations(data):
+    # One row per reservation; cancelled reservations bring in no revenue
+    if PUSHDOWN_FACT_TABLE in data:
+        reservations = data[PUSHDOWN_FACT_TABLE].drop_duplicates('id')
+    else:
+        reservations = data['reservations']
+    reservations = reservations[reservations['status'] != 'Cancelled']
+    return reservations.assign(reservation_date=_to_date(reservations['reservation_datetime']))
+
+def _booked_rooms(data):
+    # One row per reservation and item, as joined in the first step of the fact join
+    if PUSHDOWN_FACT_TABLE in data:
+        rooms = data[PUSHDOWN_FACT_TABLE].dropna(subset=['item_id'])
+    else:
+        items = data['reservation_items'][['reservation_id', 'room_type']]
+        rooms = data['reservations'].merge(items, left_on='id', right_on='reservation_id')
+    rooms = rooms[rooms['status'] != 'Cancelled']
+    check_in, check_out = _to_date(rooms['check_in_date']), _to_date(rooms['check_out_date'])
+    return pd.DataFrame({
+        'hotel_id': rooms['hotel_id'],
+        'check_in_date': check_in,
+        'room_type': standardize_room_types(rooms['room_type'].astype(object)),
+        'nights': (check_out - check_in).dt.days.clip(lower=0)
+    })
+
+def transform_hotel_daily_revenue(data):
+    reservations = _booked_reservations(data)
+    mart = reservations.groupby(['hotel_id', 'reservation_date'], observed=True).agg(
+        reservations=('id', 'size'), room_revenue=('total_room_price', 'sum'), discount=('total_discount', 'sum')
+    ).reset_index()
+    mart['net_revenue'] = mart['room_revenue'] - mart['discount']
+    return mart
+
+def transform_room_type_occupancy(data):
+    rooms = _booked_rooms(data)
+    return rooms.groupby(['hotel_id', 'check_in_date', 'room_type'], observed=True).agg(
+        rooms=('nights', 'size'), room_nights=('nights', 'sum')
+    ).reset_index()
+
+def transform_campaign_discounts(data):
+    reservations = _booked_reservations(data)
+    reservations = reservations[reservations['voucher_code'].notna()]
+    vouchers = data['vouchers'][['code', 'campaign_id']].drop_duplicates('code')
+    reservations = reservations.assign(voucher_code=reservations['voucher_code'].astype(object)).merge(
+        vouchers.assign(code=vouchers['code'].astype(object)), left_on='voucher_code', right_on='code'
+    )
+    return reservations.groupby(['campaign_id', 'reservation_date'], observed=True).agg(
+        reservations=('id', 'size'), total_discount=('total_discount', 'sum')
+    ).reset_index()
+
+MART_TRANSFORMS = {
+    'hotel_daily_revenue': transform_hotel_daily_revenue,
+    'room_type_occupancy': transform_room_type_occupancy,
+    'campaign_discounts': transform_campaign_discounts
+}
+
+def transform_mart(name, data):
+    return MART_TRANSFORMS[name](data)
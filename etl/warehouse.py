@@ -0,0 +1,477 @@
+import os
+import csv
+import logging
+import time
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+import pandas as pd
+from sqlalchemy import text
+from sqlalchemy.exc import DBAPIError
+
+logger = logging.getLogger(__name__)
+
+# Rows per executemany batch
+EXECUTEMANY_BATCH_SIZE = 10000
+# Staged rows applied per set-based merge batch
+MERGE_BATCH_SIZE = 50000
+
+def create_table_like(df, table_name, conn, if_exists='replace', dtype=None):
+    """Create (or replace) an empty table with the columns of `df`, typed by `dtype` where given."""
+    df.head(0).to_sql(table_name, conn, if_exists=if_exists, index=False, dtype=dtype)
+
+def write_to_sql(df, table_name, conn, if_exists='replace', dtype=None):
+    df.to_sql(table_name, conn, if_exists=if_exists, index=False, method='multi', chunksize=1000, dtype=dtype)
+    return len(df)
+
+def _to_python_rows(df):
+    # Plain tuples of Python values (None for missing) that every DB-API driver accepts
+    columns = []
+    for name in df.columns:
+        values = df[name].astype(object).where(df[name].notna(), None).tolist()
+        if pd.api.types.is_datetime64_any_dtype(df[name]):
+            values = [value.to_pydatetime() if value is not None else None for value in values]
+        columns.append(values)
+    return list(zip(*columns))
+
+def write_executemany(df, table_name, conn, if_exists='replace', dtype=None, batch_size=None):
+    """Insert with the driver's executemany, one batch of plain Python rows at a time.
+
+    Unlike to_sql(method='multi') this sends one prepared statement per batch
+    instead of building a statement with a placeholder per value, and it skips
+    SQLAlchemy's per-value type processing.
+    """
+    batch_size = batch_size or EXECUTEMANY_BATCH_SIZE
+    create_table_like(df, table_name, conn, if_exists, dtype)
+    quote = conn.dialect.identifier_preparer.quote
+    placeholder = '?' if conn.dialect.paramstyle == 'qmark' else '%s'
+    statement = (
+        f"INSERT INTO {quote(table_name)} ({', '.join(quote(column) for column in df.columns)}) "
+        f"VALUES ({', '.join([placeholder] * len(df.columns))})"
+    )
+    for start in range(0, len(df), batch_size):
+        conn.exec_driver_sql(statement, _to_python_rows(df.iloc[start:start + batch_size]))
+    return len(df)
+
+def _write_load_data_csv(df, path):
+    # LOAD DATA reads unquoted \N as NULL and treats backslash as the escape character
+    df = df.copy()
+    for column in df.columns:
+        if df[column].dtype == bool:
+            df[column] = df[column].astype(int)
+        elif not pd.api.types.is_numeric_dtype(df[column]) and not pd.api.types.is_datetime64_any_dtype(df[column]):
+            df[column] = df[column].astype(object).where(df[column].isna(), df[column].astype(str).str.replace('\\', '\\\\'))
+    df.to_csv(path, index=False, header=False, na_rep='\\N', quoting=csv.QUOTE_MINIMAL, lineterminator='\n')
+
+def _quote_load_data_path(path):
+    # A MySQL string literal; forward slashes work on Windows too and need no escaping
+    return "'" + path.replace('\\', '/').replace("'", "\\'") + "'"
+
+def write_load_data_infile(df, table_name, conn, if_exists='replace', dtype=None):
+    """Bulk load through MySQL `LOAD DATA LOCAL INFILE`.
+
+    MySQL cannot read the Parquet/Arrow staging files, so the frame is written
+    to a temporary CSV in the format LOAD DATA expects. Needs `local_infile`
+    enabled on both the client connection and the server.
+    """
+    create_table_like(df, table_name, conn, if_exists, dtype)
+    fd, path = tempfile.mkstemp(suffix='.csv')
+    os.close(fd)
+    try:
+        _write_load_data_csv(df, path)
+        columns = ', '.join(f"`{column}`" for column in df.columns)
+        conn.exec_driver_sql(
+            f"LOAD DATA LOCAL INFILE {_quote_load_data_path(path)} INTO TABLE `{table_name}` "
+            f"FIELDS TERMINATED BY ',' OPTIONALLY ENCLOSED BY '\"' ESCAPED BY '\\\\' "
+            f"LINES TERMINATED BY '\\n' ({columns})"
+        )
+    finally:
+        os.remove(path)
+    return len(df)
+
+BULK_WRITERS = {
+    'load_data': write_load_data_infile,
+    'executemany': write_executemany,
+    'to_sql': write_to_sql,
+}
+
+# Dialects that have LOAD DATA LOCAL INFILE
+LOAD_DATA_DIALECTS = {'mysql'}
+# MySQL errors for LOAD DATA LOCAL INFILE being disabled, rather than for a bad load: command
+# not allowed (1148), rejected by the client (2068), local data disabled (3948)
+LOAD_DATA_DISABLED_ERRORS = {1148, 2068, 3948}
+
+def is_load_data_disabled(error):
+    args = getattr(error.orig, 'args', ())
+    return bool(args) and args[0] in LOAD_DATA_DISABLED_ERRORS
+
+def resolve_strategy(conn, strategy='auto'):
+    if strategy != 'auto':
+        return strategy
+    return 'load_data' if conn.dialect.name in LOAD_DATA_DIALECTS else 'executemany'
+
+def write_table(df, table_name, conn, if_exists='replace', strategy='auto', dtype=None):
+    """Write `df` with the chosen bulk strategy, falling back to executemany where LOAD DATA is unavailable.
+
+    Any other error of LOAD DATA is raised. `dtype` maps columns to the
+    SQLAlchemy types the table is created with.
+    """
+    strategy = resolve_strategy(conn, strategy)
+    if strategy not in BULK_WRITERS:
+        raise ValueError(f"Unknown load strategy: {strategy}")
+    if strategy == 'load_data' and conn.dialect.name not in LOAD_DATA_DIALECTS:
+        logger.warning(f"{conn.dialect.name} has no LOAD DATA LOCAL INFILE; writing {table_name} with executemany")
+        strategy = 'executemany'
+    if strategy == 'load_data':
+        # A rejected LOAD DATA statement inserts nothing, so the fallback starts clean
+        try:
+            return write_load_data_infile(df, table_name, conn, if_exists, dtype)
+        except DBAPIError as e:
+            if not is_load_data_disabled(e):
+                raise
+            logger.warning(f"LOAD DATA LOCAL INFILE disabled for {table_name}, falling back to executemany: {e.orig}")
+            strategy = 'executemany'
+    return BULK_WRITERS[strategy](df, table_name, conn, if_exists, dtype)
+
+def split_key_ranges(df, key, parts):
+    """Split `df` into at most `parts` frames holding contiguous, non-overlapping ranges of `key`.
+
+    Rows sharing a key value always end up in the same frame.
+    """
+    if parts <= 1 or len(df) < 2:
+        return [df]
+    keys = df[key].to_numpy()
+    order = np.argsort(keys, kind='stable')
+    sorted_keys = keys[order]
+    cuts = sorted_keys[np.linspace(0, len(df), parts + 1).astype(int)[1:-1]]
+    bounds = np.unique(np.searchsorted(sorted_keys, cuts, side='left'))
+    return [df.iloc[rows] for rows in np.split(order, bounds) if len(rows)]
+
+# Dialects that take one writer at a time: concurrent writers only queue on the database
+# lock, and give up with "database is locked" once a write outlasts the busy timeout
+SERIAL_WRITE_DIALECTS = {'sqlite'}
+
+def get_write_concurrency(engine, concurrency):
+    """`concurrency`, or 1 for a warehouse that takes one writer at a time."""
+    if concurrency > 1 and engine.dialect.name in SERIAL_WRITE_DIALECTS:
+        logger.info(f"{engine.dialect.name} takes one writer at a time; writing over one connection, not {concurrency}")
+        return 1
+    return concurrency
+
+def write_table_parallel(df, table_name, engine, key='id', parts=4, slots=None, if_exists='replace', strategy='auto',
+                         dtype=None):
+    """Write `df` over several connections, one range of `key` per connection.
+
+    The table is created first; each range is then written and committed on its
+    own pooled connection. `slots` (a semaphore) caps how many connections write
+    at once, and can be shared with other loads. A failed range raises after the
+    others have finished. Warehouses in SERIAL_WRITE_DIALECTS get one range.
+    """
+    parts = get_write_concurrency(engine, parts)
+    with engine.begin() as conn:
+        create_table_like(df, table_name, conn, if_exists, dtype)
+    chunks = split_key_ranges(df, key, parts)
+    slots = slots or threading.BoundedSemaphore(parts)
+
+    def write_range(chunk):
+        with slots, engine.begin() as conn:
+            return write_table(chunk, table_name, conn, if_exists='append', strategy=strategy)
+
+    with ThreadPoolExecutor(max_workers=len(chunks)) as executor:
+        futures = [executor.submit(write_range, chunk) for chunk in chunks]
+        return sum(future.result() for future in futures)
+
+# Tables are loaded into `<table>__shadow` and only swapped in once every load succeeded
+SHADOW_SUFFIX = '__shadow'
+OLD_SUFFIX = '__old'
+
+def get_shadow_name(table_name):
+    return f"{table_name}{SHADOW_SUFFIX}"
+
+def has_table(conn, table_name):
+    return conn.dialect.has_table(conn, table_name)
+
+def has_column(conn, table_name, column):
+    return any(c['name'] == column for c in conn.dialect.get_columns(conn, table_name))
+
+def _get_index_name(conn, prefix, table_name, target_table, columns):
+    name = f"{prefix}_{target_table}_{'_'.join(columns)}"
+    # SQLite index names are unique per database and move with a renamed table, so
+    # while the live table still holds the name the shadow's index takes another one
+    if table_name != target_table and has_table(conn, target_table):
+        if any(index['name'] == name for index in conn.dialect.get_indexes(conn, target_table)):
+            name += SHADOW_SUFFIX
+    return name
+
+def create_table_indexes(conn, table_name, definition, target_table=None):
+    """Add the primary key and indexes declared in `definition` to `table_name`.
+
+    Run once the bulk insert into `table_name` has finished; `target_table` is
+    the table it is published as, which names the indexes. Keys and indexes on
+    columns the table lacks, or that already exist, are skipped. A primary key
+    the rows violate is logged and created as a plain index instead. Returns
+    the seconds each index took to build.
+    """
+    target_table = target_table or table_name
+    quote = conn.dialect.identifier_preparer.quote
+    columns = {column['name'] for column in conn.dialect.get_columns(conn, table_name)}
+    existing = [index['column_names'] for index in conn.dialect.get_indexes(conn, table_name)]
+    existing.append(conn.dialect.get_pk_constraint(conn, table_name)['constrained_columns'])
+    indexes = [index for index in definition.get('indexes', []) if set(index) <= columns and index not in existing]
+
+    timings = {}
+    primary_key = definition.get('primary_key')
+    if primary_key and set(primary_key) <= columns and primary_key not in existing:
+        key_columns = ', '.join(quote(column) for column in primary_key)
+        name = _get_index_name(conn, 'pk', table_name, target_table, primary_key)
+        start = time.perf_counter()
+        try:
+            if conn.dialect.name == 'mysql':
+                conn.exec_driver_sql(f"ALTER TABLE {quote(table_name)} ADD PRIMARY KEY ({key_columns})")
+            else:
+                # SQLite cannot add a primary key to an existing table; a unique index enforces the same
+                conn.exec_driver_sql(f"CREATE UNIQUE INDEX {quote(name)} ON {quote(table_name)} ({key_columns})")
+            timings[name] = time.perf_counter() - start
+        except Exception as e:
+            logger.warning(f"Could not add primary key {primary_key} to {table_name}, indexing it instead: {e}")
+            indexes.insert(0, primary_key)
+
+    for index in indexes:
+        name = _get_index_name(conn, 'ix', table_name, target_table, index)
+        start = time.perf_counter()
+        conn.exec_driver_sql(
+            f"CREATE INDEX {quote(name)} ON {quote(table_name)} ({', '.join(quote(column) for column in index)})"
+        )
+        timings[name] = time.perf_counter() - start
+    for name, seconds in timings.items():
+        logger.info(f"Built index {name} on {table_name} in {seconds:.3f}s")
+    return timings
+
+def sample_lookups(df, definition):
+    """One value of the leading column of each declared key and index, to time lookups with."""
+    lookups = {}
+    for columns in [definition.get('primary_key', [])] + definition.get('indexes', []):
+        if columns and columns[0] in df.columns and columns[0] not in lookups:
+            values = df[columns[0]].dropna()
+            if len(values):
+                value = values.iloc[len(values) // 2]
+                if isinstance(value, pd.Timestamp):
+                    value = value.to_pydatetime()
+                elif isinstance(value, np.generic):
+                    value = value.item()
+                lookups[columns[0]] = value
+    return lookups
+
+def time_lookups(conn, table_name, lookups, repeat=3):
+    """Best-of-`repeat` seconds of an equality lookup on each column of `lookups`."""
+    quote = conn.dialect.identifier_preparer.quote
+    timings = {}
+    for column, value in lookups.items():
+        statement = text(f"SELECT COUNT(*) FROM {quote(table_name)} WHERE {quote(column)} = :value")
+        best = None
+        for _ in range(repeat):
+            start = time.perf_counter()
+            conn.execute(statement, {'value': value}).scalar()
+            elapsed = time.perf_counter() - start
+            best = elapsed if best is None else min(best, elapsed)
+        timings[column] = best
+    return timings
+
+def _hashable(df):
+    # Hash on normalized dtypes so that, e.g., an id read back as float because of a
+    # missing value hashes the same as the int64 id of the previous run
+    df = df.copy()
+    for column in df.columns:
+        if pd.api.types.is_numeric_dtype(df[column]) and not pd.api.types.is_bool_dtype(df[column]):
+            df[column] = df[column].astype('Float64')
+        elif not pd.api.types.is_datetime64_any_dtype(df[column]):
+            df[column] = df[column].astype(object)
+    return df
+
+def add_merge_keys(df, key_columns):
+    """Add the BIGINT `merge_key` (hash of the grain) and `row_hash` (hash of the other columns)."""
+    value_columns = [column for column in df.columns if column not in key_columns]
+    df = df.copy()
+    df['merge_key'] = pd.util.hash_pandas_object(_hashable(df[key_columns]), index=False).values.view('int64')
+    df['row_hash'] = pd.util.hash_pandas_object(_hashable(df[value_columns]), index=False).values.view('int64')
+    return df
+
+def _ensure_index(conn, table_name, column):
+    index_name = f"ix_{table_name}_{column}"
+    # Any index leading with the column will do, e.g. one declared in WAREHOUSE_TABLES
+    if any(index['column_names'][:1] == [column] for index in conn.dialect.get_indexes(conn, table_name)):
+        return
+    quote = conn.dialect.identifier_preparer.quote
+    conn.exec_driver_sql(f"CREATE INDEX {quote(index_name)} ON {quote(table_name)} ({quote(column)})")
+
+def merge_shadow_table(conn, table_name, batch_column='id', batch_size=None, drop_shadow=True):
+    """Upsert the shadow table into `table_name` on `merge_key`, skipping unchanged rows.
+
+    The staged rows of a `batch_column` value are taken to be all of its rows, so
+    its live rows whose key is no longer staged are deleted. Works through the
+    staged rows in ranges of `batch_column`. In each batch, those stale rows are
+    deleted and staged rows whose key and row hash already exist are dropped.
+    Live rows whose key is still staged are then deleted, and the staged rows are
+    inserted, so every statement is set-based. The shadow is then dropped,
+    unless `drop_shadow` is false. Returns the inserted/updated/unchanged/deleted counts.
+    """
+    batch_size = batch_size or MERGE_BATCH_SIZE
+    quote = conn.dialect.identifier_preparer.quote
+    target, shadow = quote(table_name), quote(get_shadow_name(table_name))
+    columns = ', '.join(quote(column['name']) for column in conn.dialect.get_columns(conn, get_shadow_name(table_name)))
+    _ensure_index(conn, table_name, 'merge_key')
+    _ensure_index(conn, get_shadow_name(table_name), 'merge_key')
+
+    values = pd.read_sql(f"SELECT {quote(batch_column)} FROM {shadow} ORDER BY {quote(batch_column)}", conn)[batch_column]
+    bounds = values.iloc[::batch_size].tolist() + values.iloc[-1:].tolist()
+    batch_filter = f"{shadow}.{quote(batch_column)} >= :lo AND {shadow}.{quote(batch_column)} {{upper}} :hi"
+
+    counts = {'inserted': 0, 'updated': 0, 'unchanged': 0, 'deleted': 0}
+    for i, (lo, hi) in enumerate(zip(bounds, bounds[1:])):
+        where = batch_filter.format(upper='<=' if i == len(bounds) - 2 else '<')
+        params = {'lo': lo, 'hi': hi}
+        staged = conn.execute(text(f"SELECT COUNT(*) FROM {shadow} WHERE {where}"), params).scalar()
+        column = quote(batch_column)
+        deleted = conn.execute(text(
+            f"DELETE FROM {target} WHERE {column} IN (SELECT {column} FROM {shadow} WHERE {where}) "
+            f"AND merge_key NOT IN (SELECT merge_key FROM {shadow} WHERE {where})"
+        ), params).rowcount
+        unchanged = conn.execute(text(
+            f"DELETE FROM {shadow} WHERE {where} AND EXISTS ("
+            f"SELECT 1 FROM {target} WHERE {target}.merge_key = {shadow}.merge_key AND {target}.row_hash = {shadow}.row_hash)"
+        ), params).rowcount
+        updated = conn.execute(text(
+            f"DELETE FROM {target} WHERE merge_key IN (SELECT merge_key FROM {shadow} WHERE {where})"
+        ), params).rowcount
+        conn.execute(text(f"INSERT INTO {target} ({columns}) SELECT {columns} FROM {shadow} WHERE {where}"), params)
+        counts['unchanged'] += unchanged
+        counts['updated'] += updated
+        counts['inserted'] += staged - unchanged - updated
+        counts['deleted'] += deleted
+
+    if drop_shadow:
+        conn.exec_driver_sql(f"DROP TABLE {shadow}")
+    logger.info(f"Merged {get_shadow_name(table_name)} into {table_name}: {counts}")
+    return counts
+
+def accumulate_shadow_table(conn, table_name, key_columns, drop_shadow=True):
+    """Add the shadow table's aggregates onto the matching rows of `table_name`.
+
+    The shadow holds one row per `key_columns` value, aggregated over a delta.
+    Every other column must be additive (a count or a sum), and the delta may
+    subtract. The stored values of the staged keys are added to the staged rows,
+    which then replace those keys in `table_name`; keys whose values all drop to
+    zero are deleted, and rows of other keys are not touched. The shadow is then
+    dropped, unless `drop_shadow` is false. Returns the inserted/updated/deleted counts.
+    """
+    quote = conn.dialect.identifier_preparer.quote
+    target, shadow = quote(table_name), quote(get_shadow_name(table_name))
+    columns = [column['name'] for column in conn.dialect.get_columns(conn, get_shadow_name(table_name))]
+    measures = [column for column in columns if column not in key_columns]
+    keys = ', '.join(quote(column) for column in key_columns)
+    match = ' AND '.join(f"{target}.{quote(column)} = {shadow}.{quote(column)}" for column in key_columns)
+
+    staged = conn.exec_driver_sql(f"SELECT COUNT(*) FROM {shadow}").scalar()
+    conn.exec_driver_sql(f"UPDATE {shadow} SET " + ', '.join(
+        f"{quote(column)} = {shadow}.{quote(column)} + COALESCE((SELECT {target}.{quote(column)} FROM {target} WHERE {match}), 0)"
+        for column in measures
+    ))
+    updated = conn.exec_driver_sql(f"DELETE FROM {target} WHERE ({keys}) IN (SELECT {keys} FROM {shadow})").rowcount
+    insert_columns = ', '.join(quote(column) for column in columns)
+    conn.exec_driver_sql(f"INSERT INTO {target} ({insert_columns}) SELECT {insert_columns} FROM {shadow}")
+    # A key whose rows were all subtracted again is left with nothing to report
+    emptied = conn.exec_driver_sql(
+        f"DELETE FROM {target} WHERE ({keys}) IN (SELECT {keys} FROM {shadow}) AND "
+        + ' AND '.join(f"ABS({quote(column)}) < 1e-9" for column in measures)
+    ).rowcount
+    if drop_shadow:
+        conn.exec_driver_sql(f"DROP TABLE {shadow}")
+    counts = {'inserted': staged - updated, 'updated': updated, 'deleted': emptied}
+    logger.info(f"Accumulated {get_shadow_name(table_name)} into {table_name}: {counts}")
+    return counts
+
+def drop_shadow_tables(conn, table_names):
+    quote = conn.dialect.identifier_preparer.quote
+    for table_name in table_names:
+        conn.exec_driver_sql(f"DROP TABLE IF EXISTS {quote(get_shadow_name(table_name))}")
+    conn.commit()
+
+def publish_shadow_tables(conn, tables, keys=None):
+    """Make loaded shadow tables visible to readers.
+
+    `tables` maps each table to 'replace', 'append', 'merge' or 'accumulate'.
+    Appended shadows are inserted into the live table, after deleting its rows
+    of the `keys` values they restate, if the table has keys; merged ones are upserted
+    through merge_shadow_table(), accumulated ones are added onto the rows of
+    their `keys` columns through accumulate_shadow_table(), and replaced ones
+    are swapped in by renaming. A shadow without a live table to add to is
+    swapped in. All appends, merges and accumulations run before any DDL, so
+    MySQL, where DDL commits implicitly, applies them in one transaction; its
+    renames then run as one atomic RENAME TABLE, and the shadows are dropped
+    last. On SQLite the whole publish runs in one transaction, since its DDL is
+    transactional.
+    """
+    quote = conn.dialect.identifier_preparer.quote
+    keys = keys or {}
+    appended = [t for t, mode in tables.items() if mode == 'append' and has_table(conn, t)]
+    merged = [t for t, mode in tables.items() if mode == 'merge' and has_table(conn, t)]
+    accumulated = [t for t, mode in tables.items() if mode == 'accumulate' and has_table(conn, t)]
+    replaced = [t for t in tables if t not in appended and t not in merged and t not in accumulated]
+    is_mysql = conn.dialect.name == 'mysql'
+
+    # DDL that changes nothing readers see goes first: the merge indexes and leftover old tables
+    for table_name in merged:
+        _ensure_index(conn, table_name, 'merge_key')
+        _ensure_index(conn, get_shadow_name(table_name), 'merge_key')
+    existing = [t for t in replaced if has_table(conn, t)]
+    for table_name in existing:
+        conn.exec_driver_sql(f"DROP TABLE IF EXISTS {quote(table_name + OLD_SUFFIX)}")
+
+    conn.commit()
+    if conn.dialect.name == 'sqlite':
+        # pysqlite runs DDL outside of transactions unless one is opened explicitly;
+        # legacy_alter_table keeps views pointing at the table name, not the renamed table
+        conn.exec_driver_sql("PRAGMA legacy_alter_table = ON")
+        conn.exec_driver_sql("BEGIN")
+
+    for table_name in appended:
+        shadow = get_shadow_name(table_name)
+        columns = ', '.join(quote(column['name']) for column in conn.dialect.get_columns(conn, shadow))
+        if table_name in keys:
+            key_columns = ', '.join(quote(column) for column in keys[table_name])
+            replaced_rows = conn.exec_driver_sql(
+                f"DELETE FROM {quote(table_name)} WHERE ({key_columns}) IN (SELECT {key_columns} FROM {quote(shadow)})"
+            ).rowcount
+            logger.info(f"Deleted {replaced_rows} rows of {table_name} restated by {shadow}")
+        conn.exec_driver_sql(
+            f"INSERT INTO {quote(table_name)} ({columns}) SELECT {columns} FROM {quote(shadow)}"
+        )
+        logger.info(f"Appended {shadow} into {table_name}")
+
+    for table_name in merged:
+        merge_shadow_table(conn, table_name, drop_shadow=False)
+
+    for table_name in accumulated:
+        accumulate_shadow_table(conn, table_name, keys[table_name], drop_shadow=False)
+
+    if is_mysql:
+        conn.commit()
+        renames = [f"{quote(t)} TO {quote(t + OLD_SUFFIX)}" for t in existing]
+        renames += [f"{quote(get_shadow_name(t))} TO {quote(t)}" for t in replaced]
+        if renames:
+            conn.exec_driver_sql(f"RENAME TABLE {', '.join(renames)}")
+    else:
+        for table_name in existing:
+            conn.exec_driver_sql(f"ALTER TABLE {quote(table_name)} RENAME TO {quote(table_name + OLD_SUFFIX)}")
+        for table_name in replaced:
+            conn.exec_driver_sql(f"ALTER TABLE {quote(get_shadow_name(table_name))} RENAME TO {quote(table_name)}")
+    for table_name in appended + merged + accumulated:
+        conn.exec_driver_sql(f"DROP TABLE {quote(get_shadow_name(table_name))}")
+    for table_name in existing:
+        conn.exec_driver_sql(f"DROP TABLE {quote(table_name + OLD_SUFFIX)}")
+    conn.commit()
+
+    if conn.dialect.name == 'sqlite':
+        conn.exec_driver_sql("PRAGMA legacy_alter_table = OFF")
+    logger.info(f"Swapped in shadow tables: {replaced}")
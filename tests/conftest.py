@@ -0,0 +1,19 @@
+import sys
+import os
+import pytest
+
+# Add the directories containing the ETL scripts and the SQLite stand-ins to sys.path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'etl')))
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'benchmarks')))
+
+import extract_transform_load as etl
+import state
+from datasets import create_oltp_databases
+
+# SQLite stand-ins for the OLTP databases, with staging and state files kept under tmp_path
+@pytest.fixture
+def oltp_dir(tmp_path, monkeypatch):
+    create_oltp_databases(str(tmp_path), reservations=50)
+    monkeypatch.setattr(etl, 'STAGING_AREA_PATH', str(tmp_path))
+    monkeypatch.setattr(state, 'STATE_DIR', str(tmp_path / 'state'))
+    return str(tmp_path)
@@ -0,0 +1,32 @@
+import sys
+import os
+from sqlalchemy import create_engine
+
+# Add the directory containing engines.py to sys.path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'etl')))
+
+import engines
+
+# Test that the registry builds each engine once and keeps it until disposed
+def test_engine_registry_reuses_engines():
+    created = []
+    def factory():
+        created.append(create_engine('sqlite://'))
+        return created[-1]
+
+    engine = engines.get_engine('test_db', factory)
+    assert engines.get_engine('test_db', factory) is engine
+    assert len(created) == 1
+
+    engines.release_engine(engine)
+    assert engines.get_engine('test_db', factory) is engine
+
+    engines.dispose_engines()
+    assert engines.get_engine('test_db', factory) is not engine
+    engines.dispose_engines()
+
+def test_pool_options_from_env(monkeypatch):
+    monkeypatch.setenv('DB_POOL_SIZE', '12')
+    options = engines.get_pool_options()
+    assert options['pool_size'] == 12
+    assert options['pool_pre_ping'] is True
@@ -0,0 +1,496 @@
+import sys
+import os
+import pytest
+import pandas as pd
+from sqlalchemy import create_engine
+
+# Add the directories containing the ETL scripts and the SQLite stand-ins to sys.path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'etl')))
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'benchmarks')))
+
+import extract_transform_load as etl
+from staging import read_staged
+import state
+from instrumentation import start_report, finish_report
+from datasets import sqlite_engine_factory
+
+# Test that concurrent extraction returns the same files, in config order, as the serial path
+def test_extractor_concurrent_matches_serial(oltp_dir):
+    engine_factory = sqlite_engine_factory(oltp_dir)
+    serial = etl.extractor(max_workers=1, max_workers_per_db=1, engine_factory=engine_factory)
+    concurrent = etl.extractor(max_workers=8, max_workers_per_db=4, engine_factory=engine_factory)
+    assert len(serial) == 13
+    assert concurrent == serial
+    assert serial[0] == etl.get_data_loaded_path('campaigns')
+
+# Test that a failing table is logged and skipped without stopping the other tables
+def test_extractor_skips_failed_table(oltp_dir):
+    oltp_databases = {
+        'promotion_db': [('campaigns', "SELECT * FROM Campaign", None), ('missing', "SELECT * FROM Missing", None)],
+        'payment_db': [('payments', "SELECT * FROM Payments", None)],
+    }
+    file_paths = etl.extractor(
+        max_workers=4, max_workers_per_db=2, oltp_databases=oltp_databases,
+        engine_factory=sqlite_engine_factory(oltp_dir)
+    )
+    assert file_paths == [etl.get_data_loaded_path('campaigns'), etl.get_data_loaded_path('payments')]
+
+# Test that streaming a table in chunks writes the same staging file as a single read
+def test_extract_table_chunked_matches_full_read(oltp_dir):
+    engine = sqlite_engine_factory(oltp_dir)('reservation_db')
+    full_path = etl.extract_table(engine, 'reservation_db', 'reservations', "SELECT * FROM Reservations")
+    expected = read_staged(full_path)
+    chunked_path = etl.extract_table(engine, 'reservation_db', 'reservations', "SELECT * FROM Reservations", chunksize=7)
+    pd.testing.assert_frame_equal(read_staged(chunked_path), expected)
+    engine.dispose()
+
+# Test that a second incremental run only extracts and appends reservations past the watermark
+def test_incremental_run_appends_only_new_reservations(oltp_dir, tmp_path):
+    engine_factory = sqlite_engine_factory(oltp_dir)
+    warehouse = create_engine(f"sqlite:///{tmp_path / 'warehouse.sqlite'}")
+
+    etl.loader(etl.transformer(etl.extractor(engine_factory=engine_factory, incremental=True)), engine=warehouse)
+    assert state.load_state(etl.WATERMARK_STATE)['committed']['reservations'] == 50
+    before = pd.read_sql("SELECT * FROM mst_reservation", warehouse)
+
+    # Add one reservation with its item, stay and payment to the sources
+    for db_name, table_name, row_id in [
+        ('reservation_db', 'Reservations', 'id'), ('reservation_db', 'ReservationItems', 'reservation_id'),
+        ('stay_db', 'Stays', 'reference_reservation_id'), ('payment_db', 'Payments', 'reservation_id')
+    ]:
+        engine = engine_factory(db_name)
+        row = pd.read_sql(f"SELECT * FROM {table_name} WHERE {row_id} = 50", engine)
+        row[row_id] = 51
+        row['id'] = 51
+        row.to_sql(table_name, engine, if_exists='append', index=False)
+        engine.dispose()
+
+    file_paths = etl.extractor(engine_factory=engine_factory, incremental=True)
+    assert len(read_staged(etl.get_data_loaded_path('reservations'))) == 1
+    etl.loader(etl.transformer(file_paths), engine=warehouse)
+
+    fact = pd.read_sql("SELECT * FROM mst_reservation", warehouse)
+    new_rows = (fact['id'] == 51).sum()
+    assert new_rows == (before['id'] == 50).sum()
+    assert len(fact) == len(before) + new_rows
+    assert state.load_state(etl.WATERMARK_STATE)['committed']['reservations'] == 51
+
+# Test that a stay and a payment added to loaded reservations are picked up incrementally,
+# restating those reservations' fact rows and marts as a full rebuild would
+@pytest.mark.parametrize('pushdown', [False, True])
+def test_incremental_run_restates_late_stays_and_payments(oltp_dir, tmp_path, monkeypatch, pushdown):
+    monkeypatch.setattr(etl, 'EXTRACT_PUSHDOWN', pushdown)
+    reservations = 'reservation_facts' if pushdown else 'reservations'
+    engine_factory = sqlite_engine_factory(oltp_dir)
+    warehouse = create_engine(f"sqlite:///{tmp_path / 'warehouse.sqlite'}")
+    etl.loader(etl.transformer(etl.extractor(engine_factory=engine_factory, incremental=True)), engine=warehouse)
+
+    # A late stay for reservation 10, and reservation 20 paid again and cancelled
+    for db_name, table_name, key, reservation_id in [
+        ('stay_db', 'Stays', 'reference_reservation_id', 10), ('payment_db', 'Payments', 'reservation_id', 20)
+    ]:
+        engine = engine_factory(db_name)
+        row = pd.read_sql(f"SELECT * FROM {table_name} ORDER BY id DESC LIMIT 1", engine)
+        row[key] = reservation_id
+        row['id'] += 1
+        row.to_sql(table_name, engine, if_exists='append', index=False)
+        engine.dispose()
+    engine = engine_factory('reservation_db')
+    with engine.begin() as conn:
+        conn.exec_driver_sql("UPDATE Reservations SET status = 'Cancelled' WHERE id = 20")
+    engine.dispose()
+
+    file_paths = etl.extractor(engine_factory=engine_factory, incremental=True)
+    assert sorted(read_staged(etl.get_data_loaded_path(reservations))['id'].unique()) == [10, 20]
+    etl.loader(etl.transformer(file_paths), engine=warehouse)
+    watermarks = state.load_state(etl.WATERMARK_STATE)['committed']
+    assert watermarks['reservations'] == 50
+    for db_name, table_name in etl.RESERVATION_CHILD_TABLES.values():
+        engine = engine_factory(db_name)
+        assert pd.read_sql(f"SELECT MAX(id) AS id FROM {table_name}", engine)['id'][0] in watermarks.values()
+        engine.dispose()
+
+    # Nothing has changed since, so the next run extracts no reservations
+    etl.extractor(engine_factory=engine_factory, incremental=True)
+    assert len(read_staged(etl.get_data_loaded_path(reservations))) == 0
+
+    rebuilt = create_engine(f"sqlite:///{tmp_path / 'rebuilt.sqlite'}")
+    etl.loader(etl.transformer(etl.extractor(engine_factory=engine_factory), force_refresh=True),
+               engine=rebuilt, force_refresh=True)
+    order = ', '.join(['id'] + etl.FACT_GRAIN_COLUMNS)
+    fact = pd.read_sql(f"SELECT * FROM mst_reservation ORDER BY {order}", warehouse)
+    pd.testing.assert_frame_equal(fact, pd.read_sql(f"SELECT * FROM mst_reservation ORDER BY {order}", rebuilt))
+    assert set(fact.loc[fact['id'] == 20, 'status']) == {'Cancelled'}
+    for table_name, keys in etl.MART_KEYS.items():
+        query = f"SELECT * FROM {table_name} ORDER BY {', '.join(keys)}"
+        pd.testing.assert_frame_equal(pd.read_sql(query, warehouse), pd.read_sql(query, rebuilt))
+
+# Test that an incremental run adds the delta onto the affected mart partitions, matching a full rebuild
+def test_incremental_run_accumulates_marts(oltp_dir, tmp_path):
+    engine_factory = sqlite_engine_factory(oltp_dir)
+    warehouse = create_engine(f"sqlite:///{tmp_path / 'warehouse.sqlite'}")
+    etl.loader(etl.transformer(etl.extractor(engine_factory=engine_factory, incremental=True)), engine=warehouse)
+    hotel_days = pd.read_sql("SELECT hotel_id, reservation_date FROM mart_hotel_daily_revenue", warehouse)
+
+    # Copy reservations 41-50 and their items as reservations 51-60: a delta in existing partitions
+    engine = engine_factory('reservation_db')
+    reservations = pd.read_sql("SELECT * FROM Reservations WHERE id > 40", engine)
+    items = pd.read_sql("SELECT * FROM ReservationItems WHERE reservation_id > 40", engine)
+    item_ids = pd.read_sql("SELECT MAX(id) AS id FROM ReservationItems", engine)['id'].iloc[0]
+    reservations.assign(id=reservations['id'] + 10).to_sql('Reservations', engine, if_exists='append', index=False)
+    items.assign(id=items['id'] + item_ids, reservation_id=items['reservation_id'] + 10).to_sql(
+        'ReservationItems', engine, if_exists='append', index=False
+    )
+    engine.dispose()
+
+    file_paths = etl.extractor(engine_factory=engine_factory, incremental=True)
+    assert len(read_staged(etl.get_data_loaded_path('reservations'))) == 10
+    etl.loader(etl.transformer(file_paths), engine=warehouse)
+
+    rebuilt = create_engine(f"sqlite:///{tmp_path / 'rebuilt.sqlite'}")
+    etl.loader(etl.transformer(etl.extractor(engine_factory=engine_factory), force_refresh=True),
+               engine=rebuilt, force_refresh=True)
+    for table_name, keys in etl.MART_KEYS.items():
+        query = f"SELECT * FROM {table_name} ORDER BY {', '.join(keys)}"
+        pd.testing.assert_frame_equal(pd.read_sql(query, warehouse), pd.read_sql(query, rebuilt))
+    revenue = pd.read_sql("SELECT hotel_id, reservation_date FROM mart_hotel_daily_revenue", warehouse)
+    pd.testing.assert_frame_equal(revenue.sort_values(list(revenue.columns)).reset_index(drop=True),
+                                  hotel_days.sort_values(list(hotel_days.columns)).reset_index(drop=True))
+
+# Test that a failed table load leaves every previously loaded warehouse table intact
+def test_failed_load_keeps_previous_tables(oltp_dir, tmp_path):
+    engine_factory = sqlite_engine_factory(oltp_dir)
+    warehouse = create_engine(f"sqlite:///{tmp_path / 'warehouse.sqlite'}")
+    etl.loader(etl.transformer(etl.extractor(engine_factory=engine_factory)), engine=warehouse)
+    before = pd.read_sql("SELECT * FROM hotels", warehouse)
+    fact_rows = len(pd.read_sql("SELECT * FROM mst_reservation", warehouse))
+
+    transformed_files = etl.transformer(etl.extractor(engine_factory=engine_factory), force_refresh=True)
+    with open(etl.get_data_transformed_path('dim_users'), 'w') as f:
+        f.write('corrupted')
+    with pytest.raises(RuntimeError):
+        etl.loader(transformed_files, engine=warehouse, force_refresh=True)
+
+    pd.testing.assert_frame_equal(pd.read_sql("SELECT * FROM hotels", warehouse), before)
+    assert len(pd.read_sql("SELECT * FROM mst_reservation", warehouse)) == fact_rows
+    tables = pd.read_sql("SELECT name FROM sqlite_master WHERE type = 'table'", warehouse)['name']
+    assert not tables.str.endswith('__shadow').any()
+    assert all(os.path.exists(file_path) for file_path in transformed_files)
+
+# Test that a well-formed staged file lacking its table's key columns is not published, whatever the staging format
+def test_loader_rejects_staged_file_without_key_columns(oltp_dir, tmp_path):
+    engine_factory = sqlite_engine_factory(oltp_dir)
+    warehouse = create_engine(f"sqlite:///{tmp_path / 'warehouse.sqlite'}")
+    etl.loader(etl.transformer(etl.extractor(engine_factory=engine_factory)), engine=warehouse)
+    before = pd.read_sql("SELECT * FROM users", warehouse)
+
+    transformed_files = etl.transformer(etl.extractor(engine_factory=engine_factory), force_refresh=True)
+    file_path = etl.get_data_transformed_path('dim_users')
+    etl.get_format().write(pd.DataFrame({'corrupted': pd.Series([], dtype='int64')}), file_path)
+    # Re-record the file so that only the column check can reject it
+    manifest = etl.load_manifest()
+    etl.record_stage(manifest, 'dim_users', 'transformed', file_path)
+    with pytest.raises(RuntimeError, match='dim_users'):
+        etl.loader(transformed_files, engine=warehouse, force_refresh=True)
+
+    pd.testing.assert_frame_equal(pd.read_sql("SELECT * FROM users", warehouse), before)
+
+# Test that loading tables and fact table ranges concurrently gives the same warehouse as the serial path
+def test_parallel_loader_matches_serial(oltp_dir, tmp_path, monkeypatch):
+    # Let the small SQLite warehouse take concurrent writers to exercise the parallel path
+    monkeypatch.setattr('warehouse.SERIAL_WRITE_DIALECTS', set())
+    engine_factory = sqlite_engine_factory(oltp_dir)
+    serial = create_engine(f"sqlite:///{tmp_path / 'serial.sqlite'}")
+    parallel = create_engine(f"sqlite:///{tmp_path / 'parallel.sqlite'}")
+    etl.loader(etl.transformer(etl.extractor(engine_factory=engine_factory)), engine=serial)
+    transformed_files = etl.transformer(etl.extractor(engine_factory=engine_factory), force_refresh=True)
+    etl.loader(transformed_files, engine=parallel, force_refresh=True, concurrency=3, fact_parts=3)
+
+    for table in ['mst_reservation'] + [etl.get_target_table(name) for name in etl.DIM_TABLE_SOURCES]:
+        query = f"SELECT * FROM {table}"
+        expected = pd.read_sql(query, serial)
+        actual = pd.read_sql(query, parallel)
+        sort_by = list(expected.columns)
+        pd.testing.assert_frame_equal(
+            actual.sort_values(sort_by).reset_index(drop=True), expected.sort_values(sort_by).reset_index(drop=True)
+        )
+
+# Test that a table failing in a parallel load is reported and leaves no shadow tables behind
+def test_parallel_loader_reports_failed_table(oltp_dir, tmp_path, monkeypatch):
+    monkeypatch.setattr('warehouse.SERIAL_WRITE_DIALECTS', set())
+    engine_factory = sqlite_engine_factory(oltp_dir)
+    warehouse = create_engine(f"sqlite:///{tmp_path / 'warehouse.sqlite'}")
+    transformed_files = etl.transformer(etl.extractor(engine_factory=engine_factory))
+    with open(etl.get_data_transformed_path('dim_hotels'), 'w') as f:
+        f.write('corrupted')
+    with pytest.raises(RuntimeError, match='dim_hotels'):
+        etl.loader(transformed_files, engine=warehouse, concurrency=3, fact_parts=2)
+
+    tables = pd.read_sql("SELECT name FROM sqlite_master WHERE type = 'table'", warehouse)['name']
+    assert not tables.str.endswith('__shadow').any()
+
+# Test that the declared types, keys and indexes survive repeated loads, and that their builds are reported
+def test_loader_builds_declared_indexes(oltp_dir, tmp_path, monkeypatch):
+    monkeypatch.setattr(etl, 'MEASURE_INDEX_LOOKUPS', True)
+    engine_factory = sqlite_engine_factory(oltp_dir)
+    warehouse = create_engine(f"sqlite:///{tmp_path / 'warehouse.sqlite'}")
+    for _ in range(2):
+        report = start_report(str(tmp_path / 'logs'))
+        etl.loader(etl.transformer(etl.extractor(engine_factory=engine_factory), force_refresh=True),
+                   engine=warehouse, force_refresh=True)
+        finish_report()
+
+    with warehouse.connect() as conn:
+        for table_name, definition in etl.WAREHOUSE_TABLES.items():
+            indexes = [index['column_names'] for index in conn.dialect.get_indexes(conn, table_name)]
+            expected = [definition['primary_key']] if 'primary_key' in definition else []
+            expected += [index for index in definition.get('indexes', []) if index != ['merge_key']]
+            assert sorted(indexes) == sorted(expected)
+        columns = {column['name']: column['type'] for column in conn.dialect.get_columns(conn, 'users')}
+        assert str(columns['email']) == 'VARCHAR(255)'
+
+    stages = {(record['stage'], record['table']) for record in report.records}
+    assert {('index', table_name) for table_name in etl.WAREHOUSE_TABLES} <= stages
+    assert all(record['speedup'] for record in report.records if record['stage'] == 'lookup')
+
+# Test that merge mode applies a changed reservation status without rewriting the other rows
+def test_merge_load_updates_changed_rows(oltp_dir, tmp_path, monkeypatch):
+    monkeypatch.setattr(etl, 'LOAD_MODE', 'merge')
+    engine_factory = sqlite_engine_factory(oltp_dir)
+    warehouse = create_engine(f"sqlite:///{tmp_path / 'warehouse.sqlite'}")
+    etl.loader(etl.transformer(etl.extractor(engine_factory=engine_factory)), engine=warehouse)
+    fact_rows = len(pd.read_sql("SELECT * FROM mst_reservation", warehouse))
+
+    engine = engine_factory('reservation_db')
+    with engine.begin() as conn:
+        conn.exec_driver_sql("UPDATE Reservations SET status = 'Refunded' WHERE id = 7")
+    engine.dispose()
+    etl.loader(etl.transformer(etl.extractor(engine_factory=engine_factory)), engine=warehouse)
+
+    fact = pd.read_sql("SELECT * FROM mst_reservation", warehouse)
+    assert len(fact) == fact_rows
+    assert set(fact.loc[fact['id'] == 7, 'status']) == {'Refunded'}
+    assert {'item_id', 'stay_id', 'payment_id', 'merge_key', 'row_hash'} <= set(fact.columns)
+
+# Test that an incremental merge run applies status changes to reservations within the lookback window
+def test_incremental_merge_applies_status_changes(oltp_dir, tmp_path, monkeypatch):
+    monkeypatch.setattr(etl, 'LOAD_MODE', 'merge')
+    engine_factory = sqlite_engine_factory(oltp_dir)
+    warehouse = create_engine(f"sqlite:///{tmp_path / 'warehouse.sqlite'}")
+    etl.loader(etl.transformer(etl.extractor(engine_factory=engine_factory, incremental=True)), engine=warehouse)
+    fact_rows = len(pd.read_sql("SELECT * FROM mst_reservation", warehouse))
+
+    engine = engine_factory('reservation_db')
+    with engine.begin() as conn:
+        conn.exec_driver_sql("UPDATE Reservations SET status = 'Cancelled' WHERE id = 7")
+    engine.dispose()
+
+    # Outside the lookback window the change is not extracted
+    monkeypatch.setattr(etl, 'INCREMENTAL_LOOKBACK_DAYS', 0)
+    etl.extractor(engine_factory=engine_factory, incremental=True)
+    assert len(read_staged(etl.get_data_loaded_path('reservations'))) == 0
+
+    reservation_datetime = pd.read_sql("SELECT reservation_datetime FROM mst_reservation WHERE id = 7", warehouse)
+    days = (pd.Timestamp.now() - pd.to_datetime(reservation_datetime['reservation_datetime'][0])).days + 1
+    monkeypatch.setattr(etl, 'INCREMENTAL_LOOKBACK_DAYS', days)
+    file_paths = etl.extractor(engine_factory=engine_factory, incremental=True)
+    assert read_staged(etl.get_data_loaded_path('reservations'))['id'].min() == 7
+    etl.loader(etl.transformer(file_paths), engine=warehouse)
+
+    fact = pd.read_sql("SELECT * FROM mst_reservation", warehouse)
+    assert len(fact) == fact_rows
+    assert set(fact.loc[fact['id'] == 7, 'status']) == {'Cancelled'}
+    assert state.load_state(etl.WATERMARK_STATE)['committed']['reservations'] == 50
+    rebuilt = create_engine(f"sqlite:///{tmp_path / 'rebuilt.sqlite'}")
+    etl.loader(etl.transformer(etl.extractor(engine_factory=engine_factory), force_refresh=True),
+               engine=rebuilt, force_refresh=True)
+    for table_name, keys in etl.MART_KEYS.items():
+        query = f"SELECT * FROM {table_name} ORDER BY {', '.join(keys)}"
+        pd.testing.assert_frame_equal(pd.read_sql(query, warehouse), pd.read_sql(query, rebuilt))
+
+# Test that the daemon keeps running after a failed run and only full-refreshes the first run
+def test_run_daemon(monkeypatch):
+    calls = []
+    def run_etl(full_refresh=False, **kwargs):
+        calls.append(full_refresh)
+        return len(calls) != 2
+    monkeypatch.setattr(etl, 'run_etl', run_etl)
+    assert etl.run_daemon(0, full_refresh=True, max_runs=3) == 3
+    assert calls == [True, False, False]
+
+# Test that a run records every extracted table, transformed table and load in the run report
+def test_run_report_covers_every_table(oltp_dir, tmp_path):
+    report = start_report(str(tmp_path / 'logs'))
+    try:
+        file_paths = etl.extractor(engine_factory=sqlite_engine_factory(oltp_dir))
+        etl.loader(etl.transformer(file_paths), engine=create_engine(f"sqlite:///{tmp_path / 'warehouse.sqlite'}"))
+    finally:
+        json_path, _ = finish_report()
+    stages = {(record['stage'], record['table']) for record in report.records}
+    assert ('extract', 'reservations') in stages and ('extract', 'stay_users') in stages
+    assert ('transform', 'fact_table') in stages and ('transform', 'dim_users') in stages
+    assert ('load', 'mst_reservation') in stages and ('load', 'hotels') in stages
+    assert all(record['rows'] is not None for record in report.records if record['stage'] != 'publish')
+    assert os.path.exists(json_path)
+
+# Test that unchanged dimensions are skipped on the next run, changed ones reloaded, and force_refresh reloads all
+def test_fingerprint_cache_skips_unchanged_dimensions(oltp_dir, tmp_path):
+    engine_factory = sqlite_engine_factory(oltp_dir)
+    warehouse = create_engine(f"sqlite:///{tmp_path / 'warehouse.sqlite'}")
+    first = etl.transformer(etl.extractor(engine_factory=engine_factory))
+    etl.loader(first, engine=warehouse)
+
+    engine = engine_factory('reservation_db')
+    with engine.begin() as conn:
+        conn.exec_driver_sql("UPDATE Hotels SET name = 'Renamed' WHERE id = 1")
+    engine.dispose()
+
+    report = start_report(str(tmp_path / 'logs'))
+    try:
+        second = etl.transformer(etl.extractor(engine_factory=engine_factory))
+        etl.loader(second, engine=warehouse)
+    finally:
+        finish_report()
+    assert [etl.get_data_transformed_path(t) for t in ['fact_table', 'dim_hotels', *etl.MART_KEYS]] == second
+    assert pd.read_sql("SELECT name FROM hotels WHERE id = 1", warehouse)['name'].tolist() == ['Renamed']
+    cache = {record['table']: record['cache'] for record in report.records if record['stage'] == 'transform'}
+    assert cache['dim_hotels'] == 'miss' and cache['dim_rooms'] == 'hit' and cache['fact_table'] is None
+
+    forced = etl.transformer(etl.extractor(engine_factory=engine_factory), force_refresh=True)
+    assert len(forced) == len(first)
+    etl.loader(forced, engine=warehouse, force_refresh=True)
+
+# Test that the transformer writes the same fact table with the partitioned transform
+def test_transformer_partitioned_fact_table(oltp_dir, monkeypatch):
+    engine_factory = sqlite_engine_factory(oltp_dir)
+    etl.transformer(etl.extractor(engine_factory=engine_factory))
+    expected = read_staged(etl.get_data_transformed_path('fact_table'))
+
+    monkeypatch.setattr(etl, 'FACT_PARTITION_BY', 'month')
+    monkeypatch.setattr(etl, 'FACT_PARTITIONS', 2)
+    etl.transformer(etl.extractor(engine_factory=engine_factory), force_refresh=True)
+    pd.testing.assert_frame_equal(read_staged(etl.get_data_transformed_path('fact_table')), expected)
+
+# Test that pushing the reservation/item join into reservation_db gives the same fact table from fewer, narrower files
+@pytest.mark.parametrize('grain_keys', [False, True])
+def test_pushdown_matches_pandas_join(oltp_dir, monkeypatch, grain_keys):
+    monkeypatch.setattr(etl, 'LOAD_MODE', 'merge' if grain_keys else 'replace')
+    engine_factory = sqlite_engine_factory(oltp_dir)
+    etl.transformer(etl.extractor(engine_factory=engine_factory))
+    expected = read_staged(etl.get_data_transformed_path('fact_table'))
+
+    monkeypatch.setattr(etl, 'EXTRACT_PUSHDOWN', True)
+    file_paths = etl.extractor(engine_factory=engine_factory)
+    assert etl.get_data_loaded_path('reservation_facts') in file_paths
+    assert etl.get_data_loaded_path('reservations') not in file_paths
+    etl.transformer(file_paths, force_refresh=True)
+    pd.testing.assert_frame_equal(read_staged(etl.get_data_transformed_path('fact_table')), expected)
+
+# Test that incremental pushdown extraction only reads reservations past the watermark
+def test_pushdown_incremental_watermark(oltp_dir, tmp_path, monkeypatch):
+    monkeypatch.setattr(etl, 'EXTRACT_PUSHDOWN', True)
+    engine_factory = sqlite_engine_factory(oltp_dir)
+    warehouse = create_engine(f"sqlite:///{tmp_path / 'warehouse.sqlite'}")
+    etl.loader(etl.transformer(etl.extractor(engine_factory=engine_factory, incremental=True)), engine=warehouse)
+    assert state.load_state(etl.WATERMARK_STATE)['committed']['reservations'] == 50
+
+    etl.extractor(engine_factory=engine_factory, incremental=True)
+    assert len(read_staged(etl.get_data_loaded_path('reservation_facts'))) == 0
+
+# Test that a resumed extraction only queries the tables that failed in the previous run
+def test_resume_extracts_only_failed_tables(oltp_dir, monkeypatch):
+    engine_factory = sqlite_engine_factory(oltp_dir)
+    payment_tables = etl.OLTP_DATABASES['payment_db']
+    monkeypatch.setitem(etl.OLTP_DATABASES, 'payment_db', [
+        (table_name, "SELECT * FROM Missing" if table_name == 'payments' else query, chunksize)
+        for table_name, query, chunksize in payment_tables
+    ])
+    assert etl.get_data_loaded_path('payments') not in etl.extractor(engine_factory=engine_factory)
+
+    monkeypatch.setitem(etl.OLTP_DATABASES, 'payment_db', payment_tables)
+    connected = []
+    def counting_factory(db_name):
+        connected.append(db_name)
+        return engine_factory(db_name)
+    file_paths = etl.extractor(engine_factory=counting_factory, resume=True)
+    assert connected == ['payment_db']
+    assert file_paths == etl.extractor(engine_factory=engine_factory)
+
+# Test that resuming after a failed load redoes only the table whose file was damaged, then clears the manifest
+def test_resume_after_failed_load(oltp_dir, tmp_path):
+    engine_factory = sqlite_engine_factory(oltp_dir)
+    warehouse = create_engine(f"sqlite:///{tmp_path / 'warehouse.sqlite'}")
+    transformed_files = etl.transformer(etl.extractor(engine_factory=engine_factory))
+    # Any damaged file fails its checksum, even one that still parses in the staging format
+    with open(etl.get_data_transformed_path('dim_users'), 'w') as f:
+        f.write('corrupted')
+    with pytest.raises(RuntimeError, match='dim_users'):
+        etl.loader(transformed_files, engine=warehouse)
+    tables = pd.read_sql("SELECT name FROM sqlite_master WHERE type = 'table'", warehouse)['name']
+    assert 'users' not in tables.tolist()
+
+    connected = []
+    def counting_factory(db_name):
+        connected.append(db_name)
+        return engine_factory(db_name)
+    file_paths = etl.extractor(engine_factory=counting_factory, resume=True)
+    assert file_paths == [etl.get_data_loaded_path('users'), etl.get_data_loaded_path('stay_users')]
+    assert sorted(connected) == ['reservation_db', 'stay_db']
+    assert etl.transformer(file_paths, resume=True) == transformed_files
+    etl.loader(transformed_files, engine=warehouse)
+
+    assert len(pd.read_sql("SELECT * FROM users", warehouse)) > 0
+    assert state.load_state('manifest') == {}
+
+# Test that a resumed run re-verifies the staged files it reuses and does not publish one damaged since
+def test_resume_rejects_file_damaged_after_transform(oltp_dir, tmp_path):
+    engine_factory = sqlite_engine_factory(oltp_dir)
+    warehouse = create_engine(f"sqlite:///{tmp_path / 'warehouse.sqlite'}")
+    transformed_files = etl.transformer(etl.extractor(engine_factory=engine_factory))
+    os.remove(etl.get_data_transformed_path('dim_users'))
+    with pytest.raises(RuntimeError):
+        etl.loader(transformed_files, engine=warehouse)
+
+    resumed_files = etl.transformer(etl.extractor(engine_factory=engine_factory, resume=True), resume=True)
+    with open(etl.get_data_transformed_path('dim_hotels'), 'a') as f:
+        f.write('corrupted')
+    with pytest.raises(RuntimeError, match='dim_hotels'):
+        etl.loader(resumed_files, engine=warehouse)
+    tables = pd.read_sql("SELECT name FROM sqlite_master WHERE type = 'table'", warehouse)['name']
+    assert 'hotels' not in tables.tolist()
+
+# Test that resuming a failed full refresh keeps it a full refresh instead of appending its full fact table
+def test_resume_keeps_full_refresh_mode(oltp_dir, tmp_path):
+    engine_factory = sqlite_engine_factory(oltp_dir)
+    warehouse = create_engine(f"sqlite:///{tmp_path / 'warehouse.sqlite'}")
+    etl.loader(etl.transformer(etl.extractor(engine_factory=engine_factory, incremental=True)), engine=warehouse)
+    fact_rows = len(pd.read_sql("SELECT * FROM mst_reservation", warehouse))
+    revenue = pd.read_sql("SELECT SUM(net_revenue) AS revenue FROM mart_hotel_daily_revenue", warehouse)['revenue'][0]
+
+    transformed_files = etl.transformer(etl.extractor(engine_factory=engine_factory, incremental=False), force_refresh=True)
+    os.remove(etl.get_data_transformed_path('dim_users'))
+    with pytest.raises(RuntimeError):
+        etl.loader(transformed_files, engine=warehouse, force_refresh=True)
+    assert state.load_state('manifest')['incremental'] is False
+
+    file_paths = etl.extractor(engine_factory=engine_factory, incremental=True, resume=True)
+    assert state.load_state(etl.WATERMARK_STATE)['pending_incremental'] is False
+    etl.loader(etl.transformer(file_paths, resume=True), engine=warehouse)
+
+    assert len(pd.read_sql("SELECT * FROM mst_reservation", warehouse)) == fact_rows
+    assert pd.read_sql("SELECT SUM(net_revenue) AS revenue FROM mart_hotel_daily_revenue", warehouse)['revenue'][0] == pytest.approx(revenue)
+
+# Test that a failed incremental run cannot be resumed as a full refresh
+def test_resume_rejects_full_refresh_of_incremental_run(oltp_dir, tmp_path):
+    engine_factory = sqlite_engine_factory(oltp_dir)
+    warehouse = create_engine(f"sqlite:///{tmp_path / 'warehouse.sqlite'}")
+    etl.loader(etl.transformer(etl.extractor(engine_factory=engine_factory, incremental=True)), engine=warehouse)
+
+    transformed_files = etl.transformer(etl.extractor(engine_factory=engine_factory, incremental=True))
+    os.remove(etl.get_data_transformed_path('fact_table'))
+    with pytest.raises(RuntimeError):
+        etl.loader(transformed_files, engine=warehouse)
+    assert state.load_state('manifest')['incremental'] is True
+
+    with pytest.raises(ValueError):
+        etl.extractor(engine_factory=engine_factory, incremental=False, resume=True)
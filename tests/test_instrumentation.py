@@ -0,0 +1,62 @@
+import sys
+import os
+import json
+import pytest
+import pandas as pd
+
+# Add the directory containing the ETL scripts to sys.path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'etl')))
+
+import instrumentation
+from instrumentation import measure, start_report, finish_report, get_report
+
+@pytest.fixture
+def report(tmp_path):
+    report = start_report(str(tmp_path), run_id='test')
+    yield report
+    finish_report()
+
+# Test that measure() records timing, rows and rows/sec into the current report
+def test_measure_records_into_report(report):
+    with measure('transform', 'fact_table') as metrics:
+        metrics.update(rows=100, bytes_written=2048)
+    record, = report.records
+    assert record['stage'] == 'transform' and record['table'] == 'fact_table'
+    assert record['status'] == 'ok'
+    assert record['rows'] == 100 and record['bytes_written'] == 2048
+    assert record['rows_per_sec'] > 0
+
+# Test that a failing block is recorded as failed and the exception propagates
+def test_measure_records_failures(report):
+    with pytest.raises(ValueError):
+        with measure('load', 'hotels'):
+            raise ValueError('boom')
+    assert report.records[0]['status'] == 'failed'
+
+# Test that finishing a report writes matching JSON and CSV files and stops collecting
+def test_finish_report_writes_json_and_csv(report, tmp_path):
+    with measure('extract', 'users') as metrics:
+        metrics['rows'] = 3
+    json_path, csv_path = finish_report()
+    assert get_report() is None
+    with open(json_path) as f:
+        assert json.load(f)['records'][0]['table'] == 'users'
+    assert pd.read_csv(csv_path)['rows'].tolist() == [3]
+    assert json_path == str(tmp_path / 'ETL_test_report.json')
+
+# Test that a stage listed in ETL_PROFILE is dumped as a cProfile file next to the report
+def test_measure_profiles_selected_stage(report, tmp_path, monkeypatch):
+    monkeypatch.setattr(instrumentation, 'ETL_PROFILE', 'transform:fact_table')
+    with measure('transform', 'fact_table'):
+        sum(range(1000))
+    with measure('transform', 'dim_users'):
+        pass
+    assert os.listdir(tmp_path) == ['ETL_test_transform_fact_table.prof']
+
+# Test that ETL_PROFILE is ignored without a started report, so nothing is written outside its directory
+def test_measure_skips_profiling_without_report(tmp_path, monkeypatch):
+    monkeypatch.setattr(instrumentation, 'ETL_PROFILE', 'transform')
+    monkeypatch.chdir(tmp_path)
+    with measure('transform', 'fact_table'):
+        pass
+    assert os.listdir(tmp_path) == []
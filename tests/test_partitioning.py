@@ -0,0 +1,51 @@
+import sys
+import os
+import pytest
+import pandas as pd
+
+# Add the directories containing the ETL scripts and the SQLite stand-ins to sys.path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'etl')))
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'benchmarks')))
+
+from transformations import transform_fact_table
+from partitioning import assign_partitions, transform_fact_table_partitioned
+from datasets import build_tables
+
+@pytest.fixture
+def fact_data():
+    tables = build_tables(500)
+    return {
+        'reservations': tables['reservation_db']['Reservations'],
+        'reservation_items': tables['reservation_db']['ReservationItems'],
+        'stays': tables['stay_db']['Stays'],
+        'payments': tables['payment_db']['Payments'],
+    }
+
+# Test that month partitions are contiguous month ranges and hotel partitions stay in range
+def test_assign_partitions(fact_data):
+    reservations = fact_data['reservations']
+    months = assign_partitions(reservations, 'month', 4)
+    assert sorted(set(months)) == [0, 1, 2, 3]
+    assert pd.Series(months).is_monotonic_increasing  # The generated reservations are in datetime order
+    hotels = assign_partitions(reservations, 'hotel', 3)
+    assert set(hotels) <= {0, 1, 2}
+    assert pd.Series(hotels).groupby(reservations['hotel_id']).nunique().max() == 1
+    with pytest.raises(ValueError):
+        assign_partitions(reservations, 'weekday')
+
+# Test that the partitioned transform returns exactly the serial fact table
+@pytest.mark.parametrize('by', ['month', 'hotel'])
+@pytest.mark.parametrize('grain_keys', [False, True])
+def test_partitioned_matches_serial(fact_data, by, grain_keys):
+    expected = transform_fact_table(fact_data, grain_keys=grain_keys)
+    result = transform_fact_table_partitioned(fact_data, by=by, partitions=3, workers=2, grain_keys=grain_keys)
+    pd.testing.assert_frame_equal(result, expected)
+
+# Test that a partition without any stays or payments does not change the dtypes of the result
+def test_partitioned_matches_serial_with_empty_children(fact_data):
+    reservations = fact_data['reservations']
+    first_ids = reservations.loc[assign_partitions(reservations, 'month', 3) == 0, 'id']
+    fact_data['stays'] = fact_data['stays'][~fact_data['stays']['reference_reservation_id'].isin(first_ids)]
+    fact_data['payments'] = fact_data['payments'][~fact_data['payments']['reservation_id'].isin(first_ids)]
+    expected = transform_fact_table(fact_data)
+    pd.testing.assert_frame_equal(transform_fact_table_partitioned(fact_data, partitions=3, workers=2), expected)
@@ -0,0 +1,103 @@
+import sys
+import os
+import pytest
+import pandas as pd
+from sqlalchemy import create_engine
+
+# Add the directories containing the ETL scripts and the SQLite stand-ins to sys.path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'etl')))
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'benchmarks')))
+
+import extract_transform_load as etl
+from pipeline import run_pipeline, build_dependency_graph
+from datasets import sqlite_engine_factory
+
+def test_dependency_graph():
+    graph = build_dependency_graph()
+    assert graph['fact_table'] == ['reservations', 'reservation_items', 'stays', 'payments']
+    assert graph['dim_users'] == ['users', 'stay_users']
+    assert graph['dim_campaign'] == ['campaigns']
+    assert graph['mart_campaign_discounts'] == ['reservations', 'vouchers']
+
+# Test that the pipelined run loads the same warehouse tables as extractor -> transformer -> loader
+@pytest.mark.parametrize('checkpoint', [False, True])
+def test_pipeline_matches_staged_run(oltp_dir, tmp_path, checkpoint):
+    engine_factory = sqlite_engine_factory(oltp_dir)
+    staged = create_engine(f"sqlite:///{tmp_path / 'staged.sqlite'}")
+    pipelined = create_engine(f"sqlite:///{tmp_path / 'pipelined.sqlite'}")
+
+    etl.loader(etl.transformer(etl.extractor(engine_factory=engine_factory)), engine=staged)
+    # Both runs share one fingerprint state, so the second warehouse needs a forced refresh
+    loaded = run_pipeline(
+        engine_factory=engine_factory, warehouse_engine=pipelined, max_workers=4, workers=3, queue_size=1,
+        checkpoint=checkpoint, force_refresh=True
+    )
+
+    assert set(loaded) == {'mst_reservation', 'hotels', 'rooms', 'users', 'payment_methods',
+                           'payment_third_parties', 'campaign', 'voucher', 'mart_hotel_daily_revenue',
+                           'mart_room_type_occupancy', 'mart_campaign_discounts'}
+    for table_name in loaded:
+        pd.testing.assert_frame_equal(
+            pd.read_sql(f"SELECT * FROM {table_name}", pipelined), pd.read_sql(f"SELECT * FROM {table_name}", staged)
+        )
+    assert os.path.exists(etl.get_data_transformed_path('fact_table')) == checkpoint
+
+# Test that a failed source table fails the run without touching the warehouse
+def test_pipeline_failed_source(oltp_dir, tmp_path, monkeypatch):
+    monkeypatch.setitem(etl.OLTP_DATABASES, 'promotion_db', [('campaigns', "SELECT * FROM Missing", None),
+                                                               ('vouchers', "SELECT * FROM Voucher", None)])
+    warehouse = create_engine(f"sqlite:///{tmp_path / 'warehouse.sqlite'}")
+    with pytest.raises(RuntimeError, match='dim_campaign'):
+        run_pipeline(engine_factory=sqlite_engine_factory(oltp_dir), warehouse_engine=warehouse, max_workers=2)
+    tables = pd.read_sql("SELECT name FROM sqlite_master WHERE type = 'table'", warehouse)['name']
+    assert tables.empty
+
+# Test that a second pipelined run skips the unchanged dimensions and reloads a changed one
+def test_pipeline_skips_unchanged_dimensions(oltp_dir, tmp_path):
+    engine_factory = sqlite_engine_factory(oltp_dir)
+    warehouse = create_engine(f"sqlite:///{tmp_path / 'warehouse.sqlite'}")
+    run_pipeline(engine_factory=engine_factory, warehouse_engine=warehouse)
+
+    engine = engine_factory('stay_db')
+    with engine.begin() as conn:
+        conn.exec_driver_sql("UPDATE Rooms SET floor = 99 WHERE id = 1")
+    engine.dispose()
+
+    loaded = run_pipeline(engine_factory=engine_factory, warehouse_engine=warehouse)
+    assert set(loaded) == {'mst_reservation', 'rooms'} | set(etl.MART_KEYS)
+    assert pd.read_sql("SELECT floor FROM rooms WHERE id = 1", warehouse)['floor'].tolist() == [99]
+    assert len(pd.read_sql("SELECT * FROM hotels", warehouse)) > 0
+
+# Test that the pipelined run builds the fact table from the pushdown extract
+def test_pipeline_pushdown(oltp_dir, tmp_path, monkeypatch):
+    engine_factory = sqlite_engine_factory(oltp_dir)
+    staged = create_engine(f"sqlite:///{tmp_path / 'staged.sqlite'}")
+    pipelined = create_engine(f"sqlite:///{tmp_path / 'pipelined.sqlite'}")
+    etl.loader(etl.transformer(etl.extractor(engine_factory=engine_factory)), engine=staged)
+
+    monkeypatch.setattr(etl, 'EXTRACT_PUSHDOWN', True)
+    assert build_dependency_graph()['fact_table'] == ['reservation_facts', 'stays', 'payments']
+    run_pipeline(engine_factory=engine_factory, warehouse_engine=pipelined, force_refresh=True)
+    pd.testing.assert_frame_equal(
+        pd.read_sql("SELECT * FROM mst_reservation", pipelined), pd.read_sql("SELECT * FROM mst_reservation", staged)
+    )
+
+# Test that an incremental pipelined run restates a reservation that got a late stay
+def test_pipeline_incremental_restates_late_stay(oltp_dir, tmp_path):
+    engine_factory = sqlite_engine_factory(oltp_dir)
+    warehouse = create_engine(f"sqlite:///{tmp_path / 'warehouse.sqlite'}")
+    run_pipeline(engine_factory=engine_factory, warehouse_engine=warehouse, incremental=True)
+
+    engine = engine_factory('stay_db')
+    stay = pd.read_sql("SELECT * FROM Stays ORDER BY id DESC LIMIT 1", engine)
+    stay.assign(id=stay['id'] + 1, reference_reservation_id=10).to_sql('Stays', engine, if_exists='append', index=False)
+    engine.dispose()
+    run_pipeline(engine_factory=engine_factory, warehouse_engine=warehouse, incremental=True)
+
+    rebuilt = create_engine(f"sqlite:///{tmp_path / 'rebuilt.sqlite'}")
+    run_pipeline(engine_factory=engine_factory, warehouse_engine=rebuilt, force_refresh=True)
+    for table_name, keys in {'mst_reservation': ['id', 'item_id', 'stay_id', 'payment_id'], **etl.MART_KEYS}.items():
+        query = f"SELECT * FROM {table_name} ORDER BY {', '.join(keys)}"
+        pd.testing.assert_frame_equal(pd.read_sql(query, warehouse), pd.read_sql(query, rebuilt))
+    stay_ids = pd.read_sql("SELECT stay_id FROM mst_reservation WHERE id = 10", warehouse)['stay_id']
+    assert int(stay['id'][0]) + 1 in stay_ids.tolist()
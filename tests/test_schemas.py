@@ -0,0 +1,55 @@
+import sys
+import os
+import pandas as pd
+
+# Add the directory containing the ETL scripts to sys.path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'etl')))
+
+from schemas import compact_dtypes, get_required_columns
+
+# Test that a table read back from CSV gets its declared ids, categoricals and datetimes
+def test_compact_dtypes_reservations():
+    df = pd.DataFrame({
+        'id': [1, 2, 3],
+        'reservation_datetime': ['2024-01-01 10:00:00', '2024-01-02 11:00:00', None],
+        'status': ['Booked', 'Pending', 'Booked'],
+        'voucher_code': ['SUMMER20', None, None],
+        'total_room_price': [100.0, 200.0, 300.0],
+        'note': ['a', 'b', 'c'],
+    })
+    compacted = compact_dtypes('reservations', df)
+    assert compacted['id'].dtype == 'int32'
+    assert pd.api.types.is_datetime64_any_dtype(compacted['reservation_datetime'])
+    assert compacted['reservation_datetime'].isna().tolist() == [False, False, True]
+    assert isinstance(compacted['status'].dtype, pd.CategoricalDtype)
+    assert compacted['voucher_code'].isna().sum() == 2
+    assert compacted['total_room_price'].dtype == 'float64'
+    assert compacted['note'].dtype == df['note'].dtype  # Undeclared columns are left alone
+    assert compacted.memory_usage(deep=True).sum() < df.memory_usage(deep=True).sum()
+
+# Test that integer columns with missing values become nullable and out-of-range values are not wrapped
+def test_compact_dtypes_integers():
+    df = pd.DataFrame({'id': [1.0, None], 'room_id': [1, 2**40], 'guest_id': [1, 2]})
+    compacted = compact_dtypes('stays', df)
+    assert compacted['id'].dtype == 'Int32'
+    assert compacted['id'].isna().tolist() == [False, True]
+    assert compacted['room_id'].dtype == 'int64'
+    assert compacted['room_id'].tolist() == [1, 2**40]
+
+# Test that a column that does not match its declared type is kept as it is
+def test_compact_dtypes_keeps_unconvertible_columns():
+    df = pd.DataFrame({'id': ['x1', 'x2'], 'gender': ['Male', 'Female']})
+    compacted = compact_dtypes('users', df)
+    assert compacted['id'].tolist() == ['x1', 'x2']
+    assert isinstance(compacted['gender'].dtype, pd.CategoricalDtype)
+
+# Test that tables without a schema are returned unchanged
+def test_compact_dtypes_unknown_table():
+    df = pd.DataFrame({'id': [1, 2]})
+    assert compact_dtypes('unknown', df) is df
+
+# Test that a table's required columns are its primary key, or its leading index without one
+def test_get_required_columns():
+    assert get_required_columns('mart_hotel_daily_revenue') == ['hotel_id', 'reservation_date']
+    assert get_required_columns('mst_reservation') == ['id']
+    assert get_required_columns('unknown') == []
@@ -0,0 +1,84 @@
+import sys
+import os
+import pytest
+import pandas as pd
+
+# Add the directory containing staging.py to sys.path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'etl')))
+
+from staging import get_staging_format, get_format_for_path, read_staged, get_table_name
+
+@pytest.fixture
+def reservations():
+    return pd.DataFrame({
+        'id': pd.array([1001, 1002, 1003], dtype='Int64'),
+        'reservation_datetime': pd.to_datetime(['2024-06-01 12:00:00', '2024-06-02 16:00:00', None]),
+        'status': ['Booked', 'Pending', None],
+        'total_room_price': [500.00, 600.00, 450.50]
+    })
+
+# Test that the columnar formats round-trip dtypes that CSV loses
+@pytest.mark.parametrize('name', ['parquet', 'arrow'])
+def test_columnar_round_trip_keeps_dtypes(tmp_path, reservations, name):
+    staging_format = get_staging_format(name)
+    path = str(tmp_path / f"reservations_loaded.{staging_format.extension}")
+    staging_format.write(reservations, path)
+    df = read_staged(path)
+    assert df['id'].dtype == 'Int64'
+    assert str(df['reservation_datetime'].dtype).startswith('datetime64')
+    pd.testing.assert_frame_equal(df, reservations, check_dtype=False)
+
+# Test that chunked writes concatenate to the same table as a single write
+@pytest.mark.parametrize('name', ['csv', 'parquet', 'arrow'])
+def test_chunk_writer_appends(tmp_path, reservations, name):
+    staging_format = get_staging_format(name)
+    path = str(tmp_path / f"reservations_loaded.{staging_format.extension}")
+    writer = staging_format.open_writer(path)
+    writer.write(reservations.iloc[:2])
+    writer.write(reservations.iloc[2:])
+    writer.close()
+    assert len(read_staged(path)) == 3
+    assert list(read_staged(path)['total_room_price']) == [500.00, 600.00, 450.50]
+
+# Test that a column that is all null in the first chunk takes the type of a later chunk's values
+@pytest.mark.parametrize('name', ['parquet', 'arrow'])
+def test_chunk_writer_promotes_null_columns(tmp_path, reservations, name):
+    staging_format = get_staging_format(name)
+    path = str(tmp_path / f"reservations_loaded.{staging_format.extension}")
+    first = reservations.iloc[2:].astype({'status': object})
+    first['status'] = None
+    writer = staging_format.open_writer(path)
+    writer.write(first)
+    writer.write(reservations.iloc[:2])
+    writer.close()
+    df = read_staged(path)
+    assert df['status'].tolist()[1:] == ['Booked', 'Pending'] and pd.isna(df['status'].iloc[0])
+    assert list(df['id']) == [1003, 1001, 1002]
+
+# Test that a column all null in the first chunk takes its declared kind, and later chunks are cast to it
+@pytest.mark.parametrize('name', ['parquet', 'arrow'])
+def test_chunk_writer_types_null_columns_by_kind(tmp_path, reservations, name):
+    staging_format = get_staging_format(name)
+    path = str(tmp_path / f"reservations_loaded.{staging_format.extension}")
+    first = reservations.iloc[2:].astype({'total_room_price': object})
+    first['total_room_price'] = None
+    writer = staging_format.open_writer(path, {'total_room_price': 'float64'})
+    writer.write(first)
+    writer.write(reservations.iloc[:2].astype({'id': 'float64'}))
+    writer.close()
+    df = read_staged(path)
+    assert df['total_room_price'].dtype == 'float64'
+    assert df['total_room_price'].tolist()[1:] == [500.00, 600.00] and pd.isna(df['total_room_price'].iloc[0])
+    assert list(df['id']) == [1003, 1001, 1002]
+
+# Test that reads honour the memory-map option
+@pytest.mark.parametrize('memory_map', [True, False])
+def test_read_staged_memory_map(tmp_path, reservations, memory_map):
+    path = str(tmp_path / "reservations_loaded.parquet")
+    get_staging_format('parquet').write(reservations, path)
+    assert get_format_for_path(path, memory_map).memory_map == memory_map
+    pd.testing.assert_frame_equal(read_staged(path, memory_map=memory_map), read_staged(path))
+
+def test_get_table_name():
+    assert get_table_name('./staging-area/payment_methods_loaded.parquet', '_loaded') == 'payment_methods'
+    assert get_table_name('./staging-area/dim_users_transformed.csv', '_transformed') == 'dim_users'
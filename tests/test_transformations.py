@@ -7,7 +7,10 @@ from datetime import datetime
 # Add the directory containing transformations.py to sys.path
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'etl')))
 
-from transformations import standardize_room_type, format_phone_number, transform_fact_table, transform_dim_tables
+from transformations import (
+    standardize_room_type, format_phone_number, standardize_room_types, format_phone_numbers,
+    transform_fact_table, transform_dim_tables, transform_mart, MART_TABLE_SOURCES, PUSHDOWN_FACT_TABLE
+)
 
 # Test for standardize_room_type function
 def test_standardize_room_type():
@@ -24,6 +27,28 @@ def test_format_phone_number():
     assert format_phone_number('123456789') != '+62-123456789'
     assert format_phone_number(None) == None
 
+# Test that the column versions match the scalar functions, including missing values and all-null or empty columns
+@pytest.mark.parametrize('memoize', [True, False])
+@pytest.mark.parametrize('room_types', [
+    ['Single Earth', 'single-earth', None, 'SINGLE  _EARTH ', 'Suite', 'suite', '', 'Double\tDeluxe'],
+    [None, None],
+    [],
+])
+def test_standardize_room_types_matches_scalar(room_types, memoize):
+    room_types = pd.Series(room_types, dtype=None if room_types else object)
+    expected = room_types.apply(standardize_room_type)
+    pd.testing.assert_series_equal(standardize_room_types(room_types, memoize=memoize), expected)
+
+@pytest.mark.parametrize('phone_numbers', [
+    ['08123456789', '628123456789', '+62-8123456789', '123456789', None, '062812'],
+    [8123456789, 628123456789],
+    [8123456789.0, None],
+])
+def test_format_phone_numbers_matches_scalar(phone_numbers):
+    phone_numbers = pd.Series(phone_numbers)
+    expected = phone_numbers.apply(format_phone_number)
+    pd.testing.assert_series_equal(format_phone_numbers(phone_numbers), expected)
+
 # Prepare test data
 @pytest.fixture
 def test_data():
@@ -128,6 +153,33 @@ def test_transform_fact_table(test_data):
     assert 'room_type' in fact_table.columns  # Check if 'room_type' column exists
     assert fact_table['room_type'].iloc[0] == 'single'  # Check if room type was standardized
 
+# Test that the marts sum each reservation once and leave out cancelled reservations
+def test_transform_marts(test_data):
+    test_data['reservations'].loc[1, 'status'] = 'Cancelled'
+    revenue = transform_mart('hotel_daily_revenue', test_data)
+    assert revenue.to_dict('records') == [{
+        'hotel_id': 1, 'reservation_date': pd.Timestamp('2024-06-01'), 'reservations': 1,
+        'room_revenue': 500.0, 'discount': 20.0, 'net_revenue': 480.0
+    }]
+    occupancy = transform_mart('room_type_occupancy', test_data)
+    assert occupancy.to_dict('records') == [{
+        'hotel_id': 1, 'check_in_date': pd.Timestamp('2024-06-15'), 'room_type': 'single', 'rooms': 1, 'room_nights': 5
+    }]
+    discounts = transform_mart('campaign_discounts', test_data)
+    assert discounts.to_dict('records') == [{
+        'campaign_id': 1, 'reservation_date': pd.Timestamp('2024-06-01'), 'reservations': 1, 'total_discount': 20.0
+    }]
+
+# Test that the marts come out the same from the pushdown extract of reservations joined to their items
+def test_transform_marts_pushdown(test_data):
+    items = test_data['reservation_items'][['id', 'reservation_id', 'room_type']].rename(columns={'id': 'item_id'})
+    pushdown = {
+        PUSHDOWN_FACT_TABLE: test_data['reservations'].merge(items, left_on='id', right_on='reservation_id', how='left'),
+        'vouchers': test_data['vouchers']
+    }
+    for name in MART_TABLE_SOURCES:
+        pd.testing.assert_frame_equal(transform_mart(name, pushdown), transform_mart(name, test_data))
+
 # Test for transform_dim_tables function
 def test_transform_dim_tables(test_data):
     dim_tables = transform_dim_tables(test_data)
@@ -138,3 +190,46 @@ def test_transform_dim_tables(test_data):
     assert dim_tables['rooms'].shape == (3, 5)  # Check if rooms table has the expected number of rows and columns
     assert dim_tables['hotels'].shape == (2, 3)  # Check if hotels table has the expected number of rows and columns
     assert dim_tables['users']['phoneNumber'].iloc[0] == '+62-8123456789'  # Check if phone numbers were formatted correctly
+
+# The original three chained merges, kept as the reference for the join engine
+def legacy_transform_fact_table(data):
+    res_items = pd.merge(data['reservations'], data['reservation_items'], left_on='id', right_on='reservation_id', how='left', suffixes=('','_items'))
+    res_items_stays = pd.merge(res_items, data['stays'], left_on='id', right_on='reference_reservation_id', how='left', suffixes=('','_stays'))
+    res_items_stays['room_type'] = res_items_stays['room_type'].apply(standardize_room_type)
+    fact_table = pd.merge(res_items_stays, data['payments'], left_on='id', right_on='reservation_id', how='left', suffixes=('','_payments'))
+    return fact_table[[
+        'id','reservation_datetime','check_in_date','check_out_date','status','hotel_id','booker_id','total_room_price',
+        'voucher_code','total_discount','room_type','room_id','guest_id','payment_method_id','amount','status_payments',
+        'payment_datetime'
+    ]]
+
+@pytest.fixture
+def fan_out_data(test_data):
+    # Several items, stays and payments per reservation, reservations without
+    # children, children without reservations and unsorted ids
+    data = dict(test_data)
+    data['reservations'] = pd.concat([test_data['reservations']] * 3, ignore_index=True)
+    data['reservations']['id'] = [1005, 1001, 1003, 1002, 1006, 1004]
+    data['reservation_items'] = pd.DataFrame({
+        'id': [1, 2, 3, 4, 5],
+        'reservation_id': [1001, 1002, 1001, 1005, 9999],
+        'room_type': ['Single', 'Suite', 'DOUBLE-deluxe', None, 'Single'],
+    })
+    data['stays'] = pd.DataFrame({
+        'id': [1, 2, 3, 4],
+        'date': ['2024-06-16', '2024-07-02', '2024-06-17', '2024-06-18'],
+        'reference_reservation_id': [1001, 1002, 1001, None],
+        'room_id': [1, 3, 2, 4],
+        'guest_id': [1, 2, 1, 3]
+    })
+    data['payments'] = pd.concat([test_data['payments']] * 2, ignore_index=True)
+    data['payments']['reservation_id'] = [1001, 1002, 1004, 1001]
+    return data
+
+# Test that the join engine matches the original merges row for row, chunked or not
+@pytest.mark.parametrize('chunk_size', [None, 1, 4])
+def test_transform_fact_table_matches_legacy_merges(fan_out_data, chunk_size):
+    fact_table = transform_fact_table(fan_out_data, chunk_size=chunk_size)
+    expected = legacy_transform_fact_table(fan_out_data)
+    pd.testing.assert_frame_equal(fact_table, expected)
+    assert fact_table.attrs['expansion_factor'] == len(expected) / 6
@@ -0,0 +1,227 @@
+import sys
+import os
+import pytest
+import pandas as pd
+from sqlalchemy import create_engine, event
+from sqlalchemy.exc import DBAPIError, OperationalError
+
+# Add the directory containing warehouse.py to sys.path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'etl')))
+
+import warehouse
+from warehouse import (
+    write_table, write_table_parallel, split_key_ranges, create_table_indexes, sample_lookups, time_lookups,
+    _write_load_data_csv, _quote_load_data_path, get_shadow_name, publish_shadow_tables, add_merge_keys,
+    merge_shadow_table
+)
+
+@pytest.fixture
+def fact_table():
+    return pd.DataFrame({
+        'id': [1001, 1002, 1003],
+        'reservation_datetime': pd.to_datetime(['2024-06-01 12:00:00', '2024-06-02 16:00:00', '2024-06-03 09:30:00']),
+        'status': ['Booked', None, 'Pending'],
+        'voucher_code': ['SUMMER20', 'WIN\\TER', 'A,"B"'],
+        'amount': [100.0, None, 150.0]
+    })
+
+@pytest.fixture
+def conn(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'warehouse.sqlite'}")
+    with engine.connect() as conn:
+        yield conn
+    engine.dispose()
+
+# Test that every strategy stores the same rows; SQLite has no LOAD DATA, so that strategy falls back
+@pytest.mark.parametrize('strategy', ['to_sql', 'executemany', 'load_data', 'auto'])
+def test_write_table_strategies(conn, fact_table, strategy):
+    assert write_table(fact_table, 'mst_reservation', conn, strategy=strategy) == 3
+    conn.commit()
+    df = pd.read_sql("SELECT * FROM mst_reservation", conn)
+    assert list(df['id']) == [1001, 1002, 1003]
+    assert df['status'].isna().tolist() == [False, True, False]
+    assert df['voucher_code'].tolist() == ['SUMMER20', 'WIN\\TER', 'A,"B"']
+    assert pd.isna(df['amount'].iloc[1])
+
+# Test that LOAD DATA falls back to executemany only when it is disabled, and other errors are raised
+def test_write_table_load_data_errors(conn, fact_table, monkeypatch):
+    monkeypatch.setattr(warehouse, 'LOAD_DATA_DIALECTS', {'sqlite'})
+    with pytest.raises(DBAPIError):
+        write_table(fact_table, 'mst_reservation', conn, strategy='load_data')
+
+    def disabled(*args):
+        raise OperationalError('LOAD DATA', {}, Exception(3948, 'Loading local data is disabled'))
+    monkeypatch.setattr(warehouse, 'write_load_data_infile', disabled)
+    assert write_table(fact_table, 'mst_reservation', conn, strategy='load_data') == 3
+
+# Test that the LOAD DATA file name is a quoted literal with forward slashes
+def test_quote_load_data_path():
+    assert _quote_load_data_path('/tmp/rows.csv') == "'/tmp/rows.csv'"
+    assert _quote_load_data_path("C:\\Temp\\o'brien.csv") == "'C:/Temp/o\\'brien.csv'"
+
+def test_write_table_append(conn, fact_table):
+    write_table(fact_table, 'mst_reservation', conn, strategy='executemany')
+    write_table(fact_table, 'mst_reservation', conn, if_exists='append', strategy='executemany')
+    conn.commit()
+    assert len(pd.read_sql("SELECT * FROM mst_reservation", conn)) == 6
+
+# Test that key ranges cover every row once and never split the rows of one key
+def test_split_key_ranges():
+    df = pd.DataFrame({'id': [5, 1, 3, 3, 2, 5, 4, 1], 'value': range(8)})
+    chunks = split_key_ranges(df, 'id', 3)
+    assert sorted(pd.concat(chunks)['value']) == list(range(8))
+    key_sets = [set(chunk['id']) for chunk in chunks]
+    assert all(a.isdisjoint(b) for i, a in enumerate(key_sets) for b in key_sets[i + 1:])
+    assert all(max(a) < min(b) for a, b in zip(key_sets, key_sets[1:]))
+
+# Test that writing key ranges over several connections stores the same rows as one write
+@pytest.mark.parametrize('serial_dialects', [set(), {'sqlite'}])
+def test_write_table_parallel(tmp_path, fact_table, monkeypatch, serial_dialects):
+    monkeypatch.setattr(warehouse, 'SERIAL_WRITE_DIALECTS', serial_dialects)
+    engine = create_engine(f"sqlite:///{tmp_path / 'warehouse.sqlite'}")
+    assert warehouse.get_write_concurrency(engine, 3) == (1 if serial_dialects else 3)
+    assert write_table_parallel(fact_table, 'mst_reservation', engine, parts=3) == 3
+    df = pd.read_sql("SELECT * FROM mst_reservation ORDER BY id", engine)
+    assert list(df['id']) == [1001, 1002, 1003]
+    assert df['voucher_code'].tolist() == ['SUMMER20', 'WIN\\TER', 'A,"B"']
+    engine.dispose()
+
+# Test the CSV dialect written for LOAD DATA: \N for NULL and escaped backslashes
+def test_load_data_csv_format(tmp_path, fact_table):
+    path = str(tmp_path / 'load.csv')
+    _write_load_data_csv(fact_table, path)
+    with open(path) as f:
+        lines = f.read().splitlines()
+    assert lines[0] == '1001,2024-06-01 12:00:00,Booked,SUMMER20,100.0'
+    assert lines[1] == '1002,2024-06-02 16:00:00,\\N,WIN\\\\TER,\\N'
+    assert lines[2] == '1003,2024-06-03 09:30:00,Pending,"A,""B""",150.0'
+
+# Test that publishing swaps replaced tables, appends deltas and keeps dependent views working
+def test_publish_shadow_tables(conn, fact_table):
+    write_table(fact_table.iloc[:1], 'mst_reservation', conn)
+    write_table(fact_table.iloc[:1], 'hotels', conn)
+    conn.exec_driver_sql("CREATE VIEW hotel_ids AS SELECT id FROM hotels")
+    conn.commit()
+
+    write_table(fact_table.iloc[1:], get_shadow_name('mst_reservation'), conn)
+    write_table(fact_table, get_shadow_name('hotels'), conn)
+    conn.commit()
+    publish_shadow_tables(conn, {'mst_reservation': 'append', 'hotels': 'replace'})
+
+    assert pd.read_sql("SELECT id FROM mst_reservation", conn)['id'].tolist() == [1001, 1002, 1003]
+    assert pd.read_sql("SELECT id FROM hotel_ids", conn)['id'].tolist() == [1001, 1002, 1003]
+    tables = pd.read_sql("SELECT name FROM sqlite_master WHERE type = 'table'", conn)['name']
+    assert sorted(tables) == ['hotels', 'mst_reservation']
+
+# Test that a merge inserts new rows, updates changed ones and skips unchanged ones, batch by batch
+@pytest.mark.parametrize('batch_size', [1, 2, 100])
+def test_merge_shadow_table(conn, fact_table, batch_size):
+    fact_table['item_id'] = [1, None, 3]
+    live = add_merge_keys(fact_table, ['id', 'item_id'])
+    write_table(live, 'mst_reservation', conn)
+
+    staged = fact_table.copy()
+    staged.loc[1, 'status'] = 'Paid'
+    staged = pd.concat([staged, staged.iloc[[0]].assign(id=1004)], ignore_index=True)
+    write_table(add_merge_keys(staged, ['id', 'item_id']), get_shadow_name('mst_reservation'), conn)
+    conn.commit()
+
+    counts = merge_shadow_table(conn, 'mst_reservation', batch_size=batch_size)
+    conn.commit()
+    assert counts == {'inserted': 1, 'updated': 1, 'unchanged': 2, 'deleted': 0}
+    df = pd.read_sql("SELECT * FROM mst_reservation ORDER BY id", conn)
+    assert df['id'].tolist() == [1001, 1002, 1003, 1004]
+    assert df['status'].tolist() == ['Booked', 'Paid', 'Pending', 'Booked']
+    assert not warehouse.has_table(conn, get_shadow_name('mst_reservation'))
+
+# Test that a merged reservation's live rows whose grain is no longer staged are deleted
+def test_merge_shadow_table_deletes_stale_rows(conn, fact_table):
+    fact_table['item_id'] = [1, 2, 3]
+    write_table(add_merge_keys(fact_table, ['id', 'item_id']), 'mst_reservation', conn)
+    staged = fact_table.iloc[[0]].assign(item_id=4)
+    write_table(add_merge_keys(staged, ['id', 'item_id']), get_shadow_name('mst_reservation'), conn)
+    conn.commit()
+
+    counts = merge_shadow_table(conn, 'mst_reservation')
+    assert counts == {'inserted': 1, 'updated': 0, 'unchanged': 0, 'deleted': 1}
+    df = pd.read_sql("SELECT id, item_id FROM mst_reservation ORDER BY id", conn)
+    assert df.values.tolist() == [[1001, 4], [1002, 2], [1003, 3]]
+
+# Test that appending with keys replaces the live rows of the staged keys
+def test_publish_append_replaces_staged_keys(conn, fact_table):
+    write_table(fact_table, 'mst_reservation', conn)
+    write_table(fact_table.iloc[1:].assign(status='Paid'), get_shadow_name('mst_reservation'), conn)
+    conn.commit()
+    publish_shadow_tables(conn, {'mst_reservation': 'append'}, keys={'mst_reservation': ['id']})
+    df = pd.read_sql("SELECT id, status FROM mst_reservation ORDER BY id", conn)
+    assert df.values.tolist() == [[1001, 'Booked'], [1002, 'Paid'], [1003, 'Paid']]
+
+# Test that every append, merge and accumulation runs before any DDL, which would commit them one by one on MySQL
+def test_publish_runs_dml_before_ddl(conn, fact_table):
+    fact_table['item_id'] = [1, 2, 3]
+    mart = pd.DataFrame({'hotel_id': [1], 'day': ['d1'], 'rooms': [2]})
+    for table_name, df in [('mst_reservation', fact_table), ('hotels', fact_table), ('mart', mart)]:
+        write_table(df, table_name, conn)
+        write_table(df, get_shadow_name(table_name), conn)
+    write_table(add_merge_keys(fact_table, ['id', 'item_id']), 'merged', conn)
+    write_table(add_merge_keys(fact_table, ['id', 'item_id']), get_shadow_name('merged'), conn)
+    conn.commit()
+
+    statements = []
+    event.listen(conn, 'before_cursor_execute', lambda *args: statements.append(args[2].split()[0].upper()))
+    publish_shadow_tables(
+        conn, {'mst_reservation': 'append', 'merged': 'merge', 'mart': 'accumulate', 'hotels': 'replace'},
+        keys={'mst_reservation': ['id'], 'mart': ['hotel_id', 'day']}
+    )
+    dml = [i for i, statement in enumerate(statements) if statement in ('INSERT', 'UPDATE', 'DELETE')]
+    ddl = [i for i, statement in enumerate(statements) if statement in ('ALTER', 'RENAME', 'DROP', 'CREATE')]
+    assert dml and ddl
+    assert not [i for i in ddl if dml[0] < i < dml[-1]]
+    tables = pd.read_sql("SELECT name FROM sqlite_master WHERE type = 'table'", conn)['name']
+    assert sorted(tables) == ['hotels', 'mart', 'merged', 'mst_reservation']
+
+# Test that merge keys do not depend on whether an id column came back as int or float
+def test_add_merge_keys_is_dtype_stable(fact_table):
+    as_int = add_merge_keys(fact_table.assign(item_id=[1, 2, 3]), ['id', 'item_id'])
+    as_float = add_merge_keys(fact_table.assign(item_id=[1.0, 2.0, 3.0]), ['id', 'item_id'])
+    assert as_int['merge_key'].tolist() == as_float['merge_key'].tolist()
+    assert as_int['row_hash'].tolist() == as_float['row_hash'].tolist()
+
+# Test that declared keys and indexes are built once, skipping columns the table lacks
+def test_create_table_indexes(conn, fact_table):
+    write_table(fact_table, 'mst_reservation', conn)
+    definition = {'primary_key': ['id'], 'indexes': [['status'], ['amount', 'id'], ['merge_key']]}
+    timings = create_table_indexes(conn, 'mst_reservation', definition)
+    assert set(timings) == {'pk_mst_reservation_id', 'ix_mst_reservation_status', 'ix_mst_reservation_amount_id'}
+    assert create_table_indexes(conn, 'mst_reservation', definition) == {}
+
+    indexes = {index['name']: index for index in conn.dialect.get_indexes(conn, 'mst_reservation')}
+    assert indexes['pk_mst_reservation_id']['unique']
+    lookups = sample_lookups(fact_table, definition)
+    assert lookups == {'id': 1002, 'status': 'Pending', 'amount': 150.0}
+    assert set(time_lookups(conn, 'mst_reservation', lookups)) == set(lookups)
+
+# Test that a primary key the rows violate becomes a plain index instead of failing the load
+def test_create_table_indexes_duplicate_key(conn, fact_table):
+    write_table(pd.concat([fact_table, fact_table]), 'users', conn)
+    create_table_indexes(conn, 'users', {'primary_key': ['id']})
+    indexes = conn.dialect.get_indexes(conn, 'users')
+    assert [(index['column_names'], bool(index['unique'])) for index in indexes] == [(['id'], False)]
+
+# Test that accumulating adds a delta's aggregates onto its partitions and leaves the others alone
+def test_accumulate_shadow_table(conn):
+    write_table(pd.DataFrame({'hotel_id': [1, 1, 2], 'day': ['d1', 'd2', 'd1'], 'rooms': [2, 3, 4]}), 'mart', conn)
+    write_table(pd.DataFrame({'hotel_id': [1, 3], 'day': ['d2', 'd1'], 'rooms': [5, 1]}), get_shadow_name('mart'), conn)
+    publish_shadow_tables(conn, {'mart': 'accumulate'}, keys={'mart': ['hotel_id', 'day']})
+    df = pd.read_sql("SELECT * FROM mart ORDER BY hotel_id, day", conn)
+    assert df.values.tolist() == [[1, 'd1', 2], [1, 'd2', 8], [2, 'd1', 4], [3, 'd1', 1]]
+    assert not warehouse.has_table(conn, get_shadow_name('mart'))
+
+# Test that a key whose accumulated values drop to zero is deleted
+def test_accumulate_shadow_table_deletes_emptied_keys(conn):
+    live = pd.DataFrame({'hotel_id': [1, 2], 'day': ['d1', 'd1'], 'rooms': [2, 4], 'revenue': [10.5, 20.0]})
+    write_table(live, 'mart', conn)
+    write_table(live.iloc[[0]].assign(rooms=-2, revenue=-10.5), get_shadow_name('mart'), conn)
+    counts = warehouse.accumulate_shadow_table(conn, 'mart', ['hotel_id', 'day'])
+    assert counts == {'inserted': 0, 'updated': 1, 'deleted': 1}
+    assert pd.read_sql("SELECT * FROM mart", conn).values.tolist() == [[2, 'd1', 4, 20.0]]